@@ -1,26 +1,28 @@
-from PIL import Image
-import torchvision.transforms as transforms
-from models.anomaly_detector_encoder import load_model, compute_anomaly_score
-from preprocess_img import get_transform
+from models.anomaly_detector_encoder import load_model, compute_anomaly_scores, compute_anomaly_maps, ModelRegistry
+from preprocess_img import PreprocessEngine
 import torch
-import matplotlib.pyplot as plt
 from torchvision.transforms import ToPILImage
 
 # visualization
-def show_images(original_tensor, preprocessed_tensor, reconstructed_tensor, category, img_path, loss, threshold):
+def show_images(original_tensor, preprocessed_tensor, reconstructed_tensor, category, img_path, loss, threshold,
+                anomaly_maps=None):
     """
     Args:
         original_tensor: (1, 3, H, W) - 전처리 전 이미지
         preprocessed_tensor: (1, 3, H, W) - 전처리 후 이미지
         reconstructed_tensor: (1, 3, H, W) - AE 복원 결과
+        anomaly_maps: compute_anomaly_maps 결과 (있으면 히트맵과 상위 영역 표시)
     """
+    # 시각화할 때만 matplotlib 로드 (배치 모드에서는 불필요)
+    import matplotlib.pyplot as plt
+
     to_pil = ToPILImage()
 
     original_img = to_pil(original_tensor.squeeze(0).cpu())
     preprocessed_img = to_pil(preprocessed_tensor.squeeze(0).cpu())
     reconstructed_img = to_pil(reconstructed_tensor.squeeze(0).cpu())
 
-    fig, axes = plt.subplots(1, 3, figsize=(12, 4))
+    fig, axes = plt.subplots(1, 4 if anomaly_maps else 3, figsize=(16 if anomaly_maps else 12, 4))
 
     axes[0].imshow(original_img)
     axes[0].set_title("Original")
@@ -34,6 +36,14 @@ def show_images(original_tensor, preprocessed_tensor, reconstructed_tensor, cate
     axes[2].set_title("Reconstructed")
     axes[2].axis("off")
 
+    if anomaly_maps:
+        axes[3].imshow(original_img)
+        axes[3].imshow(anomaly_maps["heatmap"][0].cpu(), cmap="jet", alpha=0.5)
+        for x0, y0, x1, y1 in anomaly_maps["regions"][0].tolist():
+            axes[3].add_patch(plt.Rectangle((x0, y0), x1 - x0, y1 - y0, fill=False, color="white", lw=1.5))
+        axes[3].set_title("Anomaly Heatmap")
+        axes[3].axis("off")
+
     # 상단에 카테고리, 경로, 스코어, 판별 결과 표시
     status = "Anomaly" if loss > threshold else "Normal"
     fig.suptitle(
@@ -46,39 +56,122 @@ def show_images(original_tensor, preprocessed_tensor, reconstructed_tensor, cate
     plt.show()
 
 # Load image with preprocessing
-def load_image(image_path, category):
-    # 1) PIL 이미지 로드
-    pil_img = Image.open(image_path).convert('RGB')
-
-    # 2) 기본 및 카테고리별 전처리 정의
-    base_transform = [
-        transforms.Resize((128, 128)),
-        transforms.ToTensor()
-    ]
-    preprocess = [
-        *get_transform(category).transforms
-    ]
+def load_image(image_path, category, cache_dir=None):
+    # 디코딩/리사이즈는 한 번만 하고 원본 뷰와 전처리 뷰를 함께 생성 (cache_dir이 있으면 디스크 캐시 사용)
+    tensor_original, tensor_preprocessed = PreprocessEngine(category, cache_dir).load(image_path)
 
-    # 3) tensor 및 변환 적용
-    tensor_original = transforms.Compose(base_transform)(pil_img).unsqueeze(0) # (1, C, H, W) 형태
-    tensor_preprocessed = transforms.Compose(base_transform + preprocess)(pil_img).unsqueeze(0)
-
-    return tensor_original, tensor_preprocessed
+    return tensor_original.unsqueeze(0), tensor_preprocessed.unsqueeze(0)  # (1, C, H, W) 형태
 
 
 if __name__ == '__main__':
-    # 사용자 설정
-    img_path = "data/cable/test/poke_insulation/002.png"
-    category = "cable"
-    threshold = 0.004
-
-    model = load_model(category)
-    tensor_original, tensor_preprocessed = load_image(img_path, category)
-    loss, output = compute_anomaly_score(model, tensor_original)
+    import sys
+    import argparse
+    from utils.anomaly_batch import iter_image_paths, ScoreWriter, MapWriter, score_to_writer
+    from utils.thresholds import load_threshold, calibrate_category, METHODS
+    from utils.metrics import METRICS, profile_until_exit, export_at_exit
+    from config import BATCH_SIZE, DECODE_WORKERS, PREPROCESS_CACHE_DIR, METRICS_PATH
+
+    parser = argparse.ArgumentParser(description='AutoEncoder 기반 이상 탐지')
+    parser.add_argument("--image", default="data/cable/test/poke_insulation/002.png",
+                        help="단일 이미지 경로 (결과를 시각화)")
+    parser.add_argument("--input", nargs="+",
+                        help="일괄 점수 계산: 폴더(하위 폴더 포함), 이미지 파일 또는 경로 목록 파일")
+    parser.add_argument("--category", default="cable",
+                        help="카테고리 (models/autoencoder_{category}.pth). 일괄 모드에서 auto면 경로의 폴더명으로 추론, "
+                             "--calibrate에서는 쉼표로 여러 개 지정 가능")
+    parser.add_argument("--threshold", type=float,
+                        help="이상 판정 기준 score (기본값: --calibrate로 저장한 카테고리별 값, 없으면 0.004)")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="{data-root}/{category}/train 정상 이미지로 threshold를 보정하여 모델 옆에 저장")
+    parser.add_argument("--data-root", default="data", help="카테고리별 train/test 폴더가 있는 경로")
+    parser.add_argument("--method", choices=METHODS, default="auto",
+                        help="보정 방식 (auto: test 불량 라벨이 있으면 f1, 없으면 percentile)")
+    parser.add_argument("--percentile", type=float, default=99.0, help="percentile 방식의 분위수")
+    parser.add_argument("--k", type=float, default=3.0, help="meanstd 방식의 mean + k*std")
+    parser.add_argument("--output", default="-",
+                        help="일괄 점수 결과 파일 (.jsonl 또는 .csv, 기본값: 표준 출력 JSONL)")
+    parser.add_argument("--maps", help="일괄 모드에서 이상 위치(상위 patch 좌표)를 기록하고 압축 히트맵을 저장할 .npz 경로")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="배치 크기")
+    parser.add_argument("--workers", type=int, default=DECODE_WORKERS, help="디코딩/전처리 스레드 수")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--preprocessed", action="store_true",
+                        help="일괄/보정 모드에서 카테고리별 전처리(get_transform)를 적용한 이미지로 점수 계산 "
+                             "(threshold는 이 옵션으로 따로 보정해야 함)")
+    parser.add_argument("--max-models", type=int, default=4, help="auto 모드에서 메모리에 유지할 최대 모델 수")
+    parser.add_argument("--cache", action="store_true",
+                        help=f"리사이즈/CLAHE 결과를 디스크에 캐시하여 반복 실행 시 디코딩 생략 ({PREPROCESS_CACHE_DIR})")
+    parser.add_argument("--no-show", action="store_true", help="단일 이미지 모드에서 시각화 생략")
+    parser.add_argument("--metrics", default=METRICS_PATH,
+                        help="종료 시 단계별 시간/카운터 저장 경로 (.json 또는 Prometheus 텍스트 .prom)")
+    parser.add_argument("--profile", help="실행 전체를 프로파일링하여 저장할 경로")
+    parser.add_argument("--profiler", choices=["cprofile", "torch"], default="cprofile",
+                        help="cprofile: .prof 통계, torch: Chrome trace .json")
+    args = parser.parse_args()
+
+    # 일괄 모드에서는 단계별 시간 요약을 stderr에 출력
+    if args.metrics or args.input:
+        export_at_exit(args.metrics, report=bool(args.input))
+    if args.profile:
+        profile_until_exit(args.profile, args.profiler)
+
+    category = args.category
+    threshold = args.threshold
+    cache_dir = PREPROCESS_CACHE_DIR if args.cache else None
+
+    # threshold 보정: 정상 이미지 점수 분포를 배치로 계산
+    if args.calibrate:
+        categories = args.category.split(",")
+        registry = ModelRegistry(capacity=1, device=args.device)
+        for name in categories:
+            calibrate_category(registry.get(name), name, args.data_root, method=args.method,
+                               percentile=args.percentile, k=args.k, batch_size=args.batch_size,
+                               num_workers=args.workers, device=args.device, cache_dir=cache_dir,
+                               preprocessed=args.preprocessed)
+        sys.exit(0)
+
+    # 일괄 모드: 시각화 없이 점수/판정만 기록
+    if args.input:
+        registry = ModelRegistry(capacity=args.max_models, device=args.device)
+        writer = ScoreWriter(args.output)
+        map_writer = MapWriter(args.maps) if args.maps else None
+        try:
+            normal, anomaly, failed = score_to_writer(
+                registry, iter_image_paths(args.input), category, threshold, writer,
+                batch_size=args.batch_size, num_workers=args.workers, device=args.device,
+                preprocessed=args.preprocessed, map_writer=map_writer, cache_dir=cache_dir)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            writer.close()
+            if map_writer:
+                map_writer.close()
+        print(f"[{category}] 정상 {normal}개, 이상 {anomaly}개, 실패 {failed}개", file=sys.stderr)
+        print(f"모델 캐시: {registry.stats()}", file=sys.stderr)
+        sys.exit(0)
+
+    model = load_model(category, device=args.device)
+    if threshold is None:
+        threshold = load_threshold(category)
+
+    img_path = args.image
+    with METRICS.timer("anomaly.load"):
+        tensor_original, tensor_preprocessed = load_image(img_path, category, cache_dir)
+    # 시각화할 때는 히트맵까지 같은 forward pass에서 계산 (배치 모드의 score_paths와 동일)
+    with METRICS.timer("anomaly.forward"):
+        images = tensor_original.to(args.device)
+        if args.no_show:
+            scores, output = compute_anomaly_scores(model, images)
+            anomaly_maps = None
+        else:
+            anomaly_maps = compute_anomaly_maps(model, images, return_output=True)
+            scores, output = anomaly_maps["scores"], anomaly_maps["output"]
+        loss = scores[0].item()
 
     print(f"[{category}] 이미지: {img_path}")
     print(f"Anomaly Score: {loss:.6f}")
     print("Status:", "Anomaly" if loss > threshold else "Normal")  # Threshold 조절 가능
 
-    # 시각화 (원본, 전처리, 복원)
-    show_images(tensor_original, tensor_preprocessed, output, category, img_path, loss, threshold)
\ No newline at end of file
+    # 시각화 (원본, 전처리, 복원, 히트맵)
+    if not args.no_show:
+        show_images(tensor_original, tensor_preprocessed, output, category, img_path, loss, threshold, anomaly_maps)
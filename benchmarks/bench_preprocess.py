@@ -0,0 +1,165 @@
+"""
+이상 탐지 전처리 마이크로벤치마크: PIL get_transform vs OpenCV 배열 경로
+
+사용법:
+    python -m benchmarks.bench_preprocess --category cable --size 1024x1024 --count 64
+    python -m benchmarks.bench_preprocess --images data/cable/test/cut
+
+이미지별 처리 시간(디코딩 포함/제외)과 결정적 단계(리사이즈 + CLAHE)의 출력 차이를 출력합니다.
+--images를 주지 않으면 임시 폴더에 합성 이미지를 만들어 사용합니다.
+
+OpenCV 배열 경로는 이 벤치마크에만 있는 비교 대상이며 실제 전처리(preprocess_img)에는 사용하지 않습니다.
+측정 결과 (스레드 1개, 640x480 JPEG, python -m benchmarks.run --suites preprocess):
+  - cable (리사이즈 + CLAHE): 디코딩 포함 0.98~1.07배, 변환만 0.85~1.0배로 이득 없음
+    (CLAHE는 이미지마다 따로 호출해야 해서 배치로 묶을 수 없고, 비용 대부분이 CLAHE와 디코딩)
+  - 리사이즈만 하는 카테고리: 디코딩 포함 약 1.4배
+  - 결정적 단계 출력 차이 (0~255): cable 최대 약 60 / 평균 4.7, 그 외 최대 약 20 / 평균 3.4,
+    1024x1024에서는 cable 최대 85 / 평균 12.5 (축소 시 cv2.INTER_AREA와 PIL antialias bilinear의 필터 차이를
+    CLAHE가 증폭) - PIL 기준으로 보정한 threshold에 대해 판정이 바뀔 수 있는 크기
+"""
+import os
+import time
+import tempfile
+import argparse
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from preprocess_img import get_transform, deterministic_steps, random_steps, clahe_array, IMAGE_SIZE
+from utils.anomaly_batch import iter_image_paths
+
+
+# ----- 비교 대상: NumPy/OpenCV 배열 경로 (PIL 변환 없이 uint8 배열에서 리사이즈/CLAHE, 마지막에 한 번만 float 변환) -----
+
+def read_rgb(path) -> np.ndarray:
+    """이미지 파일 → RGB uint8 (H, W, 3) (PIL의 convert('RGB')와 같이 alpha는 버림)"""
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"이미지를 읽을 수 없습니다: {path}")
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def resize_array(img: np.ndarray, size=IMAGE_SIZE) -> np.ndarray:
+    h, w = size
+    if img.shape[0] == h and img.shape[1] == w:
+        return img
+    shrink = img.shape[0] >= h and img.shape[1] >= w
+    return cv2.resize(img, (w, h), interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LINEAR)
+
+
+def preprocess_array(img: np.ndarray, category: str) -> np.ndarray:
+    """결정적 단계(리사이즈 + 카테고리별 CLAHE)를 uint8 배열에서 수행"""
+    img = resize_array(img)
+    if deterministic_steps(category):
+        img = clahe_array(img)
+    return img
+
+
+def jitter_batch(batch: torch.Tensor, brightness=0.1, contrast=0.15, generator=None) -> torch.Tensor:
+    """
+    (B, 3, H, W) float 배치에 이미지별 ColorJitter(brightness, contrast) 적용
+    torchvision처럼 이미지마다 계수와 적용 순서(밝기→대비 / 대비→밝기)를 무작위로 선택
+    """
+    n = batch.shape[0]
+    b = torch.empty(n, 1, 1, 1).uniform_(1 - brightness, 1 + brightness, generator=generator)
+    c = torch.empty(n, 1, 1, 1).uniform_(1 - contrast, 1 + contrast, generator=generator)
+    brightness_first = torch.rand(n, 1, 1, 1, generator=generator) < 0.5
+
+    def adjust_contrast(x):
+        gray = (0.2989 * x[:, 0] + 0.587 * x[:, 1] + 0.114 * x[:, 2])
+        mean = gray.mean(dim=(1, 2)).view(-1, 1, 1, 1)
+        return (c * x + (1 - c) * mean).clamp_(0, 1)
+
+    a = adjust_contrast((batch * b).clamp_(0, 1))
+    z = (adjust_contrast(batch) * b).clamp_(0, 1)
+    return torch.where(brightness_first, a, z)
+
+
+def arrays_to_batch(arrays, category=None, jitter=False, generator=None) -> torch.Tensor:
+    """uint8 (H, W, 3) 배열 목록 → float (B, 3, H, W) [0, 1] 텐서 (변환은 배치 전체에 한 번)"""
+    batch = torch.from_numpy(np.stack(arrays)).permute(0, 3, 1, 2).float().div_(255)
+    if jitter and random_steps(category):
+        batch = jitter_batch(batch, generator=generator)
+    return batch
+
+
+def make_synthetic(folder, count, size, seed=0):
+    """부드러운 노이즈 이미지 (실제 사진처럼 압축/보간 특성이 있도록 블러 적용)"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    paths = []
+    for i in range(count):
+        img = (rng.random((h, w, 3)) * 255).astype(np.uint8)
+        img = cv2.GaussianBlur(img, (0, 0), sigmaX=max(1.0, w / 256))
+        path = os.path.join(folder, f"synthetic_{i:04d}.png")
+        cv2.imwrite(path, img)
+        paths.append(path)
+    return paths
+
+
+def timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(paths, category, repeat=3):
+    n = len(paths)
+    pil_transform = get_transform(category)
+    det_transform = transforms.Compose([transforms.Resize((128, 128)), *deterministic_steps(category),
+                                        transforms.ToTensor()])
+
+    # 디코딩 결과를 미리 메모리에 올려 전처리만 따로 측정
+    pil_images = [Image.open(p).convert("RGB") for p in paths]
+    arrays = [read_rgb(p) for p in paths]
+
+    results = {
+        "pil_end_to_end": timeit(lambda: torch.stack([pil_transform(Image.open(p).convert("RGB")) for p in paths]),
+                                 repeat),
+        "cv2_end_to_end": timeit(lambda: arrays_to_batch([preprocess_array(read_rgb(p), category) for p in paths],
+                                                         category, jitter=True), repeat),
+        "pil_transform_only": timeit(lambda: torch.stack([pil_transform(img) for img in pil_images]), repeat),
+        "cv2_transform_only": timeit(lambda: arrays_to_batch([preprocess_array(a, category) for a in arrays],
+                                                             category, jitter=True), repeat),
+    }
+
+    # 결정적 단계 출력 차이 (0~255 단위)
+    ref = torch.stack([det_transform(img) for img in pil_images])
+    new = arrays_to_batch([preprocess_array(a, category) for a in arrays])
+    diff = (ref - new).abs() * 255
+
+    print(f"[{category}] {n}개 이미지, {pil_images[0].size[0]}x{pil_images[0].size[1]} (best of {repeat})")
+    for name, seconds in results.items():
+        print(f"   {name:<20} {1000 * seconds / n:8.3f} ms/image")
+    speedup = results["pil_end_to_end"] / results["cv2_end_to_end"]
+    print(f"   speedup (end-to-end) x{speedup:.2f}, "
+          f"x{results['pil_transform_only'] / results['cv2_transform_only']:.2f} (transform only)")
+    print(f"   출력 차이: max {diff.max().item():.1f}/255, mean {diff.mean().item():.3f}/255")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="이상 탐지 전처리 마이크로벤치마크")
+    parser.add_argument("--images", nargs="+", help="측정할 이미지 폴더/파일 (없으면 합성 이미지)")
+    parser.add_argument("--category", default="cable")
+    parser.add_argument("--count", type=int, default=32, help="합성 이미지 수")
+    parser.add_argument("--size", default="1024x1024", help="합성 이미지 크기 WxH")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=1, help="torch/cv2 스레드 수 (기본 1: 이미지당 비용 측정)")
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    cv2.setNumThreads(args.threads)
+
+    if args.images:
+        run(list(iter_image_paths(args.images)), args.category, args.repeat)
+    else:
+        size = tuple(int(v) for v in args.size.lower().split("x"))
+        with tempfile.TemporaryDirectory() as folder:
+            run(make_synthetic(folder, args.count, size), args.category, args.repeat)
@@ -0,0 +1,175 @@
+"""
+오프라인 벤치마크 실행기
+
+합성 이미지/임베딩과 가중치 없는 stub 모델만 사용하므로 네트워크 없이 실행됩니다.
+결과는 {"meta": ..., "metrics": {"영역.조건.지표": 값}} 형태의 JSON으로 저장하고,
+--baseline을 주면 저장된 결과와 지표별로 비교합니다.
+
+사용 예:
+    python -m benchmarks.run --sizes 1000,100000 --out bench.json
+    python -m benchmarks.run --sizes 1000000 --suites store,search --baseline bench.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+
+import numpy as np
+import torch
+
+from benchmarks import suite
+from benchmarks.synthetic import make_images, make_embeddings, make_queries, stub_embedder
+
+SUITES = ("embed", "store", "search", "anomaly", "preprocess", "startup")
+HIGHER_IS_BETTER = ("_per_s", "qps", "recall")
+LOWER_IS_BETTER = ("_ms", "_s", "_mb")
+
+
+def direction(name):
+    """1: 클수록 좋음, -1: 작을수록 좋음, 0: 비교하지 않음"""
+    if name.endswith(HIGHER_IS_BETTER):
+        return 1
+    if name.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(metrics, baseline, tolerance=0.1):
+    """
+    Returns:
+        [(지표, 기준값, 현재값, 변화율, 상태), ...]  상태: "better" | "worse" | "same"
+        변화율은 좋아진 방향이 양수
+    """
+    rows = []
+    for name in sorted(set(metrics) & set(baseline)):
+        sign = direction(name)
+        old, new = baseline[name], metrics[name]
+        if not sign or not old:
+            continue
+        change = sign * (new - old) / abs(old)
+        status = "better" if change > tolerance else "worse" if change < -tolerance else "same"
+        rows.append((name, old, new, change, status))
+    return rows
+
+
+def environment(args):
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "args": vars(args),
+    }
+
+
+def run(args, workdir):
+    metrics = {}
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b.strip()]
+
+    images = []
+    if {"embed", "anomaly", "preprocess"} & set(suites):
+        images = make_images(os.path.join(workdir, "images"), args.images, seed=args.seed)
+
+    for name in suites:
+        print(f"⏱ {name}")
+        if name == "embed":
+            embedder = stub_embedder(args.stub, device=args.device)
+            metrics.update(suite.bench_embed(embedder, images, batch_sizes, args.workers))
+        elif name == "anomaly":
+            metrics.update(suite.bench_anomaly(batch_sizes, paths=images, num_workers=args.workers))
+        elif name == "preprocess":
+            from benchmarks.bench_preprocess import run as bench_preprocess
+            results = bench_preprocess(images, "cable", args.repeat)
+            metrics.update({f"preprocess.{key}.images_per_s": len(images) / seconds
+                            for key, seconds in results.items()})
+        elif name == "startup":
+            from benchmarks.startup import startup_metrics
+            metrics.update(startup_metrics())
+        elif name in ("store", "search"):
+            for n in sizes:
+                out = os.path.join(workdir, f"vectors-{n}-{args.dim}.npy") if n * args.dim > 1 << 26 else None
+                vectors = make_embeddings(n, args.dim, seed=args.seed, out=out)
+                if name == "store":
+                    metrics.update(suite.bench_store(vectors, workdir))
+                else:
+                    queries = make_queries(vectors, args.queries, seed=args.seed + 1)
+                    metrics.update(suite.bench_search(vectors, queries, k=args.top_k,
+                                                      ivf=not args.no_ivf, nprobe=args.nprobe))
+                del vectors
+        else:
+            raise ValueError(f"알 수 없는 suite: {name} (가능: {', '.join(SUITES)})")
+    return metrics
+
+
+def print_metrics(metrics):
+    width = max((len(name) for name in metrics), default=0)
+    for name in sorted(metrics):
+        print(f"  {name:<{width}}  {metrics[name]:.4g}")
+
+
+def print_comparison(rows):
+    width = max((len(row[0]) for row in rows), default=0)
+    marks = {"better": "✅", "worse": "❌", "same": "  "}
+    for name, old, new, change, status in rows:
+        print(f"{marks[status]} {name:<{width}}  {old:10.4g} → {new:10.4g}  ({change:+.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="임베딩/인덱스/검색/이상 탐지 오프라인 벤치마크")
+    parser.add_argument("--suites", default="embed,store,search,anomaly",
+                        help=f"실행할 항목 (쉼표 구분, 가능: {', '.join(SUITES)})")
+    parser.add_argument("--sizes", default="1000,100000", help="임베딩 DB 크기 (쉼표 구분, 예: 1000,100000,1000000)")
+    parser.add_argument("--dim", type=int, default=512, help="임베딩 차원")
+    parser.add_argument("--queries", type=int, default=200, help="검색 지연 시간 측정 쿼리 수")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF 검색 시 탐색할 리스트 수")
+    parser.add_argument("--no-ivf", action="store_true", help="근사 검색(IVF) 측정 생략")
+    parser.add_argument("--images", type=int, default=256, help="합성 이미지 수 (embed/anomaly/preprocess)")
+    parser.add_argument("--batch-sizes", default="1,8,32,64", help="embed/anomaly 배치 크기 (쉼표 구분)")
+    parser.add_argument("--workers", type=int, default=4, help="디코딩 스레드 수")
+    parser.add_argument("--repeat", type=int, default=3, help="preprocess 반복 횟수")
+    parser.add_argument("--stub", choices=["tiny", "resnet"], default="tiny",
+                        help="임베딩 모델 stub (tiny: I/O 경로 위주, resnet: 무작위 가중치 ResNet-50)")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="합성 데이터/임시 저장소 폴더 (기본값: 임시 폴더, 종료 시 삭제)")
+    parser.add_argument("--out", help="결과 JSON 경로")
+    parser.add_argument("--baseline", help="비교할 이전 결과 JSON")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="변화로 보지 않을 비율 (기본값: 10%%)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="기준보다 나빠진 지표가 있으면 종료 코드 1")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench-")
+    try:
+        metrics = run(args, workdir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {"meta": environment(args), "metrics": metrics}
+    print("\n📊 결과")
+    print_metrics(metrics)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 저장: {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(metrics, baseline["metrics"], args.tolerance)
+        print(f"\n📈 기준 대비 ({args.baseline}, 허용 ±{args.tolerance:.0%})")
+        print_comparison(rows)
+        if args.fail_on_regression and any(row[4] == "worse" for row in rows):
+            sys.exit(1)
@@ -0,0 +1,135 @@
+"""
+시작 시간 리포트: 진입점별 import 시간(-X importtime)과 무거운 모듈(torch/clip) import 여부
+
+사용법:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --top 20 --budget-ms 500
+
+각 진입점을 새 프로세스에서 import하여 누적 import 시간과 self 시간이 큰 모듈을 출력합니다.
+모델 없이 시작해야 하는 진입점(CLI, GUI, 서버 모듈)이 torch/clip을 import하면 종료 코드 1을 반환하므로
+회귀 검사로 사용할 수 있습니다. (--help 실행 시간은 벽시계 기준)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 모델을 실제로 사용하기 전에는 import되면 안 되는 모듈
+HEAVY_MODULES = ("torch", "torchvision", "clip")
+# 진입점 → torch 없이 import되어야 하는지
+ENTRY_POINTS = {
+    "config": True,
+    "models.embedder": True,
+    "search_main_cli": True,
+    "search_server": True,
+    "search_gui_app": True,
+    "anomaly_main": False,
+}
+HELP_COMMANDS = {
+    "search_main_cli": [sys.executable, "search_main_cli.py", "--help"],
+    "search_server": [sys.executable, "search_server.py", "--help"],
+}
+
+
+def parse_importtime(stderr):
+    """-X importtime 출력 → [(모듈, self_us, cumulative_us, 깊이)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(parts[0]), int(parts[1]), depth))
+    return rows
+
+
+def import_profile(module, python=sys.executable):
+    """
+    새 프로세스에서 module을 import
+
+    Returns:
+        {"module", "ok", "error", "import_ms", "heavy": [import된 무거운 모듈], "modules": [(이름, self_us, cumulative_us, 깊이)]}
+    """
+    code = (f"import sys, json\nimport {module}\n"
+            f"print(json.dumps(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)))")
+    proc = subprocess.run([python, "-X", "importtime", "-c", code], cwd=ROOT,
+                          capture_output=True, text=True)
+    rows = parse_importtime(proc.stderr)
+    result = {"module": module, "ok": proc.returncode == 0, "error": None, "heavy": [], "modules": rows,
+              "import_ms": next((cum / 1000 for name, _, cum, depth in rows if name == module and depth == 0), 0.0)}
+    if proc.returncode == 0:
+        result["heavy"] = json.loads(proc.stdout.strip().splitlines()[-1])
+    else:
+        result["error"] = (proc.stderr.strip().splitlines() or ["?"])[-1]
+    return result
+
+
+def command_seconds(cmd):
+    """명령 실행 벽시계 시간 (초)"""
+    start = time.perf_counter()
+    subprocess.run(cmd, cwd=ROOT, capture_output=True)
+    return time.perf_counter() - start
+
+
+def startup_metrics(entries=ENTRY_POINTS, help_commands=HELP_COMMANDS):
+    """benchmarks.run의 startup suite용 지표 (import에 실패한 진입점은 제외)"""
+    metrics = {}
+    for module in entries:
+        result = import_profile(module)
+        if result["ok"]:
+            metrics[f"startup.{module}.import_ms"] = result["import_ms"]
+    for name, cmd in help_commands.items():
+        metrics[f"startup.{name}.help_s"] = command_seconds(cmd)
+    return metrics
+
+
+def report(result, top=15):
+    if not result["ok"]:
+        print(f"⚠️ {result['module']}: import 실패 ({result['error']})")
+        return
+    heavy = ", ".join(result["heavy"]) or "없음"
+    print(f"📦 {result['module']}: {result['import_ms']:.1f}ms (torch/clip: {heavy})")
+    for name, self_us, cumulative_us, depth in sorted(result["modules"], key=lambda r: -r[1])[:top]:
+        print(f"   {self_us / 1000:8.1f}ms self  {cumulative_us / 1000:8.1f}ms 누적  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="진입점별 import 시간 리포트 및 지연 import 회귀 검사")
+    parser.add_argument("--entries", default=",".join(ENTRY_POINTS), help="쉼표로 구분한 모듈 이름")
+    parser.add_argument("--top", type=int, default=10, help="self 시간이 큰 모듈을 몇 개 출력할지")
+    parser.add_argument("--budget-ms", type=float, help="진입점 import 시간 상한 (넘으면 실패)")
+    parser.add_argument("--out", help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+
+    failures = []
+    results = []
+    for module in [m.strip() for m in args.entries.split(",") if m.strip()]:
+        result = import_profile(module)
+        results.append(result)
+        report(result, args.top)
+        if not result["ok"]:
+            continue
+        if ENTRY_POINTS.get(module, False) and result["heavy"]:
+            failures.append(f"{module}이(가) import 시 {', '.join(result['heavy'])}을(를) 로드함")
+        if args.budget_ms and result["import_ms"] > args.budget_ms:
+            failures.append(f"{module} import {result['import_ms']:.0f}ms > {args.budget_ms:.0f}ms")
+
+    for name, cmd in HELP_COMMANDS.items():
+        print(f"⏱ {' '.join(os.path.basename(c) for c in cmd[1:])}: {command_seconds(cmd):.2f}s")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump([{k: v for k, v in r.items() if k != "modules"} for r in results], f, indent=2, ensure_ascii=False)
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("✅ 지연 import 검사 통과")
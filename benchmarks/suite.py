@@ -0,0 +1,176 @@
+"""
+벤치마크 항목별 측정 함수. 모두 {"영역.조건.지표": 값} 형태의 평평한 dict를 반환합니다.
+
+지표 이름 규칙 (baseline 비교에 사용):
+    *_per_s, *qps, *recall → 클수록 좋음
+    *_ms, *_s, *_mb        → 작을수록 좋음
+"""
+import os
+import time
+import pickle
+
+import numpy as np
+import torch
+
+from utils.embedding_store import save_store, load_store
+from utils.search import SearchIndex
+from benchmarks.synthetic import make_store
+
+
+def latency(samples):
+    """초 단위 측정값 목록 → p50/p99/mean (ms)"""
+    ms = np.asarray(samples) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99)),
+            "mean_ms": float(ms.mean())}
+
+
+def prefixed(prefix, values):
+    return {f"{prefix}.{name}": value for name, value in values.items()}
+
+
+def bench_embed(embedder, paths, batch_sizes=(1, 8, 32, 64), num_workers=4):
+    """Embedder.embed_many 처리량 (디코딩 + 전처리 + forward + 정규화) 배치 크기별"""
+    results = {}
+    # 첫 호출의 초기화 비용(스레드/메모리 할당)을 제외
+    for _ in embedder.embed_many(paths[:min(len(paths), 8)], batch_size=8, num_workers=num_workers):
+        pass
+    for bs in batch_sizes:
+        start = time.perf_counter()
+        count = sum(1 for _, vec in embedder.embed_many(paths, batch_size=bs, num_workers=num_workers)
+                    if not isinstance(vec, Exception))
+        elapsed = time.perf_counter() - start
+        results[f"embed.b{bs}.images_per_s"] = count / elapsed
+    return results
+
+
+def bench_store(vectors, workdir, pickle_limit=200000, k=10, num_queries=100):
+    """
+    저장 형식별 저장/로드 시간, 첫 검색 인덱스 생성 시간, 디스크 크기와 float32 대비 recall@k
+    (float16/int8은 기본값인 rerank용 float32 원본 포함, int8은 원본 없이 양자화 값만 쓰는 경우도 측정)
+    """
+    n = len(vectors)
+    store = make_store(vectors)
+    results = {}
+    queries = np.asarray(vectors[:min(n, num_queries)], dtype=np.float32)
+    expected = None
+
+    for name, dtype, rerank in (("float32", "float32", False), ("float16", "float16", True),
+                                ("int8", "int8", True), ("int8_norerank", "int8", False)):
+        store_dir = os.path.join(workdir, f"store-{name}-{n}")
+        start = time.perf_counter()
+        save_store(store, store_dir, dtype=dtype, rerank=rerank)
+        save_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        loaded = load_store(store_dir)
+        load_s = time.perf_counter() - start
+
+        # memmap 페이지를 실제로 읽고 (float16이면 float32로 변환) 검색 가능한 상태까지
+        start = time.perf_counter()
+        index = SearchIndex.from_db(loaded)
+        index.search(vectors[0], 10)
+        index_s = time.perf_counter() - start
+
+        found = [{f for f, _ in r} for r in index.search_batch(queries, k)]
+        if expected is None:
+            expected = found
+        hits = sum(len(e & f) for e, f in zip(expected, found))
+
+        metrics = {
+            "save_s": save_s, "load_s": load_s, "first_search_s": index_s,
+            # 검색에 쓰는 행렬 (int8은 행별 scale 포함), rerank 원본은 따로 표시
+            "disk_mb": store_files_mb(store_dir, ("vectors-", "scales-")),
+            "recall": hits / max(1, len(queries) * k),
+        }
+        if rerank:
+            metrics["rerank_disk_mb"] = store_files_mb(store_dir, ("rerank-",))
+        results.update(prefixed(f"store.{name}.n{n}", metrics))
+
+    # 이전 pickle 형식 ({파일명: torch 텐서}) - 대용량에서는 생략
+    if n <= pickle_limit:
+        path = os.path.join(workdir, f"db-{n}.pkl")
+        db = {fname: torch.from_numpy(np.array(vectors[i])) for i, fname in enumerate(store.ids)}
+        with open(path, "wb") as f:
+            pickle.dump(db, f)
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            db = pickle.load(f)
+        load_s = time.perf_counter() - start
+        start = time.perf_counter()
+        SearchIndex.from_db(db).search(vectors[0], 10)
+        results.update(prefixed(f"store.pickle.n{n}", {
+            "load_s": load_s, "first_search_s": time.perf_counter() - start,
+            "disk_mb": os.path.getsize(path) / 2**20,
+        }))
+    return results
+
+
+def store_files_mb(store_dir, prefixes):
+    return sum(os.path.getsize(os.path.join(store_dir, f)) for f in os.listdir(store_dir)
+               if f.startswith(prefixes) and f.endswith(".npy")) / 2**20
+
+
+def bench_search(vectors, queries, k=10, batch=256, ivf=True, nprobe=8, pq_m=0):
+    """exact / IVF 검색 지연 시간(p50/p99)과 처리량(QPS), IVF recall@k"""
+    n = len(vectors)
+    store = make_store(vectors)
+    exact = SearchIndex.from_db(store)
+    results = {}
+
+    def measure(prefix, index):
+        index.search(queries[0], k)  # warm-up
+        samples = []
+        for q in queries:
+            start = time.perf_counter()
+            index.search(q, k)
+            samples.append(time.perf_counter() - start)
+        stats = latency(samples)
+        stats["qps"] = len(queries) / sum(samples)
+
+        start = time.perf_counter()
+        for i in range(0, len(queries), batch):
+            index.search_batch(queries[i:i + batch], k)
+        stats["batch_qps"] = len(queries) / (time.perf_counter() - start)
+        results.update(prefixed(prefix, stats))
+
+    measure(f"search.exact.n{n}", exact)
+
+    if ivf:
+        from utils.ann import IVFIndex
+
+        start = time.perf_counter()
+        ann = IVFIndex.train(vectors, store.ids, pq_m=pq_m, nprobe=nprobe)
+        if pq_m:
+            ann.rerank_vectors = vectors
+        results[f"search.ivf.n{n}.train_s"] = time.perf_counter() - start
+        measure(f"search.ivf.n{n}", ann)
+
+        truth = exact.search_batch(queries, k)
+        found = ann.search_batch(queries, k)
+        hits = sum(len({f for f, _ in t} & {f for f, _ in a}) for t, a in zip(truth, found))
+        results[f"search.ivf.n{n}.recall"] = hits / (k * len(queries))
+    return results
+
+
+def bench_anomaly(batch_sizes=(1, 16, 64), iterations=20, paths=None, num_workers=4):
+    """AutoEncoder 점수 계산 처리량 (무작위 가중치, 텐서만 / 디코딩 포함)"""
+    from models.anomaly_detector_encoder import AutoEncoder, compute_anomaly_scores
+    from utils.anomaly_batch import score_paths
+
+    model = AutoEncoder().eval()
+    results = {}
+    for bs in batch_sizes:
+        images = torch.rand(bs, 3, 128, 128)
+        compute_anomaly_scores(model, images)  # warm-up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            compute_anomaly_scores(model, images)
+        results[f"anomaly.b{bs}.images_per_s"] = bs * iterations / (time.perf_counter() - start)
+
+    if paths:
+        start = time.perf_counter()
+        count = sum(1 for _, score, _ in score_paths(model, paths, "cable", batch_size=max(batch_sizes),
+                                                     num_workers=num_workers, preprocessed=True)
+                    if not isinstance(score, Exception))
+        results["anomaly.e2e.images_per_s"] = count / (time.perf_counter() - start)
+    return results
@@ -0,0 +1,112 @@
+"""
+벤치마크용 합성 데이터와 네트워크 없이 쓸 수 있는 모델 stub
+"""
+import os
+
+import cv2
+import numpy as np
+import torch
+from torchvision import models, transforms
+
+from models.embedder import Embedder
+from utils.embedding_store import EmbeddingStore
+
+
+def make_images(folder, count, size=(640, 480), seed=0, ext=".jpg"):
+    """
+    부드러운 노이즈 이미지 count장 생성 (이미 있으면 재사용)
+
+    Returns:
+        이미지 경로 목록
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    w, h = size
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"synthetic_{i:06d}{ext}")
+        if not os.path.exists(path):
+            img = (rng.random((h // 8, w // 8, 3)) * 255).astype(np.uint8)
+            img = cv2.resize(img, (w, h), interpolation=cv2.INTER_CUBIC)
+            cv2.imwrite(path, img)
+        paths.append(path)
+    return paths
+
+
+def make_embeddings(n, dim=512, clusters=256, noise=0.5, seed=0, out=None, chunk=65536):
+    """
+    클러스터 구조가 있는 L2 정규화된 (n, dim) float32 행렬 (실제 임베딩처럼 이웃이 모여 있음)
+
+    out: .npy 경로를 주면 memmap으로 구간별 생성 (1M x 512 = 2GB도 메모리를 두 배로 쓰지 않음)
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    if out:
+        vectors = np.lib.format.open_memmap(out, mode="w+", dtype=np.float32, shape=(n, dim))
+    else:
+        vectors = np.empty((n, dim), dtype=np.float32)
+
+    for start in range(0, n, chunk):
+        m = min(chunk, n - start)
+        block = centers[rng.integers(0, clusters, m)] + noise * rng.standard_normal((m, dim)).astype(np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        vectors[start:start + m] = block
+    return vectors
+
+
+def make_queries(vectors, count, noise=0.1, seed=1):
+    """DB 행에 잡음을 더한 쿼리 (정답 근처에 이웃이 있는 현실적인 쿼리)"""
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(vectors), count)
+    queries = np.asarray(vectors[np.sort(rows)], dtype=np.float32)
+    queries += noise * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(queries.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def make_store(vectors, model_name="stub"):
+    ids = [f"img_{i:07d}.jpg" for i in range(len(vectors))]
+    meta = {fname: {"mtime": 0, "size": 0} for fname in ids}
+    return EmbeddingStore(ids, vectors, meta=meta, model_name=model_name)
+
+
+class _TinyEncoder(torch.nn.Module):
+    """가벼운 conv 인코더 (I/O·배치 경로 측정용)"""
+
+    def __init__(self, dim=512):
+        super().__init__()
+        self.features = torch.nn.Sequential(
+            torch.nn.Conv2d(3, 32, 7, stride=4, padding=3), torch.nn.ReLU(),
+            torch.nn.Conv2d(32, 64, 3, stride=2, padding=1), torch.nn.ReLU(),
+            torch.nn.AdaptiveAvgPool2d(1),
+        )
+        self.proj = torch.nn.Linear(64, dim)
+
+    def forward(self, x):
+        return self.proj(self.features(x).flatten(1))
+
+
+def stub_embedder(kind="tiny", device="cpu", dim=512):
+    """
+    가중치를 내려받지 않는 Embedder
+
+    kind:
+        tiny: 작은 conv 인코더 (디코딩/배치/정규화 경로 측정)
+        resnet: 무작위 가중치 ResNet-50 (실제 모델과 같은 연산량)
+    """
+    embedder = Embedder.__new__(Embedder)
+    embedder.device = device
+    embedder.model_name = "resnet"  # encode_batch가 self.model(batch) 경로 사용
+    if kind == "resnet":
+        model = models.resnet50(weights=None)
+        embedder.model = torch.nn.Sequential(*list(model.children())[:-1])
+    elif kind == "tiny":
+        embedder.model = _TinyEncoder(dim)
+    else:
+        raise ValueError(f"Unsupported stub: {kind}")
+    embedder.model = embedder.model.to(device).eval()
+    embedder.preprocess = transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ])
+    return embedder
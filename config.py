@@ -1,25 +1,46 @@
 # config.py - 향상된 설정 파일
-import torch
+# (torch를 import하지 않음: --help나 DB만 다루는 명령이 torch 로딩 시간을 기다리지 않도록)
 import os
 
 # 모델 설정
 MODEL_NAME = "clip"  # "clip" 또는 "resnet"
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+DEVICE = "auto"  # "auto"(CUDA가 있으면 cuda), "cuda" 또는 "cpu" - 모델을 처음 사용할 때 결정
 
 # 경로 설정
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 IMAGE_DIR = os.path.join(DATA_DIR, "images")
+STORE_DIR = os.path.join(DATA_DIR, "embeddings")  # memmap 임베딩 행렬 + index.json
+STORE_DTYPE = "float32"  # "float32", "float16" (절반) 또는 "int8" (행별 scale, 약 1/4)
+STORE_RERANK = True  # float16/int8 저장 시 float32 원본도 저장하여 검색 상위 후보를 원본으로 재계산
+# 카탈로그 폴더 목록 캐시 (하위 폴더 포함 스캔 시 mtime이 바뀐 폴더만 다시 나열)
+CATALOG_MANIFEST = os.path.join(DATA_DIR, "catalog_manifest.json")
+# 이전 버전의 pickle DB (STORE_DIR이 없으면 최초 1회 자동 변환)
 DB_PATH = os.path.join(DATA_DIR, "embeddings_db.pkl")
+DB_META_PATH = os.path.join(DATA_DIR, "embeddings_meta.pkl")
 
 # 검색 설정
 DEFAULT_TOP_K = 5
 MAX_TOP_K = 10
 
+# 근사 검색(ANN) 설정 - 대용량 DB용
+INDEX_BACKEND = "exact"  # "exact" 또는 "ivf" (ivf는 --build-ann으로 인덱스를 먼저 학습)
+IVF_NLIST = None  # coarse centroid 수 (None이면 4*sqrt(N))
+IVF_NPROBE = 8  # 검색 시 스캔할 리스트 수 (클수록 정확, 느림)
+PQ_M = 0  # Product Quantization 부분공간 수 (0이면 미사용, 임베딩 차원의 약수)
+ANN_RERANK_FACTOR = 4  # PQ 사용 시 top_k * N개 후보를 원본 벡터로 재계산
+
 # 이미지 설정
 SUPPORTED_FORMATS = ('.jpg', '.jpeg', '.png', '.jfif', '.bmp', '.tiff', '.webp')
 THUMBNAIL_SIZE = (224, 224)
 DISPLAY_SIZE = (150, 150)
+THUMBNAIL_CACHE_DIR = os.path.join(DATA_DIR, "thumbnails")  # 축소 이미지 디스크 캐시
+THUMBNAIL_MEMORY_BYTES = 64 * 1024 * 1024  # 메모리 LRU 캐시 최대 크기 (디코딩된 픽셀 기준)
+THUMBNAIL_PREBUILD = False  # True면 GUI에서 DB 준비 후 전체 카탈로그 썸네일을 미리 생성
+PREPROCESS_CACHE_DIR = os.path.join(DATA_DIR, "preprocessed")  # 이상 탐지 전처리 결과(uint8) 디스크 캐시
+QUERY_CACHE_SIZE = 1024  # 메모리에 유지할 쿼리 임베딩 수 (내용 해시 기준 LRU)
+QUERY_CACHE_DIR = os.path.join(DATA_DIR, "query_cache")  # 쿼리 임베딩 디스크 캐시 (None이면 메모리만)
+TEXT_CACHE_SIZE = 1024  # 메모리에 유지할 텍스트(프롬프트) 임베딩 수 (CLIP 텍스트 검색)
 
 # GUI 설정
 WINDOW_SIZE = "900x700"
@@ -27,11 +48,22 @@ CANVAS_SIZE = (224, 224)
 
 # 성능 설정
 BATCH_SIZE = 32  # 임베딩 생성 시 배치 크기
+DECODE_WORKERS = min(8, os.cpu_count() or 1)  # 이미지 디코딩/전처리 스레드 수
 PROGRESS_UPDATE_INTERVAL = 10  # N개마다 진행상황 출력
+BUILD_WORKERS = 1  # DB 생성/갱신 시 임베딩 프로세스 수 (2 이상이면 샤드별 병렬 임베딩, CPU 전용 환경용)
+HASH_CONTENT = False  # True면 변경 감지에 파일 내용 해시도 사용 (mtime만 바뀐 파일 재임베딩 방지)
+
+# 로컬 검색 서버 설정 (search_server.py)
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_MAX_BATCH = BATCH_SIZE  # 동시 요청을 한 번의 forward pass로 묶는 최대 개수
+SERVER_MAX_LATENCY_MS = 5  # 배치를 모으기 위해 기다리는 최대 시간
+SERVER_QUEUE_SIZE = 256  # 대기 가능한 최대 요청 수 (초과 시 503)
 
 # 디버그 설정
 VERBOSE = True
 LOG_ERRORS = True
+METRICS_PATH = None  # 종료 시 단계별 시간/카운터를 저장할 경로 (.json 또는 Prometheus 텍스트 .prom)
 
 def ensure_directories():
     """필요한 디렉토리들을 생성합니다."""
@@ -45,7 +77,7 @@ def print_config():
         print(f"   Model: {MODEL_NAME.upper()}")
         print(f"   Device: {DEVICE}")
         print(f"   Image Dir: {IMAGE_DIR}")
-        print(f"   Database: {DB_PATH}")
+        print(f"   Database: {STORE_DIR}")
         print(f"   Supported Formats: {SUPPORTED_FORMATS}")
 
 if __name__ == "__main__":
@@ -2,6 +2,12 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import os
+import time
+import threading
+from collections import OrderedDict
+
+# 카테고리별 모델 가중치 위치 (실행 위치와 무관하게 이 파일이 있는 models/ 폴더)
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
 class AutoEncoder(nn.Module):
@@ -27,15 +33,102 @@ class AutoEncoder(nn.Module):
         x = torch.sigmoid(self.dec3(x))  # Normalize output
         return x
 
-def load_model(category):
-    model_path = f"models/autoencoder_{category}.pth"
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(f"Model {model_path} not found")
+def model_path(category, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"autoencoder_{category}.pth")
+
+def available_categories(model_dir=MODEL_DIR):
+    """model_dir에 가중치가 있는 카테고리 목록"""
+    prefix, suffix = "autoencoder_", ".pth"
+    return sorted(f[len(prefix):-len(suffix)] for f in os.listdir(model_dir)
+                  if f.startswith(prefix) and f.endswith(suffix))
+
+def load_model(category, model_dir=MODEL_DIR, device='cpu'):
+    path = model_path(category, model_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model {path} not found")
     model = AutoEncoder()
-    model.load_state_dict(torch.load(model_path, map_location='cpu'))
-    model.eval()
+    model.load_state_dict(torch.load(path, map_location='cpu'))
+    model.to(device).eval()
     return model
 
+
+class ModelRegistry:
+    """
+    카테고리별 AutoEncoder를 처음 사용할 때 로드하고, 최근 사용한 capacity개만 메모리에 유지 (LRU)
+
+    여러 스레드에서 동시에 get()을 호출해도 같은 카테고리는 한 번만 로드합니다.
+    share_memory=True이면 가중치를 공유 메모리로 옮겨, 이후 fork/torch.multiprocessing으로 만든
+    워커 프로세스가 복사 없이 같은 가중치를 사용합니다 (CPU 모델만 해당).
+    """
+
+    def __init__(self, capacity=4, device='cpu', share_memory=False, model_dir=MODEL_DIR):
+        self.capacity = max(1, capacity)
+        self.device = device
+        self.share_memory = share_memory
+        self.model_dir = model_dir
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_times = {}  # 카테고리 → 마지막 로드 시간(초)
+
+    def get(self, category):
+        model = self._lookup(category)
+        if model is not None:
+            return model
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(category, threading.Lock())
+        with load_lock:
+            # 기다리는 동안 다른 스레드가 이미 로드했을 수 있음
+            model = self._lookup(category)
+            if model is not None:
+                return model
+
+            start = time.perf_counter()
+            model = load_model(category, self.model_dir, self.device)
+            if self.share_memory:
+                model.share_memory()
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self.misses += 1
+                self.load_times[category] = elapsed
+                self._models[category] = model
+                while len(self._models) > self.capacity:
+                    self._models.popitem(last=False)
+                    self.evictions += 1
+        return model
+
+    def preload(self, categories):
+        for category in categories:
+            self.get(category)
+
+    def __contains__(self, category):
+        with self._lock:
+            return category in self._models
+
+    def _lookup(self, category):
+        with self._lock:
+            model = self._models.get(category)
+            if model is not None:
+                self._models.move_to_end(category)
+                self.hits += 1
+            return model
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": list(self._models),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "load_time_s": {c: round(t, 4) for c, t in self.load_times.items()},
+            }
+
 def compute_anomaly_score(model, image_tensor):
     """
     image_tensor: shape (1, 3, 128, 128)
@@ -44,3 +137,80 @@ def compute_anomaly_score(model, image_tensor):
         output = model(image_tensor)
         loss = F.mse_loss(output, image_tensor).item()
     return loss, output
+
+def compute_anomaly_scores(model, images):
+    """
+    images: shape (B, 3, 128, 128)
+    배치 전체를 한 번의 forward와 한 번의 reduction으로 처리
+    Returns: ((B,) 이미지별 MSE, 복원 결과)
+    """
+    with torch.no_grad():
+        output = model(images)
+        scores = (output - images).pow(2).flatten(1).mean(dim=1)
+    return scores, output
+
+def _gaussian_kernel(size, sigma, device=None):
+    coords = torch.arange(size, dtype=torch.float32, device=device) - (size - 1) / 2
+    kernel = torch.exp(-coords.pow(2) / (2 * sigma ** 2))
+    return kernel / kernel.sum()
+
+def smooth_maps(maps, kernel_size=7, sigma=None):
+    """(B, H, W) 맵에 분리형 가우시안 블러 적용 (conv2d 두 번)"""
+    if kernel_size <= 1:
+        return maps
+    sigma = sigma or kernel_size / 3
+    kernel = _gaussian_kernel(kernel_size, sigma, maps.device)
+    pad = kernel_size // 2
+    x = maps.unsqueeze(1)
+    x = F.conv2d(F.pad(x, (pad, pad, 0, 0), mode='reflect'), kernel.view(1, 1, 1, -1))
+    x = F.conv2d(F.pad(x, (0, 0, pad, pad), mode='reflect'), kernel.view(1, 1, -1, 1))
+    return x.squeeze(1)
+
+def compute_anomaly_maps(model, images, kernel_size=7, patch_size=16, top_k=3, return_output=False):
+    """
+    images: shape (B, 3, 128, 128)
+    배치 전체에 대해 점수와 위치 정보를 한 번에 계산 (return_output=True면 복원 결과도 "output"으로 반환)
+    Returns: dict
+        scores: (B,) 이미지별 MSE (compute_anomaly_scores와 동일)
+        error_map: (B, H, W) 픽셀별 오차 (채널 평균)
+        heatmap: (B, H, W) 가우시안 블러를 적용한 오차 맵
+        patch_scores: (B, H/p, W/p) patch_size 격자별 평균 오차
+        regions: (B, top_k, 4) 오차가 큰 patch의 (x0, y0, x1, y1) 좌표
+        region_scores: (B, top_k)
+    """
+    with torch.no_grad():
+        output = model(images)
+        error_map = (output - images).pow(2).mean(dim=1)
+        scores = error_map.flatten(1).mean(dim=1)
+        heatmap = smooth_maps(error_map, kernel_size)
+
+        patch_scores = F.avg_pool2d(error_map.unsqueeze(1), patch_size).squeeze(1)
+        grid_w = patch_scores.shape[2]
+        top_k = min(top_k, patch_scores[0].numel())
+        region_scores, idx = patch_scores.flatten(1).topk(top_k, dim=1)
+        x0 = (idx % grid_w) * patch_size
+        y0 = torch.div(idx, grid_w, rounding_mode='floor') * patch_size
+        regions = torch.stack([x0, y0, x0 + patch_size, y0 + patch_size], dim=2)
+
+    result = {
+        "scores": scores,
+        "error_map": error_map,
+        "heatmap": heatmap,
+        "patch_scores": patch_scores,
+        "regions": regions,
+        "region_scores": region_scores,
+    }
+    if return_output:
+        result["output"] = output
+    return result
+
+def compact_heatmaps(heatmap, size=(32, 32)):
+    """
+    (B, H, W) 히트맵 → (B, h, w) uint8 맵과 (B,) 스케일
+    이미지별 최댓값으로 0~255 정규화하므로 원래 값은 map / 255 * scale로 근사 복원
+    """
+    with torch.no_grad():
+        small = F.adaptive_avg_pool2d(heatmap.unsqueeze(1), size).squeeze(1)
+        scale = small.flatten(1).amax(dim=1).clamp_min(1e-12)
+        compact = (small / scale.view(-1, 1, 1) * 255).round().to(torch.uint8)
+    return compact, scale
@@ -1,69 +1,221 @@
-import torch
-from torchvision import models, transforms
 from PIL import Image
-import clip
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from itertools import islice
+import threading
 import sys
 import os
+import io
+import time
+
+from utils.metrics import METRICS, DECODE, PREPROCESS, FORWARD, NORMALIZE
+
+# torch/torchvision/clip은 모델을 처음 사용할 때 import (이 모듈 import는 가볍게 유지)
+SUPPORTED_MODELS = ("clip", "resnet")
+
+
+def resolve_device(device="auto"):
+    """device가 "auto"면 CUDA 사용 가능 여부로 장치 결정 (torch import 발생)"""
+    if device != "auto":
+        return device
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
 
 
 class Embedder:
     """
     CLIP/ResNet 임베딩 추출기
+
+    생성자는 설정만 기록하고, 네트워크는 첫 임베딩(또는 load()) 때 만듭니다.
+    device="auto"도 그때 실제 장치로 바뀝니다.
     """
 
-    def __init__(self, model_name="clip", device="cpu"):
+    # 지연 로딩 전에는 None (benchmarks/synthetic.py처럼 직접 채워 넣으면 load()가 건너뜀)
+    model = None
+    preprocess = None
+    _load_lock = threading.Lock()
+
+    def __init__(self, model_name="clip", device="auto", verbose=False):
         self.device = device
         self.model_name = model_name.lower()
-
-        if self.model_name == "clip":
-            self.model, self.preprocess = clip.load("ViT-B/32", device=self.device)
-        elif self.model_name == "resnet":
-            model = models.resnet50(weights='ResNet50_Weights.DEFAULT')  # pretrained=True 대신 사용
-            self.model = torch.nn.Sequential(*list(model.children())[:-1]).to(self.device).eval()
-            self.preprocess = transforms.Compose([
-                transforms.Resize((224, 224)),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                                     std=[0.229, 0.224, 0.225])
-            ])
-        else:
+        self.verbose = verbose
+        if self.model_name not in SUPPORTED_MODELS:
             raise ValueError(f"Unsupported model: {model_name}")
 
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    def load(self):
+        """모델이 아직 없으면 생성 (여러 스레드에서 동시에 호출해도 한 번만 로드)"""
+        if self.model is not None:
+            return self
+        with self._load_lock:
+            if self.model is not None:
+                return self
+            start = time.perf_counter()
+            self.device = resolve_device(self.device)
+            if getattr(self, "verbose", False):
+                print(f"🤖 모델 로딩 중... ({self.model_name.upper()} on {self.device})")
+
+            if self.model_name == "clip":
+                import clip
+                model, preprocess = clip.load("ViT-B/32", device=self.device)
+            else:
+                import torch
+                from torchvision import models, transforms
+                model = models.resnet50(weights='ResNet50_Weights.DEFAULT')  # pretrained=True 대신 사용
+                model = torch.nn.Sequential(*list(model.children())[:-1]).to(self.device).eval()
+                preprocess = transforms.Compose([
+                    transforms.Resize((224, 224)),
+                    transforms.ToTensor(),
+                    transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                                         std=[0.229, 0.224, 0.225])
+                ])
+            # preprocess를 먼저 채워야 model만 보고 로드 완료를 판단하는 스레드가 None을 보지 않음
+            self.preprocess = preprocess
+            self.model = model
+            METRICS.observe("embed.model_load", time.perf_counter() - start)
+        return self
+
+    def load_tensor(self, source):
+        """
+        이미지 디코딩 + 전처리 (배치 차원 없이 (3, H, W) 반환)
+
+        source: 파일 경로, 이미지 bytes 또는 file-like 객체
+        """
+        self.load()
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        with METRICS.timer(DECODE):
+            image = Image.open(source).convert("RGB")
+        with METRICS.timer(PREPROCESS):
+            return self.preprocess(image)
+
+    def encode_batch(self, batch):
+        """(B, 3, H, W) 배치를 한 번의 forward pass로 인코딩하고 L2 정규화된 (B, D) 반환"""
+        import torch
+
+        self.load()
+        start = time.perf_counter()
+        batch = batch.to(self.device)
+        with torch.no_grad():
+            if self.model_name == "clip":
+                vecs = self.model.encode_image(batch)
+            else:
+                vecs = self.model(batch)
+        # CUDA에서는 forward가 비동기라 남은 GPU 시간은 normalize(.cpu() 동기화)에 포함됨
+        mid = time.perf_counter()
+        METRICS.observe(FORWARD, mid - start, len(batch))
+
+        # (B, D, 1, 1) 등 → (B, D), CUDA의 CLIP fp16 출력도 float32로 통일
+        vecs = vecs.flatten(1).float()
+
+        # 배치 단위 정규화 (zero vector 방지)
+        norms = vecs.norm(dim=1, keepdim=True)
+        zero_rows = norms.squeeze(1) == 0
+        if zero_rows.any():
+            print(f"⚠️ Zero vector detected ({int(zero_rows.sum())}개)")
+            # 작은 랜덤 벡터로 대체
+            vecs[zero_rows] = torch.randn_like(vecs[zero_rows]) * 0.01
+            norms = vecs.norm(dim=1, keepdim=True)
+        vecs = (vecs / norms).cpu()
+        METRICS.observe(NORMALIZE, time.perf_counter() - mid, len(vecs))
+        return vecs
+
+    @property
+    def supports_text(self):
+        return self.model_name == "clip"
+
+    def encode_texts(self, prompts):
+        """
+        텍스트 목록을 한 번의 encode_text 호출로 인코딩하여 L2 정규화된 (B, D) 반환 (CLIP 전용)
+        이미지 임베딩과 같은 공간이므로 기존 이미지 DB/인덱스로 그대로 검색할 수 있습니다.
+        """
+        if not self.supports_text:
+            raise ValueError(f"텍스트 검색은 CLIP 모델에서만 지원합니다 (현재: {self.model_name})")
+        import torch
+        import clip
+
+        self.load()
+        start = time.perf_counter()
+        # 77 토큰을 넘는 긴 프롬프트는 오류 대신 잘라서 사용
+        tokens = clip.tokenize(list(prompts), truncate=True).to(self.device)
+        with torch.no_grad():
+            vecs = self.model.encode_text(tokens).float()
+        vecs = (vecs / vecs.norm(dim=1, keepdim=True).clamp_min(1e-12)).cpu()
+        METRICS.observe("embed.text", time.perf_counter() - start, len(vecs))
+        return vecs
+
+    def get_text_embedding(self, prompt):
+        return self.encode_texts([prompt])[0]
+
     def get_embedding(self, image_path):
         """이미지 임베딩 추출 (오류 처리 강화)"""
         try:
-            # 이미지 로드 및 변환
-            image = Image.open(image_path).convert("RGB")
-            img_tensor = self.preprocess(image).unsqueeze(0).to(self.device)
-
-            with torch.no_grad():
-                if self.model_name == "clip":
-                    vec = self.model.encode_image(img_tensor)
-                else:
-                    vec = self.model(img_tensor).squeeze()
-
-            # 차원 정리 - 1D 벡터로 만들기
-            if vec.dim() > 1:
-                vec = vec.squeeze()
-
-            # 정규화 (zero vector 방지)
-            vec_norm = vec.norm()
-            if vec_norm > 0:
-                vec = vec / vec_norm
-            else:
-                print(f"⚠️ Zero vector detected for {image_path}")
-                # 작은 랜덤 벡터로 대체
-                vec = torch.randn_like(vec) * 0.01
-                vec = vec / vec.norm()
-
+            img_tensor = self.load_tensor(image_path).unsqueeze(0)
             # 최종적으로 1D 벡터 보장
-            vec = vec.flatten()
-            return vec.cpu()
+            return self.encode_batch(img_tensor)[0]
 
         except Exception as e:
             print(f"❌ Error processing {image_path}: {e}")
             raise
 
+    def embed_many(self, image_paths, batch_size=32, num_workers=None, prefetch=2):
+        """
+        여러 이미지를 배치 단위로 임베딩하는 generator
+
+        디코딩/전처리는 워커 스레드에서 미리(prefetch 배치 수만큼) 진행하고,
+        모델 forward는 batch_size 단위로 한 번에 수행합니다.
+        각 이미지마다 (path, vector) 또는 실패 시 (path, Exception)을 yield 합니다.
+        """
+        import torch
+
+        # 로드 실패는 이미지별 오류가 아니라 호출자에게 바로 전달
+        self.load()
+        batch_size = max(1, int(batch_size))
+        if num_workers is None:
+            num_workers = min(8, os.cpu_count() or 1)
+
+        path_iter = iter(image_paths)
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=max(1, num_workers)) as pool:
+            def submit_next():
+                chunk = list(islice(path_iter, batch_size))
+                if chunk:
+                    pending.append([(p, pool.submit(self.load_tensor, p)) for p in chunk])
+
+            for _ in range(max(1, prefetch)):
+                submit_next()
+
+            while pending:
+                chunk = pending.popleft()
+                # 현재 배치를 인코딩하는 동안 다음 배치를 디코딩
+                submit_next()
+
+                ok_paths, tensors = [], []
+                for path, future in chunk:
+                    try:
+                        tensors.append(future.result())
+                        ok_paths.append(path)
+                    except Exception as e:
+                        yield path, e
+
+                if not tensors:
+                    continue
+
+                try:
+                    vecs = self.encode_batch(torch.stack(tensors))
+                except Exception as e:
+                    for path in ok_paths:
+                        yield path, e
+                    continue
+
+                # 배치 텐서의 view가 아닌 독립 텐서로 반환 (pickle 시 배치 전체 저장 방지)
+                for path, vec in zip(ok_paths, vecs):
+                    yield path, vec.clone()
+
 
 # 테스트 실행 코드 (직접 실행 시)
 if __name__ == "__main__":
@@ -73,7 +225,7 @@ if __name__ == "__main__":
 
     image_path = sys.argv[1]
     model_name = sys.argv[2] if len(sys.argv) > 2 else "clip"
-    device = "cuda" if torch.cuda.is_available() else "cpu"
+    device = resolve_device()
 
     if not os.path.exists(image_path):
         print(f"❌ Image not found: {image_path}")
@@ -89,4 +241,4 @@ if __name__ == "__main__":
 
     except Exception as e:
         print(f"❌ Failed to process image: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
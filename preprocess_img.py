@@ -1,39 +1,149 @@
 from torchvision import transforms
+import os
 import cv2
+import hashlib
+import threading
 import numpy as np
+import torch
 from PIL import Image
 
+# 결정적 전처리(리사이즈, CLAHE) 방식이 바뀌면 올려서 기존 디스크 캐시 무효화
+TRANSFORM_VERSION = 1
+IMAGE_SIZE = (128, 128)
+
+_local = threading.local()
+
+def get_clahe():
+    """스레드별로 한 번만 만든 CLAHE 객체 (cv2 CLAHE 객체는 스레드 간 공유 불가)"""
+    clahe = getattr(_local, "clahe", None)
+    if clahe is None:
+        clahe = _local.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    return clahe
+
+def clahe_array(img: np.ndarray) -> np.ndarray:
+    """RGB uint8 (H, W, 3) 배열에 L 채널 CLAHE 적용"""
+    if img.ndim == 2:  # grayscale safety
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+    lab = cv2.cvtColor(img, cv2.COLOR_RGB2LAB)
+    lab[:, :, 0] = get_clahe().apply(lab[:, :, 0])
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
+
 def apply_clahe(pil_img: Image.Image) -> Image.Image:
     if not isinstance(pil_img, Image.Image):
         # 혹시 Tensor가 들어와도 안전하게 변환
         pil_img = transforms.ToPILImage()(pil_img)
-    img = np.array(pil_img)
-    if img.ndim == 2:  # grayscale safety
-        img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
-    lab = cv2.cvtColor(img, cv2.COLOR_RGB2LAB)
-    l, a, b = cv2.split(lab)
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    cl = clahe.apply(l)
-    limg = cv2.merge((cl, a, b))
-    rgb = cv2.cvtColor(limg, cv2.COLOR_LAB2RGB)
-    return Image.fromarray(rgb)
+    return Image.fromarray(clahe_array(np.array(pil_img)))
+
+def deterministic_steps(category: str):
+    """리사이즈 이후 입력이 같으면 결과도 같은 단계 (디스크 캐시 대상)"""
+    if category == 'cable':
+        return [transforms.Lambda(apply_clahe)]
+    return []
+
+def random_steps(category: str):
+    """매번 결과가 달라지는 증강 단계 (캐시하지 않고 로드할 때마다 적용)"""
+    if category == 'cable':
+        return [transforms.ColorJitter(brightness=0.1, contrast=0.15)]
+    return []
 
 def get_transform(category: str):
 
     if category == 'cable':
         """cable : Clahe, 조명·대비, 정규화 """
         steps = [
-            transforms.Resize((128, 128)),
-            transforms.Lambda(apply_clahe),
-            transforms.ColorJitter(brightness=0.1, contrast=0.15),
+            transforms.Resize(IMAGE_SIZE),
+            *deterministic_steps(category),
+            *random_steps(category),
             transforms.ToTensor(),
             # transforms.Normalize(mean=[0.5] * 3, std=[0.5] * 3), # 정규화 : 모델 학습이 잘 되게 하려고 사용(0 ~ 255)
         ]
     else:
         steps = [
-            transforms.Resize((128, 128)),
+            transforms.Resize(IMAGE_SIZE),
             transforms.ToTensor(),
             # transforms.Normalize(mean=[0.5] * 3, std=[0.5] * 3),
         ]
     return transforms.Compose(steps)
 
+def to_tensor(arr: np.ndarray) -> torch.Tensor:
+    """uint8 (H, W, 3) → float (3, H, W) [0, 1] (ToTensor와 동일)"""
+    return torch.from_numpy(np.ascontiguousarray(arr)).permute(2, 0, 1).float().div_(255)
+
+
+class PreprocessEngine:
+    """
+    카테고리별 전처리 엔진
+
+    이미지를 한 번 디코딩/리사이즈하여 원본 뷰와 전처리 뷰를 함께 만들고,
+    cache_dir이 있으면 결정적 단계(리사이즈, CLAHE)의 uint8 결과를
+    (파일 내용 해시, 카테고리, TRANSFORM_VERSION) 키로 디스크에 저장합니다.
+    캐시가 있으면 디코딩 없이 바로 텐서를 만들고, ColorJitter 같은 무작위 단계만 매번 적용합니다.
+    """
+
+    def __init__(self, category, cache_dir=None):
+        self.category = category
+        self.cache_dir = cache_dir
+        self.det_steps = transforms.Compose(deterministic_steps(category))
+        self.random_steps = transforms.Compose(random_steps(category))
+        self.has_det = bool(self.det_steps.transforms)
+        self.has_random = bool(self.random_steps.transforms)
+
+    def cache_path(self, path):
+        h = hashlib.sha1(f"{TRANSFORM_VERSION}|{self.category}|{IMAGE_SIZE}|".encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        key = h.hexdigest()
+        return os.path.join(self.cache_dir, self.category, key[:2], key + ".npy")
+
+    def load_arrays(self, path):
+        """
+        Returns:
+            (resized, deterministic): uint8 (H, W, 3) 배열 두 개
+            (결정적 단계가 없는 카테고리는 같은 배열)
+        """
+        cache_path = self.cache_path(path) if self.cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            try:
+                arrays = np.load(cache_path)
+                resized_arr = arrays[0]
+                return resized_arr, arrays[1] if len(arrays) > 1 else resized_arr
+            except Exception:
+                pass  # 손상된 캐시는 다시 생성
+
+        with Image.open(path) as img:
+            resized = img.convert('RGB').resize(IMAGE_SIZE[::-1], Image.BILINEAR)
+        resized_arr = np.array(resized, dtype=np.uint8)
+        det_arr = np.array(self.det_steps(resized), dtype=np.uint8) if self.has_det else resized_arr
+
+        if cache_path:
+            arrays = np.stack([resized_arr, det_arr]) if self.has_det else resized_arr[None]
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp = f"{cache_path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, arrays)
+            os.replace(tmp, cache_path)
+        return resized_arr, det_arr
+
+    def load(self, path):
+        """
+        Returns:
+            (tensor_original, tensor_preprocessed): (3, H, W) 텐서 두 개
+            tensor_original은 Resize + ToTensor, tensor_preprocessed는 get_transform(category)와 같은 결과
+        """
+        resized, det = self.load_arrays(path)
+        original = to_tensor(resized)
+        return original, self.preprocessed_tensor(det, original if det is resized else None)
+
+    def load_original(self, path):
+        return to_tensor(self.load_arrays(path)[0])
+
+    def load_preprocessed(self, path):
+        resized, det = self.load_arrays(path)
+        return self.preprocessed_tensor(det)
+
+    def preprocessed_tensor(self, det, det_tensor=None):
+        if self.has_random:
+            return transforms.functional.to_tensor(self.random_steps(Image.fromarray(det)))
+        return det_tensor if det_tensor is not None else to_tensor(det)
+
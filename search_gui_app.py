@@ -1,15 +1,26 @@
 import os
-import pickle
+import time
+import queue
+import threading
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import messagebox, ttk
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import tkinterdnd2 as tkdnd
-import torch
 
 from models.embedder import Embedder
-from utils.search import search_similar
+from utils.search import load_index
+from utils.refresh import build_store, refresh_db
+from utils.scanner import list_images, has_images
+from utils.embedding_store import save_store, open_or_migrate, store_exists
+from utils.thumbnails import ThumbnailCache
+from utils.query_cache import QueryCache, TextCache
+from utils.metrics import METRICS, RENDER
 from config import *
 
+# 작업 스레드 → UI 스레드 메시지 큐 확인 주기 (ms)
+UI_POLL_MS = 50
+
 
 class ImageSearchApp(tkdnd.TkinterDnD.Tk):
     def __init__(self):
@@ -29,11 +40,27 @@ class ImageSearchApp(tkdnd.TkinterDnD.Tk):
         self.info_label = tk.Label(info_frame, text="이미지 DB 로딩 중...", font=("Arial", 12))
         self.info_label.pack()
 
+        # DB 생성/갱신 진행률 (작업 중에만 표시)
+        self.progress = ttk.Progressbar(info_frame, mode="indeterminate", length=300)
+
         # 드래그앤드롭 안내
         self.label = tk.Label(main_frame, text="검색할 이미지를 드래그 앤 드롭 하세요",
                               font=("Arial", 16), fg="blue")
         self.label.pack(pady=10)
 
+        # 텍스트 검색 (CLIP: 설명으로 이미지 검색)
+        text_frame = tk.Frame(main_frame)
+        text_frame.pack(pady=(0, 10))
+        tk.Label(text_frame, text="또는 텍스트로 검색:", font=("Arial", 11)).pack(side=tk.LEFT)
+        self.text_entry = tk.Entry(text_frame, width=40, font=("Arial", 11))
+        self.text_entry.pack(side=tk.LEFT, padx=5)
+        self.text_entry.bind("<Return>", self.handle_text_search)
+        self.text_button = tk.Button(text_frame, text="검색", command=self.handle_text_search)
+        self.text_button.pack(side=tk.LEFT)
+        if MODEL_NAME != "clip":
+            self.text_entry.config(state=tk.DISABLED)
+            self.text_button.config(state=tk.DISABLED)
+
         # 쿼리 이미지 표시 영역
         query_frame = tk.Frame(main_frame)
         query_frame.pack(pady=10)
@@ -72,6 +99,28 @@ class ImageSearchApp(tkdnd.TkinterDnD.Tk):
         # 임베딩 모델 및 DB 초기화
         self.embedder = None
         self.db = None
+        self.index = None
+
+        # 작업 스레드: Tk 위젯은 메인 스레드에서만 다루고, 작업 결과는 ui_queue로 전달
+        # - DB 작업(모델 로드/생성/갱신)과 검색은 각각 전용 스레드에서 순서대로 실행
+        # - 썸네일 디코딩은 여러 스레드에서 병렬로 실행
+        self.db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gui-db")
+        self.search_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gui-search")
+        self.thumb_executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="gui-thumb")
+        self.ui_queue = queue.Queue()
+        # 결과/쿼리 썸네일 캐시 (메모리 LRU + 디스크)
+        self.thumbnails = ThumbnailCache(THUMBNAIL_CACHE_DIR, max_bytes=THUMBNAIL_MEMORY_BYTES)
+        # 같은 사진을 다시 드롭하거나 카탈로그 이미지를 드롭하면 임베딩 재계산 생략
+        self.query_cache = QueryCache(MODEL_NAME, QUERY_CACHE_SIZE, QUERY_CACHE_DIR)
+        self.text_cache = TextCache(MODEL_NAME, TEXT_CACHE_SIZE)
+        self.closing = threading.Event()
+        self.busy = False
+        # 드롭할 때마다 증가. 이전 드롭의 결과는 표시하지 않음
+        self.search_generation = 0
+        self.pending_search = None
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.after(UI_POLL_MS, self.poll_ui_queue)
 
         # 필요한 디렉토리 생성
         ensure_directories()
@@ -82,120 +131,192 @@ class ImageSearchApp(tkdnd.TkinterDnD.Tk):
 
         self.init_components()
 
-    def init_components(self):
-        """백그라운드에서 컴포넌트 초기화"""
+    # ----- 작업 스레드 ↔ UI 스레드 -----
+
+    def post(self, fn, *args):
+        """작업 스레드에서 UI 스레드로 fn(*args) 실행 요청"""
+        self.ui_queue.put((fn, args))
+
+    def poll_ui_queue(self):
+        """after()로 주기적으로 호출되어 작업 스레드가 보낸 UI 갱신을 실행"""
+        while True:
+            try:
+                fn, args = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                fn(*args)
+            except Exception as e:
+                if LOG_ERRORS:
+                    print(f"⚠️ UI 갱신 오류: {e}")
+        if not self.closing.is_set():
+            self.after(UI_POLL_MS, self.poll_ui_queue)
+
+    def set_busy(self, text):
+        """DB 작업 시작: 드롭을 막고 진행 표시줄 표시"""
+        self.busy = True
+        self.info_label.config(text=text, fg="orange")
+        self.progress.config(mode="indeterminate", value=0)
+        self.progress.pack(pady=(5, 0))
+        self.progress.start(10)
+
+    def set_idle(self):
+        self.busy = False
+        self.progress.stop()
+        self.progress.pack_forget()
+
+    def set_status(self, text, fg="orange"):
+        self.info_label.config(text=text, fg=fg)
+
+    def report_progress(self, done, total):
+        """embed_files 진행 콜백 (작업 스레드에서 호출). 창이 닫히면 작업 중단"""
+        if self.closing.is_set():
+            raise RuntimeError("창이 닫혀 작업을 중단합니다.")
+        self.post(self.update_progress, done, total)
+
+    def update_progress(self, done, total):
+        if str(self.progress.cget("mode")) != "determinate":
+            self.progress.stop()
+            self.progress.config(mode="determinate")
+        self.progress.config(maximum=max(1, total), value=done)
+        self.info_label.config(text=f"임베딩 생성 중... {done}/{total}", fg="orange")
+
+    def on_db_ready(self, db, index, message):
+        self.db = db
+        self.index = index
+        self.query_cache.set_catalog(db, IMAGE_DIR)
+        self.set_idle()
+        self.info_label.config(text=message, fg="green")
+
+        # 창과 DB를 먼저 띄운 뒤 첫 검색 전에 모델을 미리 로드
+        if self.embedder is not None and not self.embedder.loaded:
+            self.db_executor.submit(self._warm_model)
+
+        # 결과 썸네일 디스크 캐시 미리 생성 (검색과 겹치지 않도록 DB 스레드에서 실행)
+        if THUMBNAIL_PREBUILD and db:
+            paths = [os.path.join(IMAGE_DIR, fname) for fname in db.ids]
+            self.db_executor.submit(self.thumbnails.warm, paths, DISPLAY_SIZE, stop=self.closing)
+
+    def _warm_model(self):
         try:
-            self.info_label.config(text=f"모델 로딩 중... ({MODEL_NAME.upper()} on {DEVICE})")
-            self.update()
+            self.embedder.load()
+        except Exception as e:
+            if not self.closing.is_set():
+                self.post(self.on_db_error, "모델 로드 실패", e)
+
+    def on_db_error(self, title, error, show_dialog=True):
+        self.set_idle()
+        error_msg = f"❌ {title}: {str(error)}"
+        self.info_label.config(text=error_msg, fg="red")
+        if LOG_ERRORS:
+            print(error_msg)
+        if show_dialog:
+            messagebox.showerror(title, error_msg)
+
+    def on_close(self):
+        """대기 중인 작업을 취소하고 창 닫기 (진행 중인 DB 작업은 다음 진행 콜백에서 중단)"""
+        self.closing.set()
+        self.search_generation += 1
+        for executor in (self.search_executor, self.thumb_executor, self.db_executor):
+            executor.shutdown(wait=False, cancel_futures=True)
+        if METRICS_PATH:
+            METRICS.dump(METRICS_PATH)
+        if VERBOSE:
+            METRICS.report()
+            print(f"🗂 {self.query_cache.summary()}")
+            print(f"🗂 {self.text_cache.summary()}")
+        self.destroy()
+
+    # ----- 초기화 / DB -----
 
-            self.embedder = Embedder(model_name=MODEL_NAME, device=DEVICE)
+    def init_components(self):
+        """DB 로드/생성을 작업 스레드에서 실행 (모델은 임베딩이 필요할 때 또는 DB 준비 후 미리 로드)"""
+        self.set_busy("임베딩 DB 로딩/생성 중...")
+        self.db_executor.submit(self._init_worker)
 
-            self.info_label.config(text="임베딩 DB 로딩/생성 중...")
-            self.update()
+    def _init_worker(self):
+        try:
+            self.embedder = Embedder(model_name=MODEL_NAME, device=DEVICE, verbose=VERBOSE)
 
-            self.db = self.load_or_build_db()
+            db = self.load_or_build_db()
+            index = load_index(db, backend=INDEX_BACKEND) if db else None
 
-            db_count = len(self.db) if self.db else 0
-            self.info_label.config(text=f"✅ 준비 완료! DB에 {db_count}개 이미지 등록됨 (모델: {MODEL_NAME.upper()})")
+            db_count = len(db) if db else 0
+            self.post(self.on_db_ready, db, index,
+                      f"✅ 준비 완료! DB에 {db_count}개 이미지 등록됨 (모델: {MODEL_NAME.upper()})")
 
         except Exception as e:
-            error_msg = f"❌ 초기화 실패: {str(e)}"
-            self.info_label.config(text=error_msg, fg="red")
-            messagebox.showerror("초기화 오류", error_msg)
+            if not self.closing.is_set():
+                self.post(self.on_db_error, "초기화 실패", e)
 
     def load_or_build_db(self):
         """DB 로드 또는 새로 생성"""
-        if not os.path.exists(DB_PATH):
+        if not (store_exists(STORE_DIR) or os.path.exists(DB_PATH)):
             if VERBOSE:
                 print("📦 DB가 없어 새로 생성합니다.")
             return self.build_db()
 
-        try:
-            with open(DB_PATH, "rb") as f:
-                db = pickle.load(f)
-                if VERBOSE:
-                    print(f"✅ 임베딩 DB 로드 완료 ({len(db)}개 이미지)")
-
-                # DB 데이터 무결성 검사 및 수정
-                db = self.fix_db_dimensions(db)
-                return db
-        except Exception as e:
+        # memmap으로 열기 때문에 DB 크기와 무관하게 빠르게 로드됨 (기존 pickle DB는 최초 1회 변환)
+        db = open_or_migrate(STORE_DIR, pkl_path=DB_PATH, meta_path=DB_META_PATH)
+        if db is None:
             if LOG_ERRORS:
-                print(f"⚠️ 기존 DB 로드 실패, 새로 생성: {e}")
+                print("⚠️ 기존 DB 로드 실패, 새로 생성합니다.")
             return self.build_db()
 
-    def fix_db_dimensions(self, db):
-        """기존 DB의 차원 문제를 수정"""
-        fixed_db = {}
-        needs_save = False
-
-        for fname, embedding in db.items():
-            # 차원 수정
-            if embedding.dim() > 1:
-                embedding = embedding.squeeze().flatten()
-                needs_save = True
-            elif embedding.dim() == 1:
-                embedding = embedding.flatten()
-
-            fixed_db[fname] = embedding
-
-        # 수정된 내용이 있으면 다시 저장
-        if needs_save:
+        if db.model_name != MODEL_NAME:
             if VERBOSE:
-                print("🔧 DB 차원 문제 수정 및 재저장 중...")
-            try:
-                with open(DB_PATH, "wb") as f:
-                    pickle.dump(fixed_db, f)
-            except Exception as e:
-                if LOG_ERRORS:
-                    print(f"⚠️ DB 재저장 실패: {e}")
+                print(f"⚠️ DB 모델({db.model_name})이 현재 모델({MODEL_NAME})과 달라 새로 생성합니다.")
+            return self.build_db()
+
+        return self.sync_db(db)
 
-        return fixed_db
+    def sync_db(self, db):
+        """IMAGE_DIR에 추가/변경/삭제된 이미지를 DB에 반영"""
+        try:
+            db, stats = refresh_db(self.embedder, db, IMAGE_DIR, use_hash=HASH_CONTENT,
+                                   progress=self.report_progress, workers=BUILD_WORKERS)
+        except Exception as e:
+            if LOG_ERRORS:
+                print(f"⚠️ DB 갱신 실패: {e}")
+            return db
+
+        # 변경된 부분만 다시 저장
+        if stats["added"] or stats["updated"] or stats["removed"]:
+            save_store(db, STORE_DIR, dtype=STORE_DTYPE)
+        elif stats["touched"]:
+            save_store(db, STORE_DIR, dtype=STORE_DTYPE, vectors_changed=False)
+        return db
 
     def build_db(self):
         """이미지 DB 새로 생성"""
         if not os.path.exists(IMAGE_DIR):
             if VERBOSE:
                 print(f"❗ '{IMAGE_DIR}' 폴더가 없습니다.")
-            return {}
+            return None
 
-        db = {}
-        image_files = [f for f in os.listdir(IMAGE_DIR)
-                       if f.lower().endswith(SUPPORTED_FORMATS)]
+        image_files, _ = list_images(IMAGE_DIR, full=True)
 
         if not image_files:
             if VERBOSE:
                 print(f"❗ '{IMAGE_DIR}' 폴더에 이미지가 없습니다.")
-            return {}
+            return None
 
         if VERBOSE:
             print(f"📦 {len(image_files)}개 이미지 임베딩 생성 중...")
 
-        for i, fname in enumerate(image_files):
-            path = os.path.join(IMAGE_DIR, fname)
-            try:
-                db[fname] = self.embedder.get_embedding(path)
-                if VERBOSE and (i + 1) % PROGRESS_UPDATE_INTERVAL == 0:
-                    print(f"   진행: {i + 1}/{len(image_files)}")
-            except Exception as e:
-                if LOG_ERRORS:
-                    print(f"⚠️ {fname} 처리 중 오류: {e}")
+        db = build_store(self.embedder, IMAGE_DIR, image_files, use_hash=HASH_CONTENT,
+                         progress=self.report_progress, workers=BUILD_WORKERS)
 
         # DB 저장
-        try:
-            with open(DB_PATH, "wb") as f:
-                pickle.dump(db, f)
-            if VERBOSE:
-                print(f"✅ DB 저장 완료: {len(db)}개 임베딩")
-        except Exception as e:
-            if LOG_ERRORS:
-                print(f"⚠️ DB 저장 실패: {e}")
+        save_store(db, STORE_DIR, dtype=STORE_DTYPE)
 
         return db
 
+    # ----- 검색 -----
+
     def handle_drop(self, event):
-        """파일 드롭 처리"""
-        if not self.embedder or not self.db:
+        """파일 드롭 처리 (검색은 작업 스레드에서 실행하고 결과는 ui_queue로 받음)"""
+        if self.busy or not self.embedder or not self.index:
             messagebox.showerror("오류", "시스템이 아직 준비되지 않았습니다.")
             return
 
@@ -211,34 +332,101 @@ class ImageSearchApp(tkdnd.TkinterDnD.Tk):
             messagebox.showerror("오류", f"지원하는 이미지 형식이 아닙니다\n{SUPPORTED_FORMATS}")
             return
 
-        try:
-            self.info_label.config(text="검색 중...", fg="orange")
-            self.update()
+        # 새 드롭이 이전 드롭을 대체: 시작 전이면 취소, 실행 중이면 결과를 버림
+        self.search_generation += 1
+        generation = self.search_generation
+        if self.pending_search is not None:
+            self.pending_search.cancel()
 
-            # 쿼리 이미지 표시
-            self.show_query_image(filepath)
+        self.info_label.config(text="검색 중...", fg="orange")
 
+        # 쿼리 이미지 표시
+        self.show_query_image(filepath, generation)
+
+        self.pending_search = self.search_executor.submit(self._search_worker, generation, filepath, self.index)
+
+    def _search_worker(self, generation, filepath, index):
+        if generation != self.search_generation:
+            return
+        start = time.perf_counter()
+        try:
             # 임베딩 추출 및 검색
-            query_vec = self.embedder.get_embedding(filepath)
-            results = search_similar(query_vec, self.db, top_k=DEFAULT_TOP_K)
+            query_vec = self.query_cache.get_embedding(self.embedder, filepath)
+            if generation != self.search_generation:
+                return
+            results = index.search(query_vec, DEFAULT_TOP_K)
 
-            # 결과 표시
-            self.show_results(results)
+            # 결과 썸네일도 작업 스레드에서 디코딩 (PhotoImage 생성만 UI 스레드에서)
+            paths = [os.path.join(IMAGE_DIR, fname) for fname, _ in results]
+            with METRICS.timer("gui.thumbnails"):
+                thumbs = list(self.thumb_executor.map(lambda p: self.thumbnails.get(p, DISPLAY_SIZE), paths))
+            self.post(self.show_results, generation, results, thumbs, start)
 
-            self.info_label.config(text=f"✅ 검색 완료! (DB: {len(self.db)}개 이미지)", fg="green")
+        except Exception as e:
+            self.post(self.on_search_error, generation, e)
+
+    def handle_text_search(self, event=None):
+        """텍스트 검색 (이미지 검색과 같은 검색 스레드/세대 규칙 사용)"""
+        prompt = self.text_entry.get().strip()
+        if not prompt:
+            return
+        if self.busy or not self.embedder or not self.index:
+            messagebox.showerror("오류", "시스템이 아직 준비되지 않았습니다.")
+            return
+
+        self.search_generation += 1
+        generation = self.search_generation
+        if self.pending_search is not None:
+            self.pending_search.cancel()
+
+        self.info_label.config(text="검색 중...", fg="orange")
+        self.show_query_text(prompt)
+        self.pending_search = self.search_executor.submit(self._text_search_worker, generation, prompt, self.index)
+
+    def _text_search_worker(self, generation, prompt, index):
+        if generation != self.search_generation:
+            return
+        start = time.perf_counter()
+        try:
+            query_vec = self.text_cache.get_embedding(self.embedder, prompt)
+            if generation != self.search_generation:
+                return
+            results = index.search(query_vec, DEFAULT_TOP_K)
+
+            paths = [os.path.join(IMAGE_DIR, fname) for fname, _ in results]
+            with METRICS.timer("gui.thumbnails"):
+                thumbs = list(self.thumb_executor.map(lambda p: self.thumbnails.get(p, DISPLAY_SIZE), paths))
+            self.post(self.show_results, generation, results, thumbs, start)
 
         except Exception as e:
-            error_msg = f"검색 중 오류가 발생했습니다: {str(e)}"
-            messagebox.showerror("오류", error_msg)
-            self.info_label.config(text="❌ 검색 실패", fg="red")
-            if LOG_ERRORS:
-                print(f"❌ 드롭 처리 오류: {e}")
+            self.post(self.on_search_error, generation, e)
 
-    def show_query_image(self, filepath):
-        """쿼리 이미지 표시"""
+    def show_query_text(self, prompt):
+        """쿼리 영역에 검색어 표시"""
+        self.query_imgtk = None
+        self.canvas_query.delete("all")
+        self.canvas_query.create_text(CANVAS_SIZE[0] // 2, CANVAS_SIZE[1] // 2, text=f"\"{prompt}\"",
+                                      width=CANVAS_SIZE[0] - 20, font=("Arial", 14), fill="gray20")
+
+    def on_search_error(self, generation, error):
+        if generation != self.search_generation:
+            return
+        error_msg = f"검색 중 오류가 발생했습니다: {str(error)}"
+        messagebox.showerror("오류", error_msg)
+        self.info_label.config(text="❌ 검색 실패", fg="red")
+        if LOG_ERRORS:
+            print(f"❌ 드롭 처리 오류: {error}")
+
+    def show_query_image(self, filepath, generation):
+        """쿼리 이미지 표시 (디코딩은 썸네일 스레드에서)"""
+        future = self.thumb_executor.submit(self.thumbnails.get, filepath, THUMBNAIL_SIZE)
+        future.add_done_callback(
+            lambda f: f.cancelled() or self.post(self._draw_query_image, generation, f.result()))
+
+    def _draw_query_image(self, generation, img):
+        if generation != self.search_generation or img is None:
+            return
         try:
-            img = Image.open(filepath)
-            img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
             self.query_imgtk = ImageTk.PhotoImage(img)
 
             self.canvas_query.delete("all")
@@ -256,8 +444,21 @@ class ImageSearchApp(tkdnd.TkinterDnD.Tk):
             if LOG_ERRORS:
                 print(f"⚠️ 쿼리 이미지 표시 오류: {e}")
 
-    def show_results(self, results):
-        """검색 결과 표시"""
+    def show_results(self, generation, results, thumbs, start=None):
+        """
+        검색 결과 표시 (thumbs: 결과별로 미리 디코딩된 PIL 이미지, 실패 시 None)
+        start: 검색 시작 시각 (드롭부터 표시까지 걸린 시간을 gui.query로 기록)
+        """
+        if generation != self.search_generation:
+            return
+        with METRICS.timer(RENDER):
+            self._render_results(results, thumbs)
+        if start is not None:
+            METRICS.observe("gui.query", time.perf_counter() - start)
+
+    def _render_results(self, results, thumbs):
+        self.info_label.config(text=f"✅ 검색 완료! (DB: {len(self.db)}개 이미지)", fg="green")
+
         # 기존 결과 제거
         for widget in self.scrollable_frame.winfo_children():
             widget.destroy()
@@ -272,10 +473,9 @@ class ImageSearchApp(tkdnd.TkinterDnD.Tk):
         result_frame = tk.Frame(self.scrollable_frame)
         result_frame.pack(fill=tk.X, padx=10, pady=10)
 
-        for i, (fname, score) in enumerate(results):
+        for i, ((fname, score), img) in enumerate(zip(results, thumbs)):
             try:
-                path = os.path.join(IMAGE_DIR, fname)
-                if not os.path.exists(path):
+                if img is None:
                     continue
 
                 # 개별 결과 프레임
@@ -283,8 +483,6 @@ class ImageSearchApp(tkdnd.TkinterDnD.Tk):
                 item_frame.grid(row=0, column=i, padx=10, pady=5, sticky="n")
 
                 # 이미지 표시
-                img = Image.open(path)
-                img.thumbnail(DISPLAY_SIZE, Image.Resampling.LANCZOS)
                 imgtk = ImageTk.PhotoImage(img)
 
                 panel = tk.Label(item_frame, image=imgtk)
@@ -302,26 +500,24 @@ class ImageSearchApp(tkdnd.TkinterDnD.Tk):
                     print(f"⚠️ 결과 표시 중 오류 ({fname}): {e}")
 
     def rebuild_database(self):
-        """데이터베이스 재구축"""
-        try:
-            self.info_label.config(text="데이터베이스 재구축 중...", fg="orange")
-            self.update()
-
-            # 기존 DB 파일 삭제
-            if os.path.exists(DB_PATH):
-                os.remove(DB_PATH)
+        """데이터베이스 재구축 (작업 스레드에서 실행)"""
+        if self.busy or not self.embedder:
+            return
+        self.set_busy("데이터베이스 재구축 중...")
+        self.db_executor.submit(self._rebuild_worker)
 
-            # 새 DB 생성
-            self.db = self.build_db()
+    def _rebuild_worker(self):
+        try:
+            # 새 DB 생성 (저장 시 기존 DB를 원자적으로 교체)
+            db = self.build_db()
+            index = load_index(db, backend=INDEX_BACKEND) if db else None
 
-            db_count = len(self.db) if self.db else 0
-            self.info_label.config(text=f"✅ DB 재구축 완료! {db_count}개 이미지 등록됨", fg="green")
+            db_count = len(db) if db else 0
+            self.post(self.on_db_ready, db, index, f"✅ DB 재구축 완료! {db_count}개 이미지 등록됨")
 
         except Exception as e:
-            error_msg = f"DB 재구축 실패: {str(e)}"
-            self.info_label.config(text=error_msg, fg="red")
-            if LOG_ERRORS:
-                print(f"❌ DB 재구축 오류: {e}")
+            if not self.closing.is_set():
+                self.post(self.on_db_error, "DB 재구축 실패", e, False)
 
 
 if __name__ == "__main__":
@@ -330,15 +526,12 @@ if __name__ == "__main__":
         print(f"❗ '{IMAGE_DIR}' 폴더를 생성합니다.")
         ensure_directories()
 
-    image_files = [f for f in os.listdir(IMAGE_DIR)
-                   if f.lower().endswith(SUPPORTED_FORMATS)]
-
-    if not image_files:
+    if not has_images(IMAGE_DIR):
         print(f"⚠️ '{IMAGE_DIR}' 폴더에 이미지를 넣고 다시 실행하세요.")
         print(f"   지원 형식: {SUPPORTED_FORMATS}")
         input("Enter를 눌러 종료...")
     else:
         if VERBOSE:
-            print(f"🚀 GUI 앱 시작 중... ({len(image_files)}개 이미지 발견)")
+            print("🚀 GUI 앱 시작 중...")
         app = ImageSearchApp()
         app.mainloop()
\ No newline at end of file
@@ -1,88 +1,221 @@
 import os
-import pickle
+import sys
+import csv
+import json
+from itertools import islice
+import numpy as np
 from models.embedder import Embedder
-from utils.search import search_similar
+from utils.search import SearchIndex, load_index
+from utils.ann import build_ann_index, recall_report
+from utils.refresh import build_store, refresh_db
+from utils.scanner import list_images
+from utils.embedding_store import save_store, open_or_migrate, store_exists, to_numpy
+from utils.metrics import METRICS, RENDER, profile_until_exit, export_at_exit
+from utils.query_cache import QueryCache, TextCache
 from config import *
 
 
-def build_embedding_db(embedder, image_dir):
-    """임베딩 데이터베이스 생성"""
-    db = {}
-    image_files = [f for f in os.listdir(image_dir)
-                   if f.lower().endswith(SUPPORTED_FORMATS)]
+def build_embedding_db(embedder, image_dir, workers=BUILD_WORKERS):
+    """임베딩 데이터베이스 생성 (하위 폴더 포함, DB 키는 image_dir 기준 상대 경로)"""
+    image_files, _ = list_images(image_dir, full=True) if os.path.isdir(image_dir) else ([], None)
 
     if not image_files:
         print(f"❗ '{image_dir}' 폴더에 이미지가 없습니다.")
-        return db
+        return None
 
     if VERBOSE:
         print(f"📦 {len(image_files)}개 이미지 임베딩 생성 중...")
 
-    for i, fname in enumerate(image_files):
-        path = os.path.join(image_dir, fname)
-        try:
-            db[fname] = embedder.get_embedding(path)
-            if VERBOSE and (i + 1) % PROGRESS_UPDATE_INTERVAL == 0:
-                print(f"   진행: {i + 1}/{len(image_files)}")
-        except Exception as e:
-            if LOG_ERRORS:
-                print(f"⚠️ {fname} 처리 중 오류: {e}")
-
-    return db
+    return build_store(embedder, image_dir, image_files, use_hash=HASH_CONTENT, workers=workers)
 
 
-def save_db(db, path):
+def save_db(db, store_dir, vectors_changed=True):
     """데이터베이스 저장"""
-    try:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "wb") as f:
-            pickle.dump(db, f)
-        if VERBOSE:
-            print(f"✅ DB 저장 완료: {len(db)}개 임베딩")
-    except Exception as e:
-        if LOG_ERRORS:
-            print(f"❌ DB 저장 실패: {e}")
+    return save_store(db, store_dir, dtype=STORE_DTYPE, vectors_changed=vectors_changed)
 
 
-def load_db(path):
-    """데이터베이스 로드"""
-    try:
-        with open(path, "rb") as f:
-            db = pickle.load(f)
-
-        # 차원 문제 수정
-        fixed_db = {}
-        for fname, embedding in db.items():
-            if embedding.dim() > 1:
-                embedding = embedding.squeeze().flatten()
-            elif embedding.dim() == 1:
-                embedding = embedding.flatten()
-            fixed_db[fname] = embedding
+def load_db(store_dir):
+    """데이터베이스 로드 (기존 pickle DB만 있으면 최초 1회 변환)"""
+    return open_or_migrate(store_dir, pkl_path=DB_PATH, meta_path=DB_META_PATH)
 
-        if VERBOSE:
-            print(f"✅ DB 로드 완료: {len(fixed_db)}개 임베딩")
-        return fixed_db
 
-    except Exception as e:
-        if LOG_ERRORS:
-            print(f"❌ DB 로드 실패: {e}")
-        return {}
+def iter_query_paths(query_dir=None, query_list=None):
+    """--query-dir 폴더의 이미지와 --query-list 파일(한 줄에 경로 하나)의 경로를 순서대로 반환"""
+    if query_dir:
+        for fname in sorted(os.listdir(query_dir)):
+            if fname.lower().endswith(SUPPORTED_FORMATS):
+                yield os.path.join(query_dir, fname)
+    if query_list:
+        with open(query_list, "r", encoding="utf-8") as f:
+            for line in f:
+                path = line.strip()
+                if path and not path.startswith("#"):
+                    yield path
+
+
+def read_prompts(path):
+    """검색어 목록 파일 (한 줄에 하나, 빈 줄과 #으로 시작하는 줄은 무시)"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            prompt = line.strip()
+            if prompt and not prompt.startswith("#"):
+                yield prompt
+
+
+class ResultWriter:
+    """검색 결과를 JSONL 또는 CSV로 스트리밍 기록 (경로가 '-'이면 stream, 기본값 표준 출력)"""
+
+    def __init__(self, path="-", stream=None):
+        self.format = "csv" if path.lower().endswith(".csv") else "jsonl"
+        self.owns_file = path != "-"
+        self.file = open(path, "w", encoding="utf-8", newline="") if self.owns_file else stream or sys.stdout
+        self.csv = None
+        if self.format == "csv":
+            self.csv = csv.writer(self.file)
+            self.csv.writerow(["query", "rank", "file", "score", "error"])
+
+    def write(self, query, results):
+        if self.csv:
+            for rank, (fname, score) in enumerate(results, 1):
+                self.csv.writerow([query, rank, fname, f"{score:.6f}", ""])
+        else:
+            record = {"query": query,
+                      "results": [{"rank": rank, "file": fname, "score": round(score, 6)}
+                                  for rank, (fname, score) in enumerate(results, 1)]}
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def write_error(self, query, error):
+        if self.csv:
+            self.csv.writerow([query, "", "", "", str(error)])
+        else:
+            self.file.write(json.dumps({"query": query, "error": str(error)}, ensure_ascii=False) + "\n")
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+def batch_search(embedder, index, query_paths, top_k, writer, query_batch=256, cache=None):
+    """
+    쿼리 이미지를 배치 임베딩하고 query_batch개씩 (Q, N) 행렬 곱으로 검색하여 결과를 스트리밍 기록
+    cache: QueryCache (있으면 캐시/카탈로그에 있는 쿼리는 임베딩 생략)
+
+    Returns:
+        (성공 쿼리 수, 실패 쿼리 수)
+    """
+    paths, vecs = [], []
+    done, failed = 0, 0
+
+    def flush():
+        for path, results in zip(paths, index.search_batch(np.stack(vecs), top_k)):
+            with METRICS.timer(RENDER):
+                writer.write(path, results)
+        paths.clear()
+        vecs.clear()
+
+    if cache is not None:
+        results = cache.embed_many(embedder, query_paths, batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS)
+    else:
+        results = embedder.embed_many(query_paths, batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS)
+    for path, result in results:
+        if isinstance(result, Exception):
+            writer.write_error(path, result)
+            failed += 1
+            continue
+        paths.append(path)
+        vecs.append(to_numpy(result))
+        done += 1
+        if len(vecs) >= query_batch:
+            flush()
+        if VERBOSE and (done + failed) % PROGRESS_UPDATE_INTERVAL == 0:
+            print(f"   진행: {done + failed}개 쿼리 처리", file=sys.stderr)
+
+    if vecs:
+        flush()
+    return done, failed
+
+
+def text_search(embedder, index, prompts, top_k, cache=None, query_batch=256):
+    """
+    텍스트 검색어를 query_batch개씩 한 번의 encode_text로 인코딩하여 기존 이미지 인덱스에서 검색
+
+    Yields:
+        (검색어, [(파일명, 유사도), ...])
+    """
+    prompts = iter(prompts)
+    while True:
+        chunk = list(islice(prompts, max(1, query_batch)))
+        if not chunk:
+            return
+        if cache is not None:
+            vecs = np.stack(cache.embed_many(embedder, chunk))
+        else:
+            vecs = embedder.encode_texts(chunk).numpy()
+        yield from zip(chunk, index.search_batch(vecs, top_k))
 
 
 if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(description='이미지 유사도 검색 CLI 도구')
-    parser.add_argument("--query", required=True, help="검색할 이미지 경로")
+    parser.add_argument("--query", help="검색할 이미지 경로")
+    parser.add_argument("--query-dir", help="폴더 내 모든 이미지를 쿼리로 일괄 검색")
+    parser.add_argument("--query-list", help="쿼리 이미지 경로 목록 파일 (한 줄에 하나)")
+    parser.add_argument("--text", action="append",
+                        help='텍스트로 이미지 검색 (CLIP 전용, 여러 번 지정 가능: --text "bent pin" --text "red cable")')
+    parser.add_argument("--text-list", help="검색어 목록 파일 (한 줄에 하나, 결과는 --output에 기록)")
+    parser.add_argument("--output", default="-",
+                        help="일괄 검색 결과 파일 (.jsonl 또는 .csv, 기본값: 표준 출력 JSONL - 이때 다른 메시지는 stderr로 출력)")
+    parser.add_argument("--query-batch", type=int, default=256,
+                        help="일괄 검색 시 한 번에 행렬 곱으로 검색할 쿼리 수 (기본값: 256)")
     parser.add_argument("--rebuild", action="store_true", help="데이터베이스 재생성")
+    parser.add_argument("--refresh", action="store_true",
+                        help="추가/변경된 이미지만 임베딩하고 삭제된 이미지는 DB에서 제거")
+    parser.add_argument("--workers", type=int, default=BUILD_WORKERS,
+                        help="DB 생성/갱신 시 임베딩 프로세스 수 (2 이상이면 샤드로 나눠 병렬 처리)")
+    parser.add_argument("--full-scan", action="store_true",
+                        help="--refresh 시 manifest를 쓰지 않고 모든 폴더를 다시 나열 (같은 이름으로 덮어쓴 파일 확인)")
     parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K,
                         help=f"상위 몇 개 결과를 표시할지 (기본값: {DEFAULT_TOP_K}, 최대: {MAX_TOP_K})")
-    parser.add_argument("--verbose", action="store_true", help="상세한 출력")
+    parser.add_argument("--index", choices=["exact", "ivf"], default=INDEX_BACKEND,
+                        help=f"검색 방식 (기본값: {INDEX_BACKEND})")
+    parser.add_argument("--nprobe", type=int, default=IVF_NPROBE,
+                        help=f"IVF 검색 시 스캔할 리스트 수 (기본값: {IVF_NPROBE})")
+    parser.add_argument("--build-ann", action="store_true",
+                        help="IVF 근사 검색 인덱스 학습 후 recall@k 리포트 출력")
+    parser.add_argument("--nlist", type=int, default=IVF_NLIST, help="IVF coarse centroid 수")
+    parser.add_argument("--pq-m", type=int, default=PQ_M, help="PQ 부분공간 수 (0이면 미사용)")
+    parser.add_argument("--server", nargs="?", const=f"http://{SERVER_HOST}:{SERVER_PORT}",
+                        help="실행 중인 검색 서버(search_server.py)에 쿼리 (모델/DB 로드 생략)")
+    parser.add_argument("--no-query-cache", action="store_true",
+                        help="쿼리 임베딩 캐시 미사용 (기본: 같은 내용의 쿼리/카탈로그 이미지는 임베딩 생략)")
+    parser.add_argument("--verbose", action="store_true", help="상세한 출력 (종료 시 단계별 시간 요약 포함)")
+    parser.add_argument("--metrics", default=METRICS_PATH, help="종료 시 단계별 시간/카운터 저장 경로 (.json 또는 Prometheus 텍스트 .prom)")
+    parser.add_argument("--profile", help="실행 전체를 프로파일링하여 저장할 경로")
+    parser.add_argument("--profiler", choices=["cprofile", "torch"], default="cprofile",
+                        help="cprofile: .prof 통계, torch: Chrome trace .json (기본값: cprofile)")
     args = parser.parse_args()
 
+    if not (args.query or args.query_dir or args.query_list or args.text or args.text_list
+            or args.rebuild or args.refresh or args.build_ann):
+        parser.error("--query, --query-dir, --query-list, --text, --text-list, --rebuild, --refresh, --build-ann "
+                     "중 하나 이상을 지정하세요")
+
+    # 일괄 검색 결과를 표준 출력으로 내보낼 때는 설정/DB 로드/진행 메시지를 모두 stderr로 보내
+    # 표준 출력에는 JSONL/CSV만 남김 (라이브러리 함수의 print 포함)
+    result_stream = sys.stdout
+    if args.output == "-" and (args.query_dir or args.query_list or args.text_list):
+        sys.stdout = sys.stderr
+
     # 설정 적용
     if args.verbose:
         globals()['VERBOSE'] = True
+    if args.metrics or args.verbose:
+        export_at_exit(args.metrics, report=args.verbose)
+    if args.profile:
+        profile_until_exit(args.profile, args.profiler)
 
     # 상위 K개 결과 제한
     top_k = min(args.top_k, MAX_TOP_K)
@@ -95,37 +228,158 @@ if __name__ == "__main__":
         print_config()
 
     # 쿼리 이미지 확인
-    if not os.path.exists(args.query):
+    if args.query and not os.path.exists(args.query):
         print(f"❌ 쿼리 이미지를 찾을 수 없습니다: {args.query}")
         exit(1)
 
-    if not args.query.lower().endswith(SUPPORTED_FORMATS):
+    if args.query and not args.query.lower().endswith(SUPPORTED_FORMATS):
         print(f"❌ 지원하지 않는 이미지 형식입니다: {args.query}")
         print(f"   지원 형식: {SUPPORTED_FORMATS}")
         exit(1)
 
-    # 모델 로드
+    if args.query_dir and not os.path.isdir(args.query_dir):
+        print(f"❌ 쿼리 폴더를 찾을 수 없습니다: {args.query_dir}")
+        exit(1)
+
+    if args.query_list and not os.path.exists(args.query_list):
+        print(f"❌ 쿼리 목록 파일을 찾을 수 없습니다: {args.query_list}")
+        exit(1)
+
+    if (args.text or args.text_list) and MODEL_NAME != "clip":
+        print(f"❌ 텍스트 검색은 CLIP 모델에서만 지원합니다 (현재: {MODEL_NAME})")
+        exit(1)
+
+    if args.text_list and not os.path.exists(args.text_list):
+        print(f"❌ 검색어 목록 파일을 찾을 수 없습니다: {args.text_list}")
+        exit(1)
+
+    # 서버 클라이언트 모드: 모델/DB는 서버에 이미 로드되어 있음
+    if args.server:
+        if not args.query:
+            print("❌ --server 모드에서는 --query가 필요합니다.")
+            exit(1)
+        from search_server import query_server
+        try:
+            results = query_server(args.server, args.query, top_k)
+        except Exception as e:
+            print(f"❌ 서버 요청 실패 ({args.server}): {e}")
+            exit(1)
+
+        print(f"\n🔍 '{args.query}'와 유사한 이미지 (상위 {len(results)}개):")
+        for rank, (fname, score) in enumerate(results, 1):
+            print(f"   {rank}. {fname}  (유사도: {score:.4f})")
+        exit(0)
+
+    # 모델은 실제로 임베딩이 필요할 때 로드 (DB만 다루는 명령이나 캐시 적중 쿼리는 torch를 import하지 않음)
     try:
-        if VERBOSE:
-            print(f"🤖 모델 로딩 중... ({MODEL_NAME.upper()} on {DEVICE})")
-        embedder = Embedder(model_name=MODEL_NAME, device=DEVICE)
+        embedder = Embedder(model_name=MODEL_NAME, device=DEVICE, verbose=VERBOSE)
     except Exception as e:
         print(f"❌ 모델 로드 실패: {e}")
         exit(1)
 
     # 임베딩 DB 로드 또는 생성
-    if args.rebuild or not os.path.exists(DB_PATH):
+    if args.rebuild or not (store_exists(STORE_DIR) or os.path.exists(DB_PATH)):
         if VERBOSE:
             print("📦 임베딩 DB 생성 중...")
-        db = build_embedding_db(embedder, IMAGE_DIR)
+        db = build_embedding_db(embedder, IMAGE_DIR, workers=args.workers)
         if db:
-            save_db(db, DB_PATH)
+            save_db(db, STORE_DIR)
         else:
             print("❌ DB 생성 실패")
             exit(1)
     else:
         if VERBOSE:
             print("📂 기존 DB 로드 중...")
-        db = load_db(DB_PATH)
+        db = load_db(STORE_DIR)
         if not db:
-            print("❌ DB 로드 실패, --rebuild 옵션으로 재생성하세요")
\ No newline at end of file
+            print("❌ DB 로드 실패, --rebuild 옵션으로 재생성하세요")
+            exit(1)
+        elif db.model_name != MODEL_NAME:
+            print(f"❌ DB 모델({db.model_name})이 현재 모델({MODEL_NAME})과 다릅니다. "
+                  f"--rebuild 옵션으로 재생성하세요")
+            exit(1)
+        elif args.refresh:
+            db, stats = refresh_db(embedder, db, IMAGE_DIR, use_hash=HASH_CONTENT, workers=args.workers,
+                                   full_scan=args.full_scan)
+            # 변경된 부분만 다시 저장
+            if stats["added"] or stats["updated"] or stats["removed"]:
+                save_db(db, STORE_DIR)
+            elif stats["touched"]:
+                save_db(db, STORE_DIR, vectors_changed=False)
+
+    # 근사 검색 인덱스 학습
+    if args.build_ann:
+        try:
+            ann_index = build_ann_index(db, STORE_DIR, nlist=args.nlist, pq_m=args.pq_m, nprobe=args.nprobe)
+            recall_report(ann_index, SearchIndex.from_db(db), k=max(top_k, 10), nprobe=args.nprobe)
+        except Exception as e:
+            print(f"❌ IVF 인덱스 학습 실패: {e}")
+            exit(1)
+
+    query_cache = None if args.no_query_cache else QueryCache(MODEL_NAME, QUERY_CACHE_SIZE, QUERY_CACHE_DIR,
+                                                              catalog=db, image_dir=IMAGE_DIR)
+
+    # 유사 이미지 검색
+    if args.query:
+        index = load_index(db, backend=args.index, nprobe=args.nprobe, store_dir=STORE_DIR)
+        try:
+            if query_cache is not None:
+                query_vec = query_cache.get_embedding(embedder, args.query)
+            else:
+                query_vec = embedder.get_embedding(args.query)
+            results = index.search(query_vec, top_k)
+        except Exception as e:
+            print(f"❌ 검색 실패: {e}")
+            exit(1)
+
+        with METRICS.timer(RENDER):
+            print(f"\n🔍 '{args.query}'와 유사한 이미지 (상위 {len(results)}개):")
+            for rank, (fname, score) in enumerate(results, 1):
+                print(f"   {rank}. {fname}  (유사도: {score:.4f})")
+
+    # 여러 쿼리 일괄 검색
+    if args.query_dir or args.query_list:
+        index = load_index(db, backend=args.index, nprobe=args.nprobe, store_dir=STORE_DIR)
+        writer = ResultWriter(args.output, stream=result_stream)
+        try:
+            done, failed = batch_search(embedder, index, iter_query_paths(args.query_dir, args.query_list),
+                                        top_k, writer, query_batch=max(1, args.query_batch), cache=query_cache)
+        finally:
+            writer.close()
+        if VERBOSE:
+            print(f"✅ 일괄 검색 완료: {done}개 성공, {failed}개 실패", file=sys.stderr)
+
+    if VERBOSE and query_cache is not None and (args.query or args.query_dir or args.query_list):
+        print(f"🗂 {query_cache.summary()}", file=sys.stderr)
+
+    # 텍스트 검색 (카탈로그 재임베딩 없이 같은 이미지 인덱스 사용)
+    if args.text or args.text_list:
+        index = load_index(db, backend=args.index, nprobe=args.nprobe, store_dir=STORE_DIR)
+        text_cache = TextCache(MODEL_NAME, TEXT_CACHE_SIZE)
+        if args.text:
+            try:
+                results = list(text_search(embedder, index, args.text, top_k, cache=text_cache,
+                                           query_batch=max(1, args.query_batch)))
+            except Exception as e:
+                print(f"❌ 텍스트 검색 실패: {e}")
+                exit(1)
+            with METRICS.timer(RENDER):
+                for prompt, matches in results:
+                    print(f"\n🔍 \"{prompt}\"와 유사한 이미지 (상위 {len(matches)}개):")
+                    for rank, (fname, score) in enumerate(matches, 1):
+                        print(f"   {rank}. {fname}  (유사도: {score:.4f})")
+        if args.text_list:
+            writer = ResultWriter(args.output, stream=result_stream)
+            done = 0
+            try:
+                for prompt, matches in text_search(embedder, index, read_prompts(args.text_list), top_k,
+                                                   cache=text_cache, query_batch=max(1, args.query_batch)):
+                    with METRICS.timer(RENDER):
+                        writer.write(prompt, matches)
+                    done += 1
+            finally:
+                writer.close()
+            if VERBOSE:
+                print(f"✅ 텍스트 일괄 검색 완료: {done}개", file=sys.stderr)
+        if VERBOSE:
+            print(f"🗂 {text_cache.summary()}", file=sys.stderr)
@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from models.embedder import Embedder
+from utils.search import load_index
+from utils.embedding_store import open_or_migrate
+from utils.batcher import MicroBatcher
+from utils.metrics import METRICS
+from config import *
+
+HTTP_STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+MAX_BODY_SIZE = 64 * 1024 * 1024
+
+
+class SearchServer:
+    """
+    모델/DB/검색 인덱스를 메모리에 유지하는 로컬 검색 서버
+
+    - 요청마다 이미지 디코딩/전처리는 스레드 풀에서 병렬로 수행
+    - 전처리된 텐서는 MicroBatcher의 크기가 제한된 큐에 쌓이고, 최대 max_latency_ms 동안 모아
+      한 번의 forward pass와 한 번의 (Q, N) 검색으로 처리
+    """
+
+    def __init__(self, embedder, db, backend=INDEX_BACKEND, max_batch=SERVER_MAX_BATCH,
+                 max_latency_ms=SERVER_MAX_LATENCY_MS, queue_size=SERVER_QUEUE_SIZE):
+        self.embedder = embedder
+        self.db = db
+        self.backend = backend
+        self.index = load_index(db, backend=backend)
+        # 디코딩은 병렬 스레드 풀, 모델 forward + 검색은 배치 스케줄러 스레드에서 순차 실행
+        self.decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS)
+        self.batcher = MicroBatcher(self._run_batch, max_batch_size=max_batch,
+                                    max_latency_ms=max_latency_ms, max_queue=queue_size,
+                                    name="search-batcher")
+
+        self._reload_lock = None
+        self.started = time.time()
+        self.stats = {"requests": 0, "searches": 0, "errors": 0, "search_time_ms": 0.0}
+
+    async def serve(self, host=SERVER_HOST, port=SERVER_PORT):
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        if VERBOSE:
+            print(f"🚀 검색 서버 시작: http://{host}:{port} (DB {len(self.db)}개 이미지)")
+        async with server:
+            await server.serve_forever()
+
+    # ----- 배치 추론 -----
+
+    def _run_batch(self, items):
+        """(tensor, top_k) 목록 → 쿼리별 검색 결과 (배치 스케줄러 스레드에서 실행)"""
+        import torch
+
+        tensors = torch.stack([tensor for tensor, _ in items])
+        vecs = self.embedder.encode_batch(tensors)
+        results = self.index.search_batch(vecs.numpy(), max(k for _, k in items))
+        return [result[:k] for result, (_, k) in zip(results, items)]
+
+    async def search(self, source, top_k):
+        """이미지(경로 또는 bytes) 하나를 검색. 배치 큐가 가득 차면 OverflowError"""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+
+        tensor = await loop.run_in_executor(self.decode_pool, self.embedder.load_tensor, source)
+        results = await self.batcher.submit_async((tensor, top_k))
+        self.stats["searches"] += 1
+        self.stats["search_time_ms"] += 1000 * (time.perf_counter() - start)
+        return results
+
+    def _load_db(self):
+        """DB와 검색 인덱스를 새로 엶 (블로킹, 이벤트 루프 밖에서 실행)"""
+        db = open_or_migrate(STORE_DIR, pkl_path=DB_PATH, meta_path=DB_META_PATH)
+        if not db:
+            raise RuntimeError("DB 로드 실패")
+        # 시작할 때와 같이 다른 모델로 만든 DB는 사용하지 않음 (기존 DB로 계속 서비스)
+        if db.model_name != self.embedder.model_name:
+            raise ValueError(f"DB 모델({db.model_name})이 현재 모델({self.embedder.model_name})과 다릅니다.")
+        return db, load_index(db, backend=self.backend)
+
+    async def reload(self):
+        """
+        DB와 검색 인덱스를 다시 엶 (--refresh/--rebuild 이후)
+
+        로딩은 스레드 풀에서 수행하여 그동안에도 기존 인덱스로 검색을 계속 처리하고,
+        완료되면 이벤트 루프에서 db/index를 한 번에 교체합니다. 동시에 들어온 reload는 순서대로 실행됩니다.
+        """
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+        async with self._reload_lock:
+            db, index = await asyncio.get_running_loop().run_in_executor(None, self._load_db)
+            self.db, self.index = db, index
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats.update({
+            "uptime_s": round(time.time() - self.started, 1),
+            "model": self.embedder.model_name,
+            "db_size": len(self.db),
+            "index": type(self.index).__name__,
+            "avg_search_ms": round(stats["search_time_ms"] / max(1, stats["searches"]), 2),
+            "batcher": self.batcher.metrics(),
+        })
+        stats["search_time_ms"] = round(stats["search_time_ms"], 1)
+        return stats
+
+    # ----- HTTP -----
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            status, body = await self._handle_request(reader)
+        except Exception as e:
+            status, body = 500, {"error": str(e)}
+            if LOG_ERRORS:
+                print(f"❌ 요청 처리 오류: {e}")
+
+        if status != 200:
+            self.stats["errors"] += 1
+        if isinstance(body, str):  # Prometheus 텍스트
+            payload, content_type = body.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            payload, content_type = json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json"
+        writer.write(f"HTTP/1.1 {status} {HTTP_STATUS.get(status, '')}\r\n"
+                     f"Content-Type: {content_type}; charset=utf-8\r\n"
+                     f"Content-Length: {len(payload)}\r\n"
+                     f"Connection: close\r\n\r\n".encode("latin-1") + payload)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            return 400, {"error": "empty request"}
+        parts = request_line.split(" ")
+        if len(parts) != 3:
+            return 400, {"error": "malformed request line"}
+        method, target, _ = parts
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            return 400, {"error": "invalid Content-Length"}
+        if length < 0:
+            return 400, {"error": "invalid Content-Length"}
+        if length > MAX_BODY_SIZE:
+            return 413, {"error": "body too large"}
+        try:
+            body = await reader.readexactly(length) if length else b""
+        except asyncio.IncompleteReadError:
+            return 400, {"error": "body shorter than Content-Length"}
+
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        self.stats["requests"] += 1
+
+        if url.path == "/health":
+            return 200, {"status": "ok"}
+        if url.path == "/stats":
+            return 200, self.get_stats()
+        if url.path == "/metrics":
+            # 단계별 시간 (decode/preprocess/forward/normalize/scan/topk), ?format=json이면 JSON
+            if params.get("format", [""])[0] == "json":
+                return 200, METRICS.summary()
+            return 200, METRICS.to_prometheus()
+        if url.path == "/reload":
+            if method != "POST":
+                return 405, {"error": "POST only"}
+            try:
+                await self.reload()
+            except ValueError as e:
+                return 409, {"error": str(e)}
+            return 200, {"status": "reloaded", "db_size": len(self.db)}
+        if url.path != "/search":
+            return 404, {"error": f"unknown path: {url.path}"}
+        if method != "POST":
+            return 405, {"error": "POST only"}
+
+        # 이미지 업로드(bytes) 또는 JSON {"path": ..., "top_k": ...}
+        top_k = int(params.get("top_k", [DEFAULT_TOP_K])[0])
+        if headers.get("content-type", "").startswith("application/json"):
+            request = json.loads(body or b"{}")
+            source = request.get("path")
+            top_k = int(request.get("top_k", top_k))
+            if not source or not os.path.isfile(source):
+                return 400, {"error": f"image not found: {source}"}
+        else:
+            if not body:
+                return 400, {"error": "empty image body"}
+            source = body
+        top_k = max(1, min(top_k, MAX_TOP_K))
+
+        try:
+            results = await self.search(source, top_k)
+        except OverflowError as e:
+            return 503, {"error": str(e)}
+        except (OSError, ValueError) as e:
+            return 400, {"error": f"invalid image: {e}"}
+
+        return 200, {"results": [{"rank": rank, "file": fname, "score": round(score, 6)}
+                                 for rank, (fname, score) in enumerate(results, 1)]}
+
+
+def query_server(server_url, image_path, top_k=DEFAULT_TOP_K, timeout=60):
+    """검색 서버에 쿼리 (CLI --server 클라이언트 모드)"""
+    import urllib.request
+
+    payload = json.dumps({"path": os.path.abspath(image_path), "top_k": top_k}).encode("utf-8")
+    request = urllib.request.Request(server_url.rstrip("/") + "/search", data=payload,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        body = json.loads(response.read().decode("utf-8"))
+    return [(r["file"], r["score"]) for r in body["results"]]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='이미지 유사도 검색 로컬 서버')
+    parser.add_argument("--host", default=SERVER_HOST, help=f"바인드 주소 (기본값: {SERVER_HOST})")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help=f"포트 (기본값: {SERVER_PORT})")
+    parser.add_argument("--index", choices=["exact", "ivf"], default=INDEX_BACKEND, help="검색 방식")
+    parser.add_argument("--max-batch", type=int, default=SERVER_MAX_BATCH, help="최대 배치 크기")
+    parser.add_argument("--max-latency-ms", type=float, default=SERVER_MAX_LATENCY_MS,
+                        help="배치를 모으기 위해 기다리는 최대 시간 (ms)")
+    parser.add_argument("--queue-size", type=int, default=SERVER_QUEUE_SIZE, help="추론 큐 크기")
+    args = parser.parse_args()
+
+    ensure_directories()
+    if VERBOSE:
+        print_config()
+
+    try:
+        # 서버는 첫 요청이 모델 로딩을 기다리지 않도록 시작할 때 바로 로드
+        embedder = Embedder(model_name=MODEL_NAME, device=DEVICE, verbose=VERBOSE).load()
+    except Exception as e:
+        print(f"❌ 모델 로드 실패: {e}")
+        exit(1)
+
+    db = open_or_migrate(STORE_DIR, pkl_path=DB_PATH, meta_path=DB_META_PATH)
+    if not db:
+        print("❌ DB 로드 실패, search_main_cli.py --rebuild로 먼저 생성하세요")
+        exit(1)
+    if db.model_name != MODEL_NAME:
+        print(f"❌ DB 모델({db.model_name})이 현재 모델({MODEL_NAME})과 다릅니다.")
+        exit(1)
+
+    app = SearchServer(embedder, db, backend=args.index, max_batch=args.max_batch,
+                       max_latency_ms=args.max_latency_ms, queue_size=args.queue_size)
+    try:
+        asyncio.run(app.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("👋 서버 종료")
@@ -0,0 +1,120 @@
+import numpy as np
+
+import utils.search as search
+from utils.search import SearchIndex
+from utils.embedding_store import quantize_matrix
+
+
+def make_vectors(n=500, dim=32, clusters=20, seed=0):
+    """클러스터 구조가 있는 L2 정규화된 (n, dim) float32 행렬 (실제 임베딩처럼 가까운 이웃이 많음)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    vectors = (centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dim))).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors, count=20, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), count)] + 0.1 * rng.standard_normal((count, vectors.shape[1]))
+    return queries.astype(np.float32)
+
+
+def brute_force(vectors, ids, query, k):
+    query = query / np.linalg.norm(query)
+    scores = vectors @ query
+    order = np.argsort(-scores, kind="stable")[:k]
+    return [ids[i] for i in order], scores[order]
+
+
+def ids_of(results):
+    return [fname for fname, _ in results]
+
+
+def test_exact_matches_brute_force():
+    """exact 검색의 top-k 파일명과 점수가 전체 내적 정렬 결과와 같음"""
+    vectors = make_vectors()
+    ids = [f"img_{i}.jpg" for i in range(len(vectors))]
+    index = SearchIndex(vectors, ids)
+    for query in make_queries(vectors):
+        expected_ids, expected_scores = brute_force(vectors, ids, query, 10)
+        results = index.search(query, 10)
+        assert ids_of(results) == expected_ids
+        np.testing.assert_allclose([s for _, s in results], expected_scores, rtol=1e-5)
+
+
+def test_blocked_topk_matches_brute_force(monkeypatch):
+    """점수를 TOPK_BLOCK 구간으로 나눠 선택해도 같은 결과"""
+    monkeypatch.setattr(search, "TOPK_BLOCK", 64)
+    vectors = make_vectors()
+    ids = [f"img_{i}.jpg" for i in range(len(vectors))]
+    index = SearchIndex(vectors, ids)
+    for query in make_queries(vectors):
+        assert ids_of(index.search(query, 10)) == brute_force(vectors, ids, query, 10)[0]
+
+
+def test_batch_matches_single_query():
+    """search_batch 결과가 쿼리별 search 결과와 같음 (점수 행렬을 여러 번 나눠 계산하는 경우 포함)"""
+    vectors = make_vectors()
+    ids = [f"img_{i}.jpg" for i in range(len(vectors))]
+    index = SearchIndex(vectors, ids)
+    queries = make_queries(vectors)
+    single = [index.search(q, 10) for q in queries]
+
+    for max_scores in (search.SCORE_BUDGET, 3 * len(vectors)):
+        batched = index.search_batch(queries, 10, max_scores=max_scores)
+        assert [ids_of(r) for r in batched] == [ids_of(r) for r in single]
+        np.testing.assert_allclose([[s for _, s in r] for r in batched], [[s for _, s in r] for r in single],
+                                   rtol=1e-5)
+
+
+def test_dict_db_is_normalized():
+    """{파일명: 벡터} dict DB는 정규화되지 않은 벡터도 코사인 유사도로 검색"""
+    vectors = make_vectors()
+    ids = [f"img_{i}.jpg" for i in range(len(vectors))]
+    scale = np.random.default_rng(2).uniform(0.5, 5.0, (len(vectors), 1)).astype(np.float32)
+    index = SearchIndex.from_db({fname: vec for fname, vec in zip(ids, vectors * scale)})
+    for query in make_queries(vectors):
+        assert ids_of(index.search(query, 10)) == brute_force(vectors, ids, query, 10)[0]
+
+
+def test_k_larger_than_db():
+    vectors = make_vectors(n=5)
+    index = SearchIndex(vectors, [f"img_{i}.jpg" for i in range(5)])
+    assert len(index.search(vectors[0], 10)) == 5
+    assert [len(r) for r in index.search_batch(vectors[:2], 10)] == [5, 5]
+
+
+def test_float16_int8_rerank_match_float32():
+    """float16/int8 행렬을 스캔하고 float32 원본으로 재계산하면 float32 검색과 같은 top-10과 점수"""
+    vectors = make_vectors()
+    ids = [f"img_{i}.jpg" for i in range(len(vectors))]
+    exact = SearchIndex(vectors, ids)
+    queries = make_queries(vectors)
+    expected = [exact.search(q, 10) for q in queries]
+
+    for dtype in ("float16", "int8"):
+        index = SearchIndex(quantize_matrix(vectors, dtype), ids, rerank_vectors=vectors)
+        assert index.quantized
+        for results in ([index.search(q, 10) for q in queries], index.search_batch(queries, 10)):
+            assert [ids_of(r) for r in results] == [ids_of(r) for r in expected]
+            np.testing.assert_allclose([[s for _, s in r] for r in results],
+                                       [[s for _, s in r] for r in expected], rtol=1e-5)
+
+
+def test_int8_without_rerank_is_approximate():
+    """
+    int8만 스캔하면 근사 결과: 점수 오차는 작고 recall@10은 높지만 순서까지 같은 쿼리는 일부뿐
+    (정확한 top-k가 필요하면 rerank 원본을 함께 저장해야 함)
+    """
+    vectors = make_vectors()
+    ids = [f"img_{i}.jpg" for i in range(len(vectors))]
+    exact = SearchIndex(vectors, ids)
+    index = SearchIndex(quantize_matrix(vectors, "int8"), ids)
+    queries = make_queries(vectors)
+
+    hits = 0
+    for query, results in zip(queries, index.search_batch(queries, 10)):
+        expected = exact.search(query, 10)
+        hits += len(set(ids_of(results)) & set(ids_of(expected)))
+        assert abs(results[0][1] - expected[0][1]) < 0.02
+    assert hits / (10 * len(queries)) >= 0.9
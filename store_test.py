@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+
+from utils.embedding_store import EmbeddingStore, QuantizedMatrix, quantize_rows, save_store, load_store
+
+
+def make_vectors(n=200, dim=32, seed=0):
+    """L2 정규화된 무작위 (n, dim) float32 행렬"""
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_store(vectors):
+    ids = [f"dir/img_{i:04d}.jpg" for i in range(len(vectors))]
+    meta = {fname: {"mtime": 1000 + i, "size": 10 * i} for i, fname in enumerate(ids)}
+    return EmbeddingStore(ids, vectors, meta=meta, model_name="clip")
+
+
+def test_float32_roundtrip(tmp_path):
+    """저장 후 다시 열면 파일명/벡터/메타데이터/모델 이름이 그대로"""
+    store = make_store(make_vectors())
+    assert save_store(store, str(tmp_path), dtype="float32")
+
+    loaded = load_store(str(tmp_path))
+    assert loaded is not None
+    assert loaded.ids == store.ids
+    assert loaded.model_name == "clip"
+    assert loaded.dtype == "float32"
+    np.testing.assert_array_equal(np.asarray(loaded.vectors), store.vectors)
+    assert loaded.meta == store.meta
+
+
+def test_float16_roundtrip(tmp_path):
+    """float16 저장소는 float16 정밀도 안에서 같은 벡터"""
+    store = make_store(make_vectors())
+    assert save_store(store, str(tmp_path), dtype="float16", rerank=False)
+
+    loaded = load_store(str(tmp_path))
+    assert loaded.dtype == "float16"
+    assert loaded.rerank_vectors is None
+    np.testing.assert_allclose(np.asarray(loaded.vectors, dtype=np.float32), store.vectors, atol=1e-3)
+
+
+def test_resave_keeps_only_current_generation(tmp_path):
+    """다시 저장하면 새 세대 행렬로 교체되고 이전 세대 파일은 정리됨"""
+    vectors = make_vectors()
+    assert save_store(make_store(vectors), str(tmp_path))
+    assert save_store(make_store(vectors[::-1].copy()), str(tmp_path))
+
+    loaded = load_store(str(tmp_path))
+    assert loaded.generation == 2
+    np.testing.assert_array_equal(np.asarray(loaded.vectors), vectors[::-1])
+    matrices = [f for f in os.listdir(tmp_path) if f.startswith("vectors-")]
+    assert matrices == ["vectors-000002.npy"]
+
+
+def test_metadata_only_save_keeps_matrix(tmp_path):
+    """vectors_changed=False이면 index.json만 다시 쓰고 행렬 세대는 그대로"""
+    store = make_store(make_vectors())
+    assert save_store(store, str(tmp_path))
+    store.meta[store.ids[0]] = {"mtime": 1, "size": 2}
+    assert save_store(store, str(tmp_path), vectors_changed=False)
+
+    loaded = load_store(str(tmp_path))
+    assert loaded.generation == 1
+    assert loaded.meta[store.ids[0]] == {"mtime": 1, "size": 2}
+
+
+def test_quantize_rows_error_bound():
+    """int8 복원 오차는 행별 scale의 절반 이하이고, 복원 값을 다시 양자화하면 같은 코드"""
+    vectors = make_vectors()
+    codes, scales = quantize_rows(vectors)
+    assert codes.dtype == np.int8 and scales.dtype == np.float32
+    restored = codes * scales[:, None]
+    assert np.all(np.abs(restored - vectors) <= scales[:, None] / 2 + 1e-7)
+
+    codes2, scales2 = quantize_rows(restored)
+    np.testing.assert_array_equal(codes2, codes)
+    np.testing.assert_allclose(scales2, scales, rtol=1e-6)
+
+
+def test_quantize_rows_zero_row():
+    """0 벡터 행은 scale 1, 코드 0 (0으로 나누지 않음)"""
+    codes, scales = quantize_rows(np.zeros((2, 8), dtype=np.float32))
+    assert not codes.any()
+    np.testing.assert_array_equal(scales, [1.0, 1.0])
+
+
+def test_int8_roundtrip_with_rerank(tmp_path):
+    """int8 저장소는 codes/scales와 float32 rerank 원본을 함께 저장하고 그대로 다시 엶"""
+    store = make_store(make_vectors())
+    assert save_store(store, str(tmp_path), dtype="int8", rerank=True)
+
+    loaded = load_store(str(tmp_path))
+    assert isinstance(loaded.vectors, QuantizedMatrix)
+    codes, scales = quantize_rows(store.vectors)
+    np.testing.assert_array_equal(np.asarray(loaded.vectors.codes), codes)
+    np.testing.assert_array_equal(loaded.vectors.scales, scales)
+    np.testing.assert_array_equal(np.asarray(loaded.rerank_vectors), store.vectors)
@@ -1,47 +1,272 @@
 import os
+import json
+import time
+import hashlib
+import argparse
+
+import numpy as np
 import torch
 import torch.nn as nn
-from torch.utils.data import DataLoader
-from torchvision import datasets, transforms
-from models.anomaly_detector_encoder import AutoEncoder
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler, SequentialSampler
+from PIL import Image
+from models.anomaly_detector_encoder import AutoEncoder, MODEL_DIR, model_path
+from utils.anomaly_batch import iter_image_paths
 from tqdm.auto import tqdm
 
-# config
+# config (기본값, 명령행 인자로 변경 가능)
 BATCH_SIZE = 16
 EPOCHS = 50
 LR = 1e-3
-class_name = "metal_nut"  # 사용자 입력
+class_name = "metal_nut"
 DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+IMAGE_SIZE = (128, 128)
+CACHE_DIR = os.path.join("data", "cache")
+CACHE_VERSION = 1  # 디코딩/리사이즈 방식이 바뀌면 올려서 기존 캐시 무효화
 
 
 # dataset (정상 이미지만)
-transform = transforms.Compose([
-    transforms.Resize((128, 128)),
-    transforms.ToTensor(),
-])
-dataset = datasets.ImageFolder(f"{class_name}/train", transform=transform)
-dataloader = DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=True)
-
-# model
-model = AutoEncoder().to(DEVICE)
-optimizer = torch.optim.Adam(model.parameters(), lr=LR)
-criterion = nn.MSELoss()
-
-# train
-for epoch in range(EPOCHS):
-    model.train()
-    total_loss = 0
-    # Wrap the dataloader with tqdm for a progress bar
-    for imgs, _ in tqdm(dataloader, desc=f"Epoch {epoch+1}/{EPOCHS}"):
-        imgs = imgs.to(DEVICE)
-        outputs = model(imgs)
-        loss = criterion(outputs, imgs)
-
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
-
-        total_loss += loss.item()
-    print(f"Epoch {epoch+1}/{EPOCHS}, Loss: {total_loss:.4f}")
-
-torch.save(model.state_dict(), f"autoencoder_{class_name}.pth")
+class DecodeDataset(Dataset):
+    """경로 목록 → 128x128 uint8 (H, W, 3) 배열 (transforms.Resize((128, 128))와 같은 bilinear 리사이즈)"""
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, i):
+        with Image.open(self.paths[i]) as img:
+            img = img.convert('RGB').resize(IMAGE_SIZE[::-1], Image.BILINEAR)
+            return np.array(img, dtype=np.uint8)
+
+
+class CachedDataset(Dataset):
+    """
+    디코딩된 uint8 배열 (N, H, W, 3) 캐시 (RAM 배열 또는 memmap)
+    BatchSampler와 함께 쓰면 인덱스 목록을 받아 배치 전체를 한 번에 꺼냄
+    """
+
+    def __init__(self, images, indices):
+        self.images = images
+        self.indices = np.asarray(indices)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, batch):
+        # memmap은 정렬된 인덱스로 읽어야 디스크 접근이 순차적
+        rows = np.sort(self.indices[batch])
+        return torch.from_numpy(np.ascontiguousarray(self.images[rows]))
+
+
+def cache_key(paths):
+    """파일 목록 + mtime/size + 캐시 버전 해시 (이미지가 바뀌면 캐시를 다시 만듦)"""
+    h = hashlib.sha1(f"{CACHE_VERSION}|{IMAGE_SIZE}".encode())
+    for path in paths:
+        st = os.stat(path)
+        h.update(f"{path}|{st.st_mtime_ns}|{st.st_size}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def build_cache(paths, num_workers, cache="ram", cache_dir=CACHE_DIR, category=class_name):
+    """
+    모든 이미지를 한 번만 디코딩/리사이즈하여 uint8 (N, H, W, 3) 배열로 반환
+
+    cache="disk"이면 memmap(.npy)으로 저장하여 다음 실행에서는 디코딩을 완전히 생략합니다.
+    """
+    shape = (len(paths), IMAGE_SIZE[0], IMAGE_SIZE[1], 3)
+    if cache == "disk":
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_path = os.path.join(cache_dir, f"{category}-{cache_key(paths)}.npy")
+        if os.path.exists(cache_path):
+            images = np.load(cache_path, mmap_mode='r')
+            if images.shape == shape:
+                print(f"📂 디코딩 캐시 사용: {cache_path}")
+                return images
+        tmp = cache_path + ".tmp"
+        images = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.uint8, shape=shape)
+    else:
+        images = np.empty(shape, dtype=np.uint8)
+
+    loader = DataLoader(DecodeDataset(paths), batch_size=64, num_workers=num_workers)
+    start = 0
+    for batch in tqdm(loader, desc="Decoding"):
+        images[start:start + len(batch)] = batch.numpy()
+        start += len(batch)
+
+    if cache == "disk":
+        images.flush()
+        del images
+        os.replace(tmp, cache_path)
+        images = np.load(cache_path, mmap_mode='r')
+    return images
+
+
+def make_loader(images, indices, batch_size, shuffle, num_workers, pin_memory):
+    sampler = RandomSampler(range(len(indices))) if shuffle else SequentialSampler(range(len(indices)))
+    return DataLoader(
+        CachedDataset(images, indices),
+        sampler=BatchSampler(sampler, batch_size, drop_last=False),
+        batch_size=None,
+        num_workers=num_workers,
+        persistent_workers=num_workers > 0,
+        pin_memory=pin_memory,
+    )
+
+
+def to_input(batch, device):
+    """uint8 (B, H, W, 3) → float (B, 3, H, W) [0, 1] (ToTensor와 동일, 변환은 device에서)"""
+    batch = batch.to(device, non_blocking=True)
+    return batch.permute(0, 3, 1, 2).float().div_(255)
+
+
+def split_indices(n, val_split, seed):
+    """고정 seed로 학습/검증 인덱스 분리 (resume해도 같은 분할)"""
+    order = np.random.default_rng(seed).permutation(n)
+    n_val = int(round(n * val_split)) if n > 1 else 0
+    return order[n_val:], order[:n_val]
+
+
+def checkpoint_path(category):
+    return os.path.join(MODEL_DIR, f"autoencoder_{category}.ckpt")
+
+
+def save_checkpoint(path, state):
+    tmp = path + ".tmp"
+    torch.save(state, tmp)
+    os.replace(tmp, path)
+
+
+def evaluate(model, loader, device):
+    model.eval()
+    total, count = torch.zeros((), device=device), 0
+    with torch.inference_mode():
+        for batch in loader:
+            imgs = to_input(batch, device)
+            total += nn.functional.mse_loss(model(imgs), imgs, reduction='sum') / imgs[0].numel()
+            count += len(imgs)
+    return total.item() / max(1, count)
+
+
+def train(args):
+    device = torch.device(args.device)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    train_dir = args.train_dir or os.path.join(args.data_root, args.category, "train")
+    if not os.path.isdir(train_dir) and os.path.isdir(os.path.join(args.category, "train")):
+        train_dir = os.path.join(args.category, "train")  # 이전 실행 위치 기준 구조
+    paths = list(iter_image_paths([train_dir]))
+    if not paths:
+        raise FileNotFoundError(f"학습 이미지가 없습니다: {train_dir}")
+
+    ckpt_path = checkpoint_path(args.category)
+    out_path = model_path(args.category)
+    state = torch.load(ckpt_path, map_location=device) if args.resume and os.path.exists(ckpt_path) else None
+    # 이미 조기 종료된 학습은 epoch을 더 돌리지 않음 (stopped가 없는 이전 체크포인트는 bad_epochs로 판단)
+    if state is not None and args.patience > 0 and state.get("stopped", state["bad_epochs"] >= args.patience):
+        print(f"⏹ epoch {state['epoch']}에서 이미 조기 종료된 학습입니다 (best {state['best_loss']:.6f}). "
+              f"계속 학습하려면 --patience 0으로 재개하세요: {out_path}")
+        return out_path
+
+    images = build_cache(paths, args.workers, args.cache, args.cache_dir, args.category)
+    train_idx, val_idx = split_indices(len(paths), args.val_split, args.seed)
+    print(f"[{args.category}] 학습 {len(train_idx)}개, 검증 {len(val_idx)}개 ({train_dir})")
+
+    pin_memory = device.type == 'cuda'
+    train_loader = make_loader(images, train_idx, args.batch_size, True, args.workers, pin_memory)
+    val_loader = make_loader(images, val_idx, args.batch_size, False, 0, pin_memory) if len(val_idx) else None
+
+    # model
+    torch.manual_seed(args.seed)
+    model = AutoEncoder().to(device)
+    optimizer = torch.optim.Adam(model.parameters(), lr=args.lr)
+    criterion = nn.MSELoss()
+
+    start_epoch, best_loss, bad_epochs = 0, float('inf'), 0
+    history = []
+    if state is not None:
+        model.load_state_dict(state["model"])
+        optimizer.load_state_dict(state["optimizer"])
+        start_epoch, best_loss, bad_epochs = state["epoch"], state["best_loss"], state["bad_epochs"]
+        history = state.get("history", [])
+        torch.set_rng_state(state["rng_state"].cpu())
+        print(f"🔁 체크포인트에서 재개: epoch {start_epoch}, best {best_loss:.6f}")
+
+    # train
+    for epoch in range(start_epoch, args.epochs):
+        start = time.perf_counter()
+        model.train()
+        total_loss, count = torch.zeros((), device=device), 0
+        for batch in tqdm(train_loader, desc=f"Epoch {epoch+1}/{args.epochs}", leave=False):
+            imgs = to_input(batch, device)
+            outputs = model(imgs)
+            loss = criterion(outputs, imgs)
+
+            optimizer.zero_grad(set_to_none=True)
+            loss.backward()
+            optimizer.step()
+
+            # 매 스텝 .item() 동기화 없이 누적
+            total_loss += loss.detach() * len(imgs)
+            count += len(imgs)
+
+        train_loss = total_loss.item() / max(1, count)
+        val_loss = evaluate(model, val_loader, device) if val_loader else train_loss
+        history.append({"epoch": epoch + 1, "train_loss": train_loss, "val_loss": val_loss,
+                        "time_s": round(time.perf_counter() - start, 2)})
+        print(f"Epoch {epoch+1}/{args.epochs}, Loss: {train_loss:.6f}, Val: {val_loss:.6f} "
+              f"({history[-1]['time_s']}s)")
+
+        # 검증 loss가 가장 좋은 가중치를 models/에 저장 (load_model이 읽는 위치)
+        if val_loss < best_loss - args.min_delta:
+            best_loss, bad_epochs = val_loss, 0
+            save_checkpoint(out_path, model.state_dict())
+        else:
+            bad_epochs += 1
+
+        stop = args.patience > 0 and bad_epochs >= args.patience
+        if stop or (epoch + 1) % args.checkpoint_every == 0 or epoch + 1 == args.epochs:
+            save_checkpoint(ckpt_path, {
+                "model": model.state_dict(),
+                "optimizer": optimizer.state_dict(),
+                "epoch": epoch + 1,
+                "best_loss": best_loss,
+                "bad_epochs": bad_epochs,
+                "stopped": stop,
+                "history": history,
+                "rng_state": torch.get_rng_state(),
+                "args": vars(args),
+            })
+        if stop:
+            print(f"⏹ {args.patience} epoch 동안 검증 loss 개선이 없어 조기 종료")
+            break
+
+    with open(os.path.join(MODEL_DIR, f"autoencoder_{args.category}.history.json"), "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+    print(f"✅ 저장 완료: {out_path} (best loss {best_loss:.6f})")
+    return out_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='카테고리별 AutoEncoder 학습 (정상 이미지만 사용)')
+    parser.add_argument("--category", default=class_name, help="카테고리 이름")
+    parser.add_argument("--data-root", default="data", help="{data-root}/{category}/train 구조의 경로")
+    parser.add_argument("--train-dir", help="학습 이미지 폴더 (지정 시 --data-root 무시)")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--lr", type=float, default=LR)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="데이터 로딩 워커 프로세스 수")
+    parser.add_argument("--threads", type=int, default=0, help="CPU 연산 스레드 수 (0이면 PyTorch 기본값)")
+    parser.add_argument("--cache", choices=["ram", "disk"], default="ram",
+                        help="디코딩된 128x128 이미지를 RAM에 유지하거나 memmap 파일로 저장 (다음 실행에서 재사용)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--val-split", type=float, default=0.1, help="검증용으로 떼어둘 비율")
+    parser.add_argument("--patience", type=int, default=5, help="조기 종료 기준 epoch 수 (0이면 미사용)")
+    parser.add_argument("--min-delta", type=float, default=0.0, help="개선으로 인정할 최소 loss 감소량")
+    parser.add_argument("--checkpoint-every", type=int, default=1, help="N epoch마다 체크포인트 저장")
+    parser.add_argument("--resume", action="store_true", help="models/autoencoder_{category}.ckpt에서 재개")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--device", default=str(DEVICE))
+    train(parser.parse_args())
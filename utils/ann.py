@@ -0,0 +1,332 @@
+import os
+import json
+import time
+
+import numpy as np
+
+from config import *
+from utils.search import topk_indices, normalize_query, normalize_queries
+from utils.metrics import METRICS, SCAN, TOPK
+
+ANN_VERSION = 1
+ANN_DIR_NAME = "ivf"
+
+# 인덱스 학습/인코딩 시 한 번에 처리하는 행 수
+ENCODE_CHUNK = 65536
+
+
+class IVFIndex:
+    """
+    IVF(inverted file) 근사 최근접 이웃 인덱스 (선택적으로 Product Quantization)
+
+    - coarse centroid(k-means)로 벡터를 nlist개의 리스트로 나누고, 검색 시 쿼리와 가까운
+      nprobe개 리스트만 스캔합니다.
+    - pq_m > 0이면 각 벡터의 residual(벡터 - centroid)을 pq_m개 부분공간의 8bit 코드로 저장하고
+      lookup table로 내적을 근사합니다. rerank_vectors가 있으면 상위 후보를 원본 벡터로 재계산합니다.
+
+    SearchIndex와 같은 search(query_vec, k) 인터페이스를 제공합니다.
+    """
+
+    def __init__(self, centroids, offsets, rows, ids, vectors=None, codes=None, codebooks=None,
+                 nprobe=IVF_NPROBE, rerank_vectors=None, rerank_factor=ANN_RERANK_FACTOR,
+                 store_generation=None):
+        self.centroids = centroids          # (nlist, D)
+        self.offsets = offsets              # (nlist + 1,) 리스트별 시작 위치
+        self.rows = rows                    # (N,) 리스트 순서 → 저장소 행 번호
+        self.ids = ids                      # 저장소 행 번호 → 파일명
+        self.vectors = vectors              # (N, D) 리스트 순서로 정렬된 벡터 (PQ 미사용 시)
+        self.codes = codes                  # (N, M) uint8 PQ 코드 (PQ 사용 시)
+        self.codebooks = codebooks          # (M, K, D/M) PQ 코드북
+        self.nprobe = nprobe
+        self.rerank_vectors = rerank_vectors  # 저장소 행렬 (PQ rerank용, 선택)
+        self.rerank_factor = rerank_factor
+        self.store_generation = store_generation
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    @property
+    def dim(self):
+        return self.centroids.shape[1]
+
+    @property
+    def pq_m(self):
+        return 0 if self.codes is None else self.codes.shape[1]
+
+    @classmethod
+    def train(cls, vectors, ids, nlist=None, pq_m=0, nprobe=IVF_NPROBE, train_size=200000, seed=0):
+        """
+        저장소 행렬로 IVF(-PQ) 인덱스를 학습합니다. (scikit-learn MiniBatchKMeans 사용)
+
+        Args:
+            vectors: (N, D) 정규화된 임베딩 (memmap 가능)
+            nlist: coarse centroid 수 (None이면 4*sqrt(N))
+            pq_m: PQ 부분공간 수 (0이면 PQ 미사용, D의 약수여야 함)
+        """
+        from sklearn.cluster import MiniBatchKMeans
+
+        n, d = vectors.shape
+        if n == 0:
+            raise ValueError("빈 DB로는 인덱스를 학습할 수 없습니다.")
+        if pq_m and d % pq_m != 0:
+            raise ValueError(f"pq_m({pq_m})은 임베딩 차원({d})의 약수여야 합니다.")
+
+        nlist = nlist or max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(n, size=min(n, max(train_size, nlist * 39)), replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+
+        if VERBOSE:
+            print(f"🧭 IVF 학습: N={n}, nlist={nlist}, PQ={'M=' + str(pq_m) if pq_m else '없음'}, "
+                  f"학습 샘플 {len(sample)}개")
+
+        kmeans = MiniBatchKMeans(n_clusters=nlist, batch_size=max(1024, nlist * 4),
+                                 n_init=3, random_state=seed)
+        kmeans.fit(sample)
+        # 내적 검색이므로 spherical k-means처럼 centroid를 정규화
+        centroids = kmeans.cluster_centers_.astype(np.float32)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        assign = np.empty(n, dtype=np.int64)
+        for start in range(0, n, ENCODE_CHUNK):
+            chunk = np.asarray(vectors[start:start + ENCODE_CHUNK], dtype=np.float32)
+            assign[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+
+        rows = np.argsort(assign, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+
+        index = cls(centroids, offsets, rows, ids, nprobe=nprobe)
+
+        if not pq_m:
+            index.vectors = np.asarray(vectors[rows], dtype=np.float32)
+            return index
+
+        # PQ: 부분공간별 k-means 코드북 (residual 기준)
+        dsub = d // pq_m
+        ksub = min(256, len(sample))
+        residual = sample - centroids[assign[sample_rows]]
+        codebooks = np.empty((pq_m, ksub, dsub), dtype=np.float32)
+        for j in range(pq_m):
+            sub = residual[:, j * dsub:(j + 1) * dsub]
+            km = MiniBatchKMeans(n_clusters=ksub, batch_size=max(1024, ksub * 4),
+                                 n_init=3, random_state=seed + j + 1)
+            km.fit(sub)
+            codebooks[j] = km.cluster_centers_
+
+        codes = np.empty((n, pq_m), dtype=np.uint8)
+        for start in range(0, n, ENCODE_CHUNK):
+            chunk_rows = rows[start:start + ENCODE_CHUNK]
+            chunk = np.asarray(vectors[np.sort(chunk_rows)], dtype=np.float32)
+            # 정렬된 행 순서로 읽은 뒤 리스트 순서로 되돌림 (memmap 순차 접근)
+            chunk = chunk[np.argsort(np.argsort(chunk_rows))]
+            codes[start:start + len(chunk)] = _pq_encode(chunk - centroids[assign[chunk_rows]], codebooks)
+
+        index.codes = codes
+        index.codebooks = codebooks
+        return index
+
+    def search(self, query_vec, k=5, nprobe=None):
+        """
+        Returns:
+            [(파일명, 유사도), ...] 유사도 내림차순 (PQ 사용 시 rerank하지 않으면 근사 유사도)
+        """
+        k = min(k, len(self.rows))
+        if k <= 0:
+            return []
+
+        query = normalize_query(query_vec)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        METRICS.inc("search.queries")
+        start_scan = time.perf_counter()
+
+        coarse = self.centroids @ query
+        probe = topk_indices(coarse, nprobe)
+
+        if self.codes is not None:
+            # 부분공간별 lookup table: (M, K)
+            dsub = self.codebooks.shape[2]
+            table = np.einsum("mkd,md->mk", self.codebooks, query.reshape(-1, dsub))
+            sub_idx = np.arange(self.pq_m)
+
+        positions, scores = [], []
+        for l in probe:
+            start, end = self.offsets[l], self.offsets[l + 1]
+            if start == end:
+                continue
+            if self.codes is None:
+                list_scores = self.vectors[start:end] @ query
+            else:
+                list_scores = coarse[l] + table[sub_idx, self.codes[start:end]].sum(axis=1)
+            positions.append(np.arange(start, end))
+            scores.append(list_scores)
+
+        if not scores:
+            return []
+
+        positions = np.concatenate(positions)
+        scores = np.concatenate(scores).astype(np.float32)
+        METRICS.observe(SCAN, time.perf_counter() - start_scan)
+
+        if self.codes is not None and self.rerank_vectors is not None:
+            # PQ 근사 점수 상위 후보만 원본 벡터로 재계산
+            with METRICS.timer(TOPK):
+                cand = topk_indices(scores, k * max(1, self.rerank_factor))
+            rows = self.rows[positions[cand]]
+            order = np.argsort(rows)
+            exact = np.empty(len(rows), dtype=np.float32)
+            exact[order] = np.asarray(self.rerank_vectors[rows[order]], dtype=np.float32) @ query
+            top = topk_indices(exact, k)
+            return [(self.ids[rows[i]], float(exact[i])) for i in top]
+
+        with METRICS.timer(TOPK):
+            top = topk_indices(scores, k)
+        return [(self.ids[self.rows[positions[i]]], float(scores[i])) for i in top]
+
+    def search_batch(self, query_vecs, k=5, nprobe=None):
+        """여러 쿼리 검색 (쿼리마다 probe 리스트가 달라 쿼리별로 처리)"""
+        return [self.search(query, k, nprobe=nprobe) for query in normalize_queries(query_vecs)]
+
+    def save(self, index_dir):
+        """저장소 옆 디렉토리에 저장 (각 배열은 .npy, 로드 시 memmap)"""
+        os.makedirs(index_dir, exist_ok=True)
+        arrays = {"centroids": self.centroids, "offsets": self.offsets, "rows": self.rows}
+        if self.codes is None:
+            arrays["vectors"] = self.vectors
+        else:
+            arrays["codes"] = self.codes
+            arrays["codebooks"] = self.codebooks
+        for name, arr in arrays.items():
+            np.save(os.path.join(index_dir, name + ".npy"), np.asarray(arr))
+        # 이전 설정(PQ 유무 변경)에서 남은 배열 정리
+        for name in ("vectors", "codes", "codebooks"):
+            path = os.path.join(index_dir, name + ".npy")
+            if name not in arrays and os.path.exists(path):
+                os.remove(path)
+
+        meta = {
+            "version": ANN_VERSION,
+            "nlist": self.nlist,
+            "dim": self.dim,
+            "count": len(self),
+            "pq_m": self.pq_m,
+            "store_generation": self.store_generation,
+        }
+        with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, index_dir, ids, nprobe=IVF_NPROBE, rerank_vectors=None):
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != ANN_VERSION:
+            raise ValueError(f"지원하지 않는 ANN 인덱스 버전: {meta.get('version')}")
+
+        def load_array(name):
+            return np.load(os.path.join(index_dir, name + ".npy"), mmap_mode="r")
+
+        index = cls(np.load(os.path.join(index_dir, "centroids.npy")),
+                    np.load(os.path.join(index_dir, "offsets.npy")),
+                    load_array("rows"), ids, nprobe=nprobe,
+                    rerank_vectors=rerank_vectors,
+                    store_generation=meta.get("store_generation"))
+        if meta["pq_m"]:
+            index.codes = load_array("codes")
+            index.codebooks = np.load(os.path.join(index_dir, "codebooks.npy"))
+        else:
+            index.vectors = load_array("vectors")
+        return index
+
+
+def _pq_encode(residual, codebooks):
+    """(n, D) residual → (n, M) uint8 코드 (부분공간별 최근접 코드워드)"""
+    m, ksub, dsub = codebooks.shape
+    codes = np.empty((len(residual), m), dtype=np.uint8)
+    for j in range(m):
+        sub = residual[:, j * dsub:(j + 1) * dsub]
+        cb = codebooks[j]
+        # ||x - c||^2 = ||x||^2 - 2 x·c + ||c||^2 에서 x에 무관한 항 제외
+        dist = (cb * cb).sum(axis=1) - 2 * (sub @ cb.T)
+        codes[:, j] = np.argmin(dist, axis=1)
+    return codes
+
+
+def ann_dir(store_dir=STORE_DIR):
+    return os.path.join(store_dir, ANN_DIR_NAME)
+
+
+def build_ann_index(store, store_dir=STORE_DIR, nlist=IVF_NLIST, pq_m=PQ_M, nprobe=IVF_NPROBE):
+    """저장소로부터 IVF 인덱스를 학습하고 저장소 옆에 저장"""
+    index = IVFIndex.train(store.exact_vectors, store.ids, nlist=nlist, pq_m=pq_m, nprobe=nprobe)
+    index.store_generation = store.generation
+    index.save(ann_dir(store_dir))
+    if pq_m:
+        index.rerank_vectors = store.exact_vectors
+    if VERBOSE:
+        print(f"✅ IVF 인덱스 저장 완료: {ann_dir(store_dir)}")
+    return index
+
+
+def load_ann_index(store, store_dir=STORE_DIR, nprobe=IVF_NPROBE, rerank=True):
+    """
+    저장된 IVF 인덱스를 엽니다. 없거나 저장소보다 오래된 경우 None
+    """
+    index_dir = ann_dir(store_dir)
+    if not os.path.exists(os.path.join(index_dir, "meta.json")):
+        return None
+    try:
+        index = IVFIndex.load(index_dir, store.ids, nprobe=nprobe,
+                              rerank_vectors=store.exact_vectors if rerank else None)
+    except Exception as e:
+        if LOG_ERRORS:
+            print(f"⚠️ IVF 인덱스 로드 실패: {e}")
+        return None
+
+    if index.store_generation != store.generation or len(index) != len(store):
+        if VERBOSE:
+            print("⚠️ IVF 인덱스가 현재 DB보다 오래되었습니다. --build-ann으로 다시 학습하세요.")
+        return None
+    return index
+
+
+def recall_report(ann_index, exact_index, k=10, num_queries=200, nprobe=None, seed=0):
+    """
+    DB에서 샘플링한 쿼리로 exact 검색 대비 recall@k와 평균 검색 시간을 측정합니다.
+    """
+    n = len(exact_index)
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(n, size=min(n, num_queries), replace=False)
+
+    hits, ann_time, exact_time = 0, 0.0, 0.0
+    for row in query_rows:
+        query = exact_index.vector(row)
+
+        t0 = time.perf_counter()
+        expected = {fname for fname, _ in exact_index.search(query, k)}
+        t1 = time.perf_counter()
+        found = {fname for fname, _ in ann_index.search(query, k, nprobe=nprobe)}
+        t2 = time.perf_counter()
+
+        hits += len(expected & found)
+        exact_time += t1 - t0
+        ann_time += t2 - t1
+
+    num = len(query_rows)
+    report = {
+        "k": k,
+        "queries": num,
+        "nprobe": nprobe or ann_index.nprobe,
+        "recall": hits / max(1, num * min(k, n)),
+        "exact_ms": 1000 * exact_time / max(1, num),
+        "ann_ms": 1000 * ann_time / max(1, num),
+    }
+    if VERBOSE:
+        print(f"📊 recall@{k} = {report['recall']:.4f} (nprobe={report['nprobe']}, 쿼리 {num}개) | "
+              f"exact {report['exact_ms']:.2f}ms, IVF {report['ann_ms']:.2f}ms")
+    return report
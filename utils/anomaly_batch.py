@@ -0,0 +1,269 @@
+import os
+import sys
+import time
+import csv
+import json
+from collections import deque
+from itertools import islice, groupby
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from preprocess_img import PreprocessEngine
+from models.anomaly_detector_encoder import (compute_anomaly_scores, compute_anomaly_maps, compact_heatmaps,
+                                             available_categories)
+from utils.metrics import METRICS
+from utils.scanner import scan_images
+from config import *
+
+# 저장용 압축 히트맵 크기
+COMPACT_MAP_SIZE = (32, 32)
+
+
+def iter_image_paths(sources):
+    """
+    폴더(하위 폴더 포함), 이미지 파일, 경로 목록 파일(한 줄에 경로 하나)을 순서대로 펼쳐 이미지 경로 반환
+    """
+    for source in sources:
+        if os.path.isdir(source):
+            for entry in scan_images(source):
+                yield entry.path
+        elif source.lower().endswith(SUPPORTED_FORMATS):
+            yield source
+        else:
+            with open(source, "r", encoding="utf-8") as f:
+                for line in f:
+                    path = line.strip()
+                    if path and not path.startswith("#"):
+                        yield path
+
+
+def infer_category(path, categories):
+    """경로의 폴더 이름 중 모델이 있는 카테고리 (MVTec 구조: data/{category}/test/...), 없으면 None"""
+    for part in os.path.normpath(path).split(os.sep)[:-1]:
+        if part in categories:
+            return part
+    return None
+
+
+def make_loader(category, preprocessed=False, cache_dir=None):
+    """
+    경로 → (3, 128, 128) 텐서 변환 함수
+
+    기본값은 단일 이미지 점수(anomaly_main.load_image의 tensor_original)와 같은 Resize + ToTensor이고,
+    preprocessed=True이면 카테고리별 get_transform을 적용합니다.
+    (cable의 ColorJitter처럼 무작위 변환이 있으면 같은 이미지도 점수가 조금씩 달라질 수 있음)
+    cache_dir이 있으면 결정적 전처리 결과를 디스크에 캐시하여 반복 실행 시 디코딩을 생략합니다.
+    """
+    engine = PreprocessEngine(category, cache_dir)
+    return engine.load_preprocessed if preprocessed else engine.load_original
+
+
+def iter_batches(paths, load_fn, batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS, prefetch=2):
+    """
+    워커 스레드에서 디코딩/전처리를 미리(prefetch 배치 수만큼) 진행하며 배치 단위로 반환하는 generator
+
+    Yields:
+        (ok_paths, (B, 3, H, W) 텐서 또는 None, [(path, Exception), ...])
+    """
+    batch_size = max(1, int(batch_size))
+    path_iter = iter(paths)
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as pool:
+        def submit_next():
+            chunk = list(islice(path_iter, batch_size))
+            if chunk:
+                pending.append([(p, pool.submit(load_fn, p)) for p in chunk])
+
+        for _ in range(max(1, prefetch)):
+            submit_next()
+
+        while pending:
+            chunk = pending.popleft()
+            # 현재 배치를 처리하는 동안 다음 배치를 디코딩
+            submit_next()
+
+            ok_paths, tensors, errors = [], [], []
+            for path, future in chunk:
+                try:
+                    tensors.append(future.result())
+                    ok_paths.append(path)
+                except Exception as e:
+                    errors.append((path, e))
+
+            yield ok_paths, torch.stack(tensors) if tensors else None, errors
+
+
+def score_paths(model, paths, category, batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS,
+                device="cpu", preprocessed=False, with_maps=False, cache_dir=None):
+    """
+    이미지들을 배치로 AutoEncoder에 통과시켜 이미지별 anomaly score를 계산하는 generator
+
+    with_maps=True이면 같은 forward pass에서 위치 정보도 계산합니다 (compute_anomaly_maps).
+
+    Yields:
+        (path, score, maps) 또는 실패 시 (path, Exception, None)
+        maps: {"regions": [[x0, y0, x1, y1, score], ...], "map": uint8 (h, w), "scale": float} 또는 None
+    """
+    model = model.to(device).eval()
+    load_fn = METRICS.timed("anomaly.load", make_loader(category, preprocessed, cache_dir))
+
+    for ok_paths, batch, errors in iter_batches(paths, load_fn, batch_size, num_workers):
+        for path, error in errors:
+            yield path, error, None
+        if batch is None:
+            continue
+
+        start = time.perf_counter()
+        try:
+            if with_maps:
+                result = compute_anomaly_maps(model, batch.to(device))
+                scores = result["scores"]
+                compact, scale = compact_heatmaps(result["heatmap"], COMPACT_MAP_SIZE)
+                maps = _batch_maps(result["regions"], result["region_scores"], compact, scale)
+            else:
+                scores, _ = compute_anomaly_scores(model, batch.to(device))
+                maps = [None] * len(ok_paths)
+            scores = scores.cpu().tolist()
+        except Exception as e:
+            for path in ok_paths:
+                yield path, e, None
+            continue
+        METRICS.observe("anomaly.forward", time.perf_counter() - start, len(ok_paths))
+
+        for path, score, info in zip(ok_paths, scores, maps):
+            yield path, score, info
+
+
+def _batch_maps(regions, region_scores, compact, scale):
+    """배치 텐서 → 이미지별 위치 정보 dict (float 맵/복원 결과는 보관하지 않음)"""
+    regions = regions.cpu().tolist()
+    region_scores = region_scores.cpu().tolist()
+    compact = compact.cpu().numpy()
+    scale = scale.cpu().tolist()
+    return [{"regions": [box + [round(s, 8)] for box, s in zip(regions[i], region_scores[i])],
+             "map": compact[i], "scale": scale[i]}
+            for i in range(len(regions))]
+
+
+class ScoreWriter:
+    """anomaly score를 JSONL 또는 CSV로 스트리밍 기록 (경로가 '-'이면 표준 출력)"""
+
+    FIELDS = ["path", "category", "score", "threshold", "status", "regions", "error"]
+
+    def __init__(self, path="-"):
+        self.format = "csv" if path.lower().endswith(".csv") else "jsonl"
+        self.file = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+        self.csv = None
+        if self.format == "csv":
+            self.csv = csv.writer(self.file)
+            self.csv.writerow(self.FIELDS)
+
+    def write(self, path, category, score, threshold, regions=None):
+        status = "Anomaly" if score > threshold else "Normal"
+        if self.csv:
+            self.csv.writerow([path, category, f"{score:.6f}", threshold, status,
+                               json.dumps(regions) if regions else "", ""])
+        else:
+            record = {"path": path, "category": category, "score": round(score, 8),
+                      "threshold": threshold, "status": status}
+            if regions:
+                record["regions"] = regions
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def write_error(self, path, category, error):
+        if self.csv:
+            self.csv.writerow([path, category, "", "", "", "", str(error)])
+        else:
+            self.file.write(json.dumps({"path": path, "category": category, "error": str(error)},
+                                       ensure_ascii=False) + "\n")
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class MapWriter:
+    """
+    이미지별 압축 히트맵(uint8)을 모아 .npz 하나로 저장
+    (paths, categories, maps (N, h, w) uint8, scales (N,) - 원래 값 ≈ map / 255 * scale)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.paths, self.categories, self.maps, self.scales = [], [], [], []
+
+    def write(self, path, category, maps):
+        self.paths.append(path)
+        self.categories.append(category)
+        self.maps.append(maps["map"])
+        self.scales.append(maps["scale"])
+
+    def close(self):
+        shape = (0,) + COMPACT_MAP_SIZE
+        np.savez_compressed(self.path, paths=np.array(self.paths, dtype=str),
+                            categories=np.array(self.categories, dtype=str),
+                            maps=np.stack(self.maps) if self.maps else np.zeros(shape, np.uint8),
+                            scales=np.array(self.scales, dtype=np.float32))
+
+
+def score_to_writer(registry, paths, category, threshold, writer, batch_size=BATCH_SIZE,
+                    num_workers=DECODE_WORKERS, device="cpu", preprocessed=False, map_writer=None,
+                    cache_dir=None):
+    """
+    배치 점수 계산 결과를 writer에 기록
+    map_writer(MapWriter)가 있으면 이상 위치(top patch 좌표)와 압축 히트맵도 함께 기록합니다.
+    threshold=None이면 카테고리별로 같은 preprocessed 방식으로 보정된 threshold를 사용합니다
+    (utils.thresholds.load_threshold, 그 방식의 보정값이 없으면 FileNotFoundError).
+
+    category="auto"이면 경로에서 카테고리를 추론하고, 연속된 같은 카테고리 구간마다
+    registry(ModelRegistry)에서 모델을 가져옵니다 (자주 쓰는 모델은 메모리에 유지).
+
+    Returns:
+        (정상 수, 이상 수, 실패 수)
+    """
+    from utils.thresholds import load_threshold
+
+    if category == "auto":
+        categories = set(available_categories(registry.model_dir))
+        groups = groupby(paths, key=lambda p: infer_category(p, categories))
+    else:
+        groups = [(category, paths)]
+
+    normal, anomaly, failed = 0, 0, 0
+    for group_category, group_paths in groups:
+        if group_category is None:
+            for path in group_paths:
+                writer.write_error(path, None, "카테고리를 추론할 수 없습니다")
+                failed += 1
+            continue
+
+        model = registry.get(group_category)
+        if threshold is not None:
+            group_threshold = threshold
+        else:
+            group_threshold = load_threshold(group_category, registry.model_dir, preprocessed=preprocessed)
+        results = score_paths(model, group_paths, group_category, batch_size, num_workers, device,
+                              preprocessed, with_maps=map_writer is not None, cache_dir=cache_dir)
+        for path, score, maps in results:
+            if isinstance(score, Exception):
+                writer.write_error(path, group_category, score)
+                failed += 1
+            else:
+                writer.write(path, group_category, score, group_threshold, maps and maps["regions"])
+                if maps is not None:
+                    map_writer.write(path, group_category, maps)
+                if score > group_threshold:
+                    anomaly += 1
+                else:
+                    normal += 1
+
+            done = normal + anomaly + failed
+            if VERBOSE and done % PROGRESS_UPDATE_INTERVAL == 0:
+                print(f"   진행: {done}개 이미지 처리", file=sys.stderr)
+
+    return normal, anomaly, failed
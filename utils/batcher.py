@@ -0,0 +1,150 @@
+import time
+import queue
+import asyncio
+import threading
+from collections import deque, Counter
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    동시 요청을 모아 한 번에 처리하는 마이크로 배치 스케줄러
+
+    submit()으로 들어온 항목을 최대 max_latency_ms 동안(또는 max_batch_size개가 찰 때까지) 모아
+    전용 스레드에서 fn(items)를 한 번 호출하고, 결과를 각 요청의 Future로 돌려줍니다.
+    스레드에서는 submit(...).result(), asyncio에서는 await submit_async(...)로 사용합니다.
+
+    fn: 항목 리스트 → 같은 순서의 결과 리스트 (개별 실패는 Exception 객체로 반환 가능)
+    """
+
+    def __init__(self, fn, max_batch_size=32, max_latency_ms=5.0, max_queue=0, name="micro-batcher"):
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_latency = max_latency_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+
+        # 지표
+        self._batch_sizes = Counter()
+        self._wait_ms = deque(maxlen=2048)
+        self._submitted = 0
+        self._processed = 0
+        self._rejected = 0
+        self._failed = 0
+
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """항목을 큐에 넣고 concurrent.futures.Future 반환. 큐가 가득 차면 OverflowError"""
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise OverflowError("배치 큐가 가득 찼습니다.")
+        with self._lock:
+            self._submitted += 1
+        return future
+
+    async def submit_async(self, item):
+        """asyncio용 submit (이벤트 루프를 막지 않음)"""
+        return await asyncio.wrap_future(self.submit(item))
+
+    def __call__(self, item, timeout=None):
+        """동기 호출: 결과가 나올 때까지 대기"""
+        return self.submit(item).result(timeout)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def close(self):
+        """남은 항목을 처리한 뒤 스케줄러 스레드 종료"""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def metrics(self):
+        """큐 깊이, 배치 크기 히스토그램, 대기 시간 지표"""
+        with self._lock:
+            waits = sorted(self._wait_ms)
+            batches = sum(self._batch_sizes.values())
+            return {
+                "queue_depth": self.queue_depth,
+                "submitted": self._submitted,
+                "processed": self._processed,
+                "rejected": self._rejected,
+                "failed": self._failed,
+                "batches": batches,
+                "avg_batch_size": round(self._processed / max(1, batches), 2),
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "wait_ms": {
+                    "p50": round(_percentile(waits, 50), 3),
+                    "p99": round(_percentile(waits, 99), 3),
+                    "max": round(waits[-1], 3) if waits else 0.0,
+                },
+            }
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            # 첫 항목이 들어온 시점부터 max_latency까지만 추가 항목을 기다림
+            batch = [first]
+            deadline = first[2] + self.max_latency
+            stop = False
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                try:
+                    entry = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stop = True
+                    break
+                batch.append(entry)
+
+            self._run(batch)
+            if stop:
+                return
+
+    def _run(self, batch):
+        start = time.perf_counter()
+        # 대기 중 취소된 요청은 제외
+        batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        items = [item for item, _, _ in batch]
+        try:
+            results = self.fn(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"배치 결과 수({len(results)})가 요청 수({len(items)})와 다릅니다.")
+        except Exception as e:
+            results = [e] * len(items)
+
+        failed = 0
+        for (_, future, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+                failed += 1
+            else:
+                future.set_result(result)
+
+        with self._lock:
+            self._batch_sizes[len(batch)] += 1
+            self._processed += len(batch)
+            self._failed += failed
+            self._wait_ms.extend(1000 * (start - enqueued) for _, _, enqueued in batch)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
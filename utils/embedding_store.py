@@ -0,0 +1,475 @@
+import os
+import json
+import glob
+
+import numpy as np
+
+from config import *
+
+STORE_VERSION = 1
+INDEX_FILE = "index.json"
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+# 저장/양자화 시 한 번에 처리하는 행 수 (큰 행렬도 메모리를 두 배로 쓰지 않도록)
+COPY_CHUNK = 65536
+
+
+class QuantizedMatrix:
+    """
+    행별 scale을 가진 int8 (N, D) 행렬: vectors[i] ≈ codes[i] * scales[i]
+
+    인덱싱하면 float32로 복원된 행을 돌려주므로 float 행렬 자리에 그대로 쓸 수 있습니다.
+    (검색은 SearchIndex가 codes/scales로 직접 스캔)
+    """
+
+    def __init__(self, codes, scales):
+        self.codes = codes    # (N, D) int8 (memmap 가능)
+        self.scales = scales  # (N,) float32
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def dtype(self):
+        return self.codes.dtype
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def __getitem__(self, idx):
+        codes = np.asarray(self.codes[idx], dtype=np.float32)
+        scales = np.asarray(self.scales[idx], dtype=np.float32)
+        return codes * (scales[..., None] if scales.ndim else scales)
+
+    def __array__(self, dtype=None, copy=None):
+        vectors = self[:]
+        return vectors if dtype is None else vectors.astype(dtype, copy=False)
+
+
+def quantize_rows(vectors):
+    """
+    float (n, D) → (int8 codes, float32 scales), 행별 scale = max|v| / 127
+    이미 양자화된 값을 다시 양자화해도 같은 코드가 나옵니다.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_matrix(vectors, dtype):
+    """float (N, D) 행렬을 메모리에서 float16 배열 또는 int8 QuantizedMatrix로 변환 (구간별 처리)"""
+    n, d = vectors.shape
+    if dtype == "float16":
+        out = np.empty((n, d), dtype=np.float16)
+        for start in range(0, n, COPY_CHUNK):
+            out[start:start + COPY_CHUNK] = vectors[start:start + COPY_CHUNK]
+        return out
+    if dtype != "int8":
+        raise ValueError(f"Unsupported dtype: {dtype}")
+    codes = np.empty((n, d), dtype=np.int8)
+    scales = np.empty(n, dtype=np.float32)
+    for start in range(0, n, COPY_CHUNK):
+        codes[start:start + COPY_CHUNK], scales[start:start + COPY_CHUNK] = \
+            quantize_rows(vectors[start:start + COPY_CHUNK])
+    return QuantizedMatrix(codes, scales)
+
+
+class EmbeddingStore:
+    """
+    임베딩 저장소: 연속된 (N, D) 행렬 + 파일명/메타데이터
+
+    디스크에는 `vectors-XXXXXX.npy`(np.memmap으로 열리는 행렬)와
+    `index.json`(버전, 모델명, 차원, 파일명, 파일별 메타데이터) 두 파일로 저장됩니다.
+    행렬은 OS 페이지 캐시를 통해 여러 프로세스가 공유합니다.
+    """
+
+    def __init__(self, ids, vectors, meta=None, model_name=MODEL_NAME, normalized=True, rerank_vectors=None):
+        self.ids = list(ids)
+        self.vectors = vectors
+        # float16/int8 저장소의 float32 원본 (memmap, 검색 상위 후보 재계산용, 선택)
+        self.rerank_vectors = rerank_vectors
+        self.model_name = model_name
+        self.normalized = normalized
+        self._meta = meta
+        self._meta_columns = None
+        self._rows = None
+        # 디스크에 저장된 행렬 세대 (load_store로 연 경우에만 설정, ANN 인덱스 최신 여부 확인용)
+        self.generation = None
+
+        if self.vectors.ndim != 2 or self.vectors.shape[0] != len(self.ids):
+            raise ValueError(f"임베딩 행렬 크기 {self.vectors.shape}와 파일 수 {len(self.ids)}가 맞지 않습니다.")
+
+    @classmethod
+    def from_dict(cls, db, meta=None, model_name=MODEL_NAME, dim=None):
+        """{파일명: 벡터} dict로부터 생성"""
+        ids = list(db.keys())
+        if ids:
+            vectors = np.stack([to_numpy(db[fname]) for fname in ids])
+        else:
+            vectors = np.zeros((0, dim or 0), dtype=np.float32)
+        return cls(ids, vectors, meta=meta, model_name=model_name)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __contains__(self, fname):
+        return fname in self.rows
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    @property
+    def dtype(self):
+        return str(self.vectors.dtype)
+
+    @property
+    def exact_vectors(self):
+        """float32 원본이 있으면 원본, 없으면 저장된 행렬"""
+        return self.rerank_vectors if self.rerank_vectors is not None else self.vectors
+
+    @property
+    def rows(self):
+        """파일명 → 행 번호"""
+        if self._rows is None:
+            self._rows = {fname: i for i, fname in enumerate(self.ids)}
+        return self._rows
+
+    @property
+    def meta(self):
+        """파일명 → {mtime, size[, hash]} (필요할 때만 sidecar 컬럼에서 구성)"""
+        if self._meta is None:
+            self._meta = _meta_from_columns(self.ids, self._meta_columns)
+            self._meta_columns = None
+        return self._meta
+
+    @meta.setter
+    def meta(self, value):
+        self._meta = value
+        self._meta_columns = None
+
+    def get(self, fname):
+        """파일명의 임베딩 (float32 1D 배열), 없으면 None"""
+        row = self.rows.get(fname)
+        if row is None:
+            return None
+        return np.asarray(self.exact_vectors[row], dtype=np.float32)
+
+    def updated(self, new_vectors, removed=(), meta=None):
+        """
+        일부 행만 바뀐 새 저장소를 반환합니다.
+
+        Args:
+            new_vectors: {파일명: 벡터} - 추가되거나 변경된 임베딩
+            removed: 삭제할 파일명 목록
+            meta: 새 메타데이터 dict (None이면 기존 유지)
+        """
+        drop = set(removed) | set(new_vectors)
+        keep = [i for i, fname in enumerate(self.ids) if fname not in drop]
+
+        ids = [self.ids[i] for i in keep] + list(new_vectors)
+        parts = []
+        if keep:
+            source = self.exact_vectors
+            kept = source if len(keep) == len(self.ids) else source[keep]
+            parts.append(np.asarray(kept, dtype=np.float32))
+        if new_vectors:
+            parts.append(np.stack([to_numpy(v) for v in new_vectors.values()]))
+        vectors = np.concatenate(parts) if parts else np.zeros((0, self.dim), dtype=np.float32)
+
+        return EmbeddingStore(ids, vectors, meta=meta if meta is not None else self.meta,
+                              model_name=self.model_name, normalized=self.normalized)
+
+
+def to_numpy(vec):
+    """torch 텐서/배열을 float32 1D numpy 배열로 변환"""
+    if hasattr(vec, "detach"):
+        vec = vec.detach().cpu().float().numpy()
+    return np.asarray(vec, dtype=np.float32).reshape(-1)
+
+
+def _meta_to_columns(ids, meta):
+    """파일별 메타데이터 dict → 컬럼 형식 (sidecar 크기 절약)"""
+    columns = {"mtime": [], "size": []}
+    hashes = []
+    for fname in ids:
+        sig = meta.get(fname) or {}
+        columns["mtime"].append(sig.get("mtime"))
+        columns["size"].append(sig.get("size"))
+        hashes.append(sig.get("hash"))
+    if any(h is not None for h in hashes):
+        columns["hash"] = hashes
+    return columns
+
+
+def _meta_from_columns(ids, columns):
+    meta = {}
+    if not columns:
+        return meta
+    mtimes = columns.get("mtime", [])
+    sizes = columns.get("size", [])
+    hashes = columns.get("hash")
+    for i, fname in enumerate(ids):
+        if i >= len(mtimes) or mtimes[i] is None:
+            continue
+        sig = {"mtime": mtimes[i], "size": sizes[i]}
+        if hashes is not None and hashes[i] is not None:
+            sig["hash"] = hashes[i]
+        meta[fname] = sig
+    return meta
+
+
+def _read_index(store_dir):
+    with open(os.path.join(store_dir, INDEX_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_index(store_dir, index):
+    """index.json을 원자적으로 교체"""
+    path = os.path.join(store_dir, INDEX_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def store_exists(store_dir):
+    return os.path.exists(os.path.join(store_dir, INDEX_FILE))
+
+
+def _write_matrix(path, source, dtype):
+    """source (N, D)를 구간별로 복사하여 dtype 행렬 .npy로 원자적으로 저장"""
+    tmp = path + ".tmp"
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=source.shape)
+    for start in range(0, source.shape[0], COPY_CHUNK):
+        out[start:start + COPY_CHUNK] = source[start:start + COPY_CHUNK]
+    out.flush()
+    del out
+    os.replace(tmp, path)
+
+
+def _write_quantized(codes_path, scales_path, source):
+    """source (N, D)를 구간별로 int8 양자화하여 codes/scales .npy로 저장"""
+    n, d = source.shape
+    codes_tmp, scales_tmp = codes_path + ".tmp", scales_path + ".tmp"
+    codes = np.lib.format.open_memmap(codes_tmp, mode="w+", dtype=np.int8, shape=(n, d))
+    scales = np.empty(n, dtype=np.float32)
+    for start in range(0, n, COPY_CHUNK):
+        codes[start:start + COPY_CHUNK], scales[start:start + COPY_CHUNK] = \
+            quantize_rows(source[start:start + COPY_CHUNK])
+    codes.flush()
+    del codes
+    with open(scales_tmp, "wb") as f:
+        np.save(f, scales)
+    os.replace(scales_tmp, scales_path)
+    os.replace(codes_tmp, codes_path)
+
+
+def save_store(store, store_dir, dtype=STORE_DTYPE, vectors_changed=True, rerank=STORE_RERANK):
+    """
+    저장소를 디스크에 저장합니다.
+
+    행렬은 매번 새 세대 파일(vectors-XXXXXX.npy)로 쓰고 index.json을 원자적으로 교체하므로,
+    이미 기존 행렬을 memmap으로 열고 있는 다른 프로세스에 영향을 주지 않습니다.
+    vectors_changed=False이면 메타데이터(index.json)만 다시 씁니다.
+
+    dtype="int8"이면 행별 scale(scales-XXXXXX.npy)과 함께 양자화하여 저장하고,
+    float16/int8에서 rerank=True이면 검색 상위 후보 재계산용 float32 원본(rerank-XXXXXX.npy)도 저장합니다.
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported dtype: {dtype}")
+
+    try:
+        os.makedirs(store_dir, exist_ok=True)
+        old_index = _read_index(store_dir) if store_exists(store_dir) else None
+
+        if vectors_changed or old_index is None:
+            generation = old_index["generation"] + 1 if old_index else 1
+            matrix_file = f"vectors-{generation:06d}.npy"
+            # 이미 양자화된 저장소를 다시 저장할 때도 float32 원본이 있으면 원본에서 변환
+            source = store.exact_vectors
+            has_exact = source.dtype == np.float32
+            scales_file = f"scales-{generation:06d}.npy" if dtype == "int8" else None
+            rerank_file = f"rerank-{generation:06d}.npy" if rerank and has_exact and dtype != "float32" else None
+            if dtype == "int8":
+                _write_quantized(os.path.join(store_dir, matrix_file), os.path.join(store_dir, scales_file), source)
+            else:
+                _write_matrix(os.path.join(store_dir, matrix_file), source, dtype)
+            if rerank_file:
+                _write_matrix(os.path.join(store_dir, rerank_file), source, np.float32)
+        else:
+            generation = old_index["generation"]
+            matrix_file = old_index["matrix_file"]
+            scales_file = old_index.get("scales_file")
+            rerank_file = old_index.get("rerank_file")
+            dtype = old_index["dtype"]
+
+        index = {
+            "version": STORE_VERSION,
+            "generation": generation,
+            "model_name": store.model_name,
+            "dim": store.dim,
+            "dtype": dtype,
+            "count": len(store),
+            "normalized": store.normalized,
+            "matrix_file": matrix_file,
+            "scales_file": scales_file,
+            "rerank_file": rerank_file,
+            "ids": store.ids,
+            "meta": _meta_to_columns(store.ids, store.meta),
+        }
+        _write_index(store_dir, index)
+        store.generation = generation
+
+        # 이전 세대 행렬 정리 (다른 프로세스가 열고 있어 삭제가 안 되면 다음 저장 때 재시도)
+        current = {matrix_file, scales_file, rerank_file}
+        for old in glob.glob(os.path.join(store_dir, "*-[0-9]*.npy")):
+            if os.path.basename(old) not in current:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+        if VERBOSE:
+            print(f"✅ DB 저장 완료: {len(store)}개 임베딩 ({dtype})")
+        return True
+
+    except Exception as e:
+        if LOG_ERRORS:
+            print(f"❌ DB 저장 실패: {e}")
+        return False
+
+
+def load_store(store_dir, mmap=True):
+    """
+    저장소를 엽니다. 행렬은 memmap으로 열리므로 데이터는 실제로 접근할 때 페이지 단위로 읽힙니다.
+
+    Returns:
+        EmbeddingStore 또는 실패 시 None
+    """
+    try:
+        index = _read_index(store_dir)
+        if index.get("version") != STORE_VERSION:
+            raise ValueError(f"지원하지 않는 저장소 버전: {index.get('version')}")
+
+        mmap_mode = "r" if mmap else None
+
+        def load_matrix(name, dtype):
+            if index["count"] == 0:
+                return np.zeros((0, index["dim"]), dtype=dtype)
+            return np.load(os.path.join(store_dir, name), mmap_mode=mmap_mode)
+
+        vectors = load_matrix(index["matrix_file"], index["dtype"])
+        if vectors.shape != (index["count"], index["dim"]):
+            raise ValueError(f"행렬 크기 {vectors.shape}가 헤더와 다릅니다 "
+                             f"({index['count']}, {index['dim']})")
+        if index["dtype"] == "int8":
+            scales = (np.load(os.path.join(store_dir, index["scales_file"])) if index["count"]
+                      else np.zeros(0, dtype=np.float32))
+            vectors = QuantizedMatrix(vectors, scales)
+        rerank_vectors = None
+        if index.get("rerank_file"):
+            rerank_vectors = load_matrix(index["rerank_file"], np.float32)
+
+        store = EmbeddingStore(index["ids"], vectors, model_name=index["model_name"],
+                               normalized=index.get("normalized", True), rerank_vectors=rerank_vectors)
+        store._meta_columns = index.get("meta")
+        store.generation = index["generation"]
+
+        if VERBOSE:
+            print(f"✅ DB 로드 완료: {len(store)}개 임베딩 ({index['model_name']}, "
+                  f"{index['dim']}차원, {index['dtype']})")
+        return store
+
+    except Exception as e:
+        if LOG_ERRORS:
+            print(f"❌ DB 로드 실패: {e}")
+        return None
+
+
+def migrate_pickle(pkl_path, store_dir, meta_path=None, model_name=MODEL_NAME, dtype=STORE_DTYPE):
+    """
+    기존 embeddings_db.pkl ({파일명: torch 텐서})을 저장소 형식으로 변환합니다.
+    원본 pickle은 삭제하지 않습니다.
+    """
+    import pickle
+
+    with open(pkl_path, "rb") as f:
+        db = pickle.load(f)
+
+    meta = {}
+    if meta_path and os.path.exists(meta_path):
+        with open(meta_path, "rb") as f:
+            meta = pickle.load(f)
+
+    store = EmbeddingStore.from_dict(db, meta=meta, model_name=model_name)
+    if VERBOSE:
+        print(f"🔁 {pkl_path} → {store_dir} 변환 중 ({len(store)}개 임베딩)")
+    if not save_store(store, store_dir, dtype=dtype):
+        return None
+    if VERBOSE:
+        print("   변환 완료. 기존 pickle 파일은 확인 후 삭제해도 됩니다.")
+    return load_store(store_dir)
+
+
+def open_or_migrate(store_dir=STORE_DIR, pkl_path=DB_PATH, meta_path=DB_META_PATH):
+    """저장소를 열고, 없으면 기존 pickle DB가 있을 때 한 번 변환합니다."""
+    if store_exists(store_dir):
+        return load_store(store_dir)
+    if pkl_path and os.path.exists(pkl_path):
+        try:
+            return migrate_pickle(pkl_path, store_dir, meta_path=meta_path)
+        except Exception as e:
+            if LOG_ERRORS:
+                print(f"❌ 기존 DB 변환 실패: {e}")
+    return None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # 사용법: python -m utils.embedding_store [--dtype float16]
+    #        python -m utils.embedding_store --convert --dtype int8   (기존 저장소 형식 변경)
+    #        python -m utils.embedding_store --report                 (형식별 메모리/recall 비교)
+    parser = argparse.ArgumentParser(description="embeddings_db.pkl → memmap 저장소 변환")
+    parser.add_argument("--pickle", default=DB_PATH, help="기존 pickle DB 경로")
+    parser.add_argument("--meta", default=DB_META_PATH, help="기존 메타데이터 pickle 경로")
+    parser.add_argument("--out", default=STORE_DIR, help="저장소 디렉토리")
+    parser.add_argument("--dtype", default=STORE_DTYPE, choices=SUPPORTED_DTYPES)
+    parser.add_argument("--no-rerank", action="store_true", help="float16/int8 저장 시 float32 원본을 저장하지 않음")
+    parser.add_argument("--convert", action="store_true", help="기존 저장소를 --dtype 형식으로 다시 저장")
+    parser.add_argument("--report", action="store_true",
+                        help="float32 대비 float16/int8의 메모리 절감과 recall@k 비교")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.convert or args.report:
+        store = load_store(args.out)
+        if store is None:
+            exit(1)
+        if args.convert and not save_store(store, args.out, dtype=args.dtype, rerank=not args.no_rerank):
+            exit(1)
+        if args.report:
+            from utils.search import quantization_report
+            quantization_report(store, k=args.top_k, num_queries=args.queries)
+        exit(0)
+
+    if not os.path.exists(args.pickle):
+        print(f"❌ pickle DB를 찾을 수 없습니다: {args.pickle}")
+        exit(1)
+    if migrate_pickle(args.pickle, args.out, meta_path=args.meta, dtype=args.dtype) is None:
+        exit(1)
@@ -0,0 +1,259 @@
+"""
+경량 계측 모듈: 단계별 타이머와 카운터
+
+    from utils.metrics import METRICS
+    with METRICS.timer("search.scan"):
+        scores = vectors @ query
+    METRICS.inc("search.queries")
+
+한 번 기록하는 비용은 perf_counter 두 번 + 잠금 한 번 정도라 핫 패스에 그대로 둘 수 있습니다.
+요약은 JSON(dict) 또는 Prometheus 텍스트 형식으로 내보냅니다.
+"""
+import re
+import sys
+import json
+import atexit
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager, ExitStack
+
+# 단계 이름 (다른 모듈에서 같은 이름을 쓰도록 상수로 정의)
+DECODE = "embed.decode"
+PREPROCESS = "embed.preprocess"
+FORWARD = "embed.forward"
+NORMALIZE = "embed.normalize"
+SCAN = "search.scan"
+TOPK = "search.topk"
+RENDER = "render"
+
+# 타이머별로 분위수 계산에 쓰는 최근 측정값 수
+SAMPLE_SIZE = 2048
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """
+    스레드 안전한 타이머/카운터 모음
+
+    타이머: 횟수, 합계, 최대값과 최근 SAMPLE_SIZE개 측정값(p50/p99 계산용)
+    카운터: 단순 누적 값
+    """
+
+    def __init__(self, enabled=True, sample_size=SAMPLE_SIZE):
+        self.enabled = enabled
+        self.sample_size = sample_size
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self._timers = {}
+        self._counters = {}
+
+    def timer(self, name):
+        """with 블록 실행 시간을 name 타이머에 기록"""
+        return _Timer(self, name) if self.enabled else _NULL_TIMER
+
+    def timed(self, name, fn):
+        """fn 호출마다 실행 시간을 name 타이머에 기록하는 래퍼 (스레드 풀에 넘기는 함수용)"""
+        def wrapper(*args, **kwargs):
+            with self.timer(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def observe(self, name, seconds, count=1):
+        """
+        측정값 기록. count는 한 번의 측정에 포함된 항목 수
+        (예: 배치 forward 한 번에 32장이면 count=32 → 항목당 처리량 계산에 사용)
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                timer = self._timers[name] = {"calls": 0, "items": 0, "total": 0.0, "max": 0.0,
+                                              "samples": deque(maxlen=self.sample_size)}
+            timer["calls"] += 1
+            timer["items"] += count
+            timer["total"] += seconds
+            if seconds > timer["max"]:
+                timer["max"] = seconds
+            timer["samples"].append(seconds)
+
+    def inc(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+    def summary(self):
+        """
+        Returns:
+            {"uptime_s": ..., "timers": {이름: {calls, items, total_s, mean_ms, p50_ms, p99_ms, max_ms}},
+             "counters": {이름: 값}}
+        """
+        with self._lock:
+            timers = {name: dict(t, samples=sorted(t["samples"])) for name, t in self._timers.items()}
+            counters = dict(self._counters)
+
+        out = {}
+        for name in sorted(timers):
+            t = timers[name]
+            samples = t["samples"]
+            out[name] = {
+                "calls": t["calls"],
+                "items": t["items"],
+                "total_s": round(t["total"], 6),
+                "mean_ms": round(1000 * t["total"] / max(1, t["calls"]), 4),
+                "p50_ms": round(1000 * _percentile(samples, 50), 4),
+                "p99_ms": round(1000 * _percentile(samples, 99), 4),
+                "max_ms": round(1000 * t["max"], 4),
+            }
+        return {"uptime_s": round(time.time() - self.started, 3),
+                "timers": out,
+                "counters": dict(sorted(counters.items()))}
+
+    def to_json(self, indent=2):
+        return json.dumps(self.summary(), indent=indent, ensure_ascii=False)
+
+    def to_prometheus(self, prefix="image_search"):
+        """Prometheus 텍스트 노출 형식 (summary 타입: 분위수 + _sum + _count)"""
+        data = self.summary()
+        lines = [f"# TYPE {prefix}_stage_seconds summary"]
+        for name, t in data["timers"].items():
+            label = f'stage="{_label(name)}"'
+            lines.append(f'{prefix}_stage_seconds{{{label},quantile="0.5"}} {t["p50_ms"] / 1000:.9g}')
+            lines.append(f'{prefix}_stage_seconds{{{label},quantile="0.99"}} {t["p99_ms"] / 1000:.9g}')
+            lines.append(f"{prefix}_stage_seconds_sum{{{label}}} {t['total_s']:.9g}")
+            lines.append(f"{prefix}_stage_seconds_count{{{label}}} {t['calls']}")
+        lines.append(f"# TYPE {prefix}_stage_items_total counter")
+        for name, t in data["timers"].items():
+            lines.append(f'{prefix}_stage_items_total{{stage="{_label(name)}"}} {t["items"]}')
+        for name, value in data["counters"].items():
+            metric = f"{prefix}_{_metric_name(name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """확장자가 .prom/.txt이면 Prometheus 텍스트, 그 외에는 JSON으로 저장"""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def report(self, file=None):
+        """단계별 요약 표 출력"""
+        data = self.summary()
+        if not data["timers"] and not data["counters"]:
+            return
+        width = max([len(name) for name in data["timers"]] + [len(name) for name in data["counters"]])
+        print("⏱ 단계별 시간", file=file)
+        for name, t in data["timers"].items():
+            print(f"   {name:<{width}}  {t['calls']:>7}회  합계 {t['total_s']:9.3f}s  "
+                  f"p50 {t['p50_ms']:9.3f}ms  p99 {t['p99_ms']:9.3f}ms", file=file)
+        for name, value in data["counters"].items():
+            print(f"   {name:<{width}}  {value}", file=file)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+# 프로세스 전역 기본 레지스트리
+METRICS = Metrics()
+
+
+@contextmanager
+def profile(path, kind="cprofile"):
+    """
+    with 블록을 프로파일링하여 path에 저장
+
+    kind:
+        cprofile: cProfile 통계 (.prof, snakeviz / python -m pstats로 확인)
+        torch: torch.profiler Chrome trace (.json, chrome://tracing 또는 Perfetto로 확인)
+    """
+    if kind == "torch":
+        import torch
+        from torch.profiler import profile as torch_profile, ProfilerActivity
+
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        with torch_profile(activities=activities, record_shapes=True) as prof:
+            yield prof
+        prof.export_chrome_trace(path)
+    elif kind == "cprofile":
+        import cProfile
+
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield prof
+        finally:
+            prof.disable()
+            prof.dump_stats(path)
+    else:
+        raise ValueError(f"Unsupported profiler: {kind}")
+    print(f"📝 프로파일 저장: {path}")
+
+
+def profile_until_exit(path, kind="cprofile"):
+    """exit()로 끝나는 스크립트용: 지금부터 프로세스 종료까지 프로파일링"""
+    stack = ExitStack()
+    stack.enter_context(profile(path, kind))
+    atexit.register(stack.close)
+    return stack
+
+
+def export_at_exit(path=None, report=False, metrics=METRICS):
+    """프로세스 종료 시 지표를 path에 저장하고, report=True면 요약 표를 stderr에 출력"""
+    def export():
+        if path:
+            metrics.dump(path)
+            print(f"📝 지표 저장: {path}", file=sys.stderr)
+        if report:
+            metrics.report(file=sys.stderr)
+    atexit.register(export)
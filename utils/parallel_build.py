@@ -0,0 +1,130 @@
+import os
+import json
+import queue
+import shutil
+import tempfile
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from config import *
+from utils.embedding_store import to_numpy
+
+# 워커 프로세스 전역 상태 (initializer에서 한 번 설정)
+_worker = {}
+
+
+def default_threads(workers):
+    """워커별 torch 스레드 수: 코어를 워커 수로 나눈 값 (최소 1)"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def make_shards(image_files, num_shards):
+    """정렬된 파일 목록을 연속 구간으로 나눔 (병합 순서가 작업 완료 순서와 무관하게 고정됨)"""
+    files = sorted(image_files)
+    num_shards = max(1, min(num_shards, len(files)))
+    bounds = np.linspace(0, len(files), num_shards + 1).astype(int)
+    return [files[bounds[i]:bounds[i + 1]] for i in range(num_shards)]
+
+
+def _init_worker(model_name, device, threads, progress_queue):
+    import torch
+    import utils.refresh as refresh
+    from models.embedder import Embedder
+
+    torch.set_num_threads(threads)
+    # 진행 상황은 부모 프로세스가 모아서 출력
+    refresh.VERBOSE = False
+    _worker["embedder"] = Embedder(model_name=model_name, device=device)
+    _worker["threads"] = threads
+    _worker["queue"] = progress_queue
+
+
+def _embed_shard(shard_id, image_dir, image_files, shard_dir, use_hash):
+    """샤드 하나를 임베딩하여 shard-XXXX.npy (행렬) + shard-XXXX.json (파일명, 메타데이터)로 저장"""
+    from utils.refresh import embed_files
+
+    progress_queue = _worker["queue"]
+    db, meta = {}, {}
+    embed_files(_worker["embedder"], image_dir, image_files, db, meta, use_hash,
+                progress=lambda done, total: progress_queue.put((shard_id, done)),
+                num_workers=_worker["threads"])
+
+    base = os.path.join(shard_dir, f"shard-{shard_id:04d}")
+    ids = list(db)
+    vectors = np.stack([to_numpy(db[fname]) for fname in ids]) if ids else np.zeros((0, 0), np.float32)
+    np.save(base + ".npy", vectors)
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "meta": [meta[fname] for fname in ids]}, f, ensure_ascii=False)
+    return base
+
+
+def parallel_embed_files(image_dir, image_files, db, meta, workers, model_name=MODEL_NAME, device="cpu",
+                         use_hash=False, progress=None, threads=None, shards_per_worker=4):
+    """
+    embed_files의 다중 프로세스 버전 (같은 db/meta 계약)
+
+    파일 목록을 정렬해 연속 샤드로 나누고, 각 워커 프로세스가 자기 Embedder(스레드 수 조정)로
+    샤드를 임베딩해 임시 파일로 저장합니다. 부모는 샤드 순서대로 병합하므로 결과 순서는
+    워커 수/완료 순서와 무관하게 항상 같습니다. progress(완료 수, 전체 수)는 전체 워커 합계입니다.
+
+    Returns:
+        성공적으로 임베딩된 파일 수
+    """
+    shards = make_shards(image_files, workers * shards_per_worker)
+    total = sum(len(shard) for shard in shards)
+    if not total:
+        return 0
+    threads = threads or default_threads(workers)
+    if VERBOSE:
+        print(f"🧵 {workers}개 프로세스 x {threads}스레드로 {total}개 이미지 임베딩 ({len(shards)}개 샤드)")
+
+    ctx = mp.get_context("spawn")  # CUDA/torch 스레드 상태를 물려받지 않도록 spawn 사용
+    progress_queue = ctx.Queue()
+    shard_dir = tempfile.mkdtemp(prefix="shards-", dir=DATA_DIR if os.path.isdir(DATA_DIR) else None)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                               initargs=(model_name, str(device), threads, progress_queue))
+    try:
+        pending = {pool.submit(_embed_shard, i, image_dir, shard, shard_dir, use_hash): i
+                   for i, shard in enumerate(shards)}
+        done_by_shard = [0] * len(shards)
+        bases = [None] * len(shards)
+        reported = 0
+        while pending:
+            finished, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            while True:
+                try:
+                    shard_id, done = progress_queue.get_nowait()
+                except queue.Empty:
+                    break
+                done_by_shard[shard_id] = max(done_by_shard[shard_id], done)
+            for future in finished:
+                i = pending.pop(future)
+                bases[i] = future.result()
+                done_by_shard[i] = len(shards[i])
+
+            done = sum(done_by_shard)
+            if done // PROGRESS_UPDATE_INTERVAL > reported // PROGRESS_UPDATE_INTERVAL or done == total:
+                if done != reported:
+                    reported = done
+                    if progress is not None:
+                        progress(done, total)
+                    if VERBOSE:
+                        print(f"   진행: {done}/{total}")
+
+        # 샤드 순서대로 병합
+        count = 0
+        for base in bases:
+            vectors = np.load(base + ".npy")
+            with open(base + ".json", "r", encoding="utf-8") as f:
+                shard = json.load(f)
+            for fname, vec, sig in zip(shard["ids"], vectors, shard["meta"]):
+                db[fname] = vec
+                meta[fname] = sig
+            count += len(shard["ids"])
+        return count
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        progress_queue.close()
+        shutil.rmtree(shard_dir, ignore_errors=True)
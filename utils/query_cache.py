@@ -0,0 +1,302 @@
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from itertools import chain
+
+import numpy as np
+
+from config import *
+from utils.embedding_store import to_numpy
+from utils.refresh import content_hash
+from utils.metrics import METRICS
+
+
+class QueryCache:
+    """
+    쿼리 임베딩 캐시 (메모리 LRU → 디스크 → 카탈로그 DB → 모델 순으로 조회)
+
+    키는 (모델 이름, 파일 내용 SHA-1)이므로 같은 사진을 다른 경로/이름으로 다시 검색해도 재사용됩니다.
+    쿼리가 카탈로그에 있는 파일이면 (IMAGE_DIR 안의 같은 파일이거나 DB에 같은 내용 해시가 있으면)
+    DB에 저장된 벡터를 그대로 사용하여 디코딩과 forward pass를 모두 생략합니다.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, capacity=QUERY_CACHE_SIZE, cache_dir=QUERY_CACHE_DIR,
+                 catalog=None, image_dir=IMAGE_DIR):
+        self.model_name = model_name
+        self.capacity = capacity
+        self.cache_dir = cache_dir
+        self._memory = OrderedDict()  # 내용 해시 → float32 벡터
+        self._hashes = OrderedDict()  # (절대 경로, mtime_ns, 크기) → 내용 해시 (같은 파일 재해시 방지)
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "catalog_hits": 0, "misses": 0}
+        self.set_catalog(catalog, image_dir)
+
+    def set_catalog(self, store, image_dir=IMAGE_DIR):
+        """카탈로그 DB 지정 (DB를 다시 로드/생성한 뒤 호출). 다른 모델의 DB는 사용하지 않음"""
+        if store is not None and getattr(store, "model_name", self.model_name) != self.model_name:
+            store = None
+        with self._lock:
+            self._catalog = store
+            self._image_dir = os.path.abspath(image_dir)
+            self._catalog_hashes = None
+
+    def get_embedding(self, embedder, path):
+        """path의 임베딩 (float32 1D). 캐시에 없으면 embedder로 계산하여 저장"""
+        vec, key = self.lookup(path)
+        if vec is not None:
+            return vec
+        vec = to_numpy(embedder.get_embedding(path))
+        self.put(key, vec)
+        return vec
+
+    def embed_many(self, embedder, paths, batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS):
+        """
+        Embedder.embed_many와 같은 (path, vector | Exception) generator
+        캐시에 있는 쿼리는 바로 내보내고, 없는 쿼리만 모아 배치 임베딩합니다. (순서는 보장하지 않음)
+        """
+        hits = deque()
+        keys = {}
+
+        def misses():
+            for path in paths:
+                try:
+                    vec, key = self.lookup(path)
+                except OSError as e:
+                    hits.append((path, e))
+                    continue
+                if vec is not None:
+                    hits.append((path, vec))
+                else:
+                    keys[path] = key
+                    yield path
+
+        # 첫 miss가 나올 때까지 조회만 진행 (모두 적중이면 embedder.embed_many를 호출하지 않아 torch/모델 로드 생략)
+        pending = misses()
+        first = next(pending, None)
+        while hits:
+            yield hits.popleft()
+        if first is None:
+            return
+
+        for path, result in embedder.embed_many(chain([first], pending), batch_size=batch_size,
+                                                num_workers=num_workers):
+            while hits:
+                yield hits.popleft()
+            key = keys.pop(path, None)
+            if not isinstance(result, Exception):
+                result = to_numpy(result)
+                self.put(key, result)
+            yield path, result
+        while hits:
+            yield hits.popleft()
+
+    def lookup(self, path):
+        """
+        Returns:
+            (벡터 또는 None, 키) - 키는 put()에 그대로 전달
+        """
+        st = os.stat(path)
+        abspath = os.path.abspath(path)
+
+        vec = self._catalog_by_path(abspath, st)
+        if vec is not None:
+            self._count("catalog_hits")
+            return vec, None
+
+        key = self._content_key(abspath, st)
+        with self._lock:
+            vec = self._memory.get(key)
+            if vec is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                METRICS.inc("query_cache.hits")
+                return vec, key
+
+        vec = self._load_disk(key)
+        if vec is not None:
+            self._count("disk_hits")
+        else:
+            vec = self._catalog_by_hash(key)
+            if vec is None:
+                self._count("misses")
+                return None, key
+            self._count("catalog_hits")
+        self._remember(key, vec)
+        return vec, key
+
+    def put(self, key, vec):
+        if key is None:
+            return
+        vec = to_numpy(vec)
+        self._remember(key, vec)
+        self._save_disk(key, vec)
+
+    @property
+    def hit_rate(self):
+        total = sum(self.stats.values())
+        return (total - self.stats["misses"]) / total if total else 0.0
+
+    def summary(self):
+        return f"쿼리 캐시 적중률 {self.hit_rate:.0%} ({self.stats})"
+
+    # ----- 내부 -----
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+        METRICS.inc("query_cache.misses" if name == "misses" else "query_cache.hits")
+
+    def _remember(self, key, vec):
+        with self._lock:
+            self._memory[key] = vec
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.capacity:
+                self._memory.popitem(last=False)
+
+    def _content_key(self, abspath, st):
+        sig = (abspath, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            key = self._hashes.get(sig)
+            if key is not None:
+                self._hashes.move_to_end(sig)
+                return key
+        key = content_hash(abspath)
+        with self._lock:
+            self._hashes[sig] = key
+            while len(self._hashes) > self.capacity:
+                self._hashes.popitem(last=False)
+        return key
+
+    def _catalog_by_path(self, abspath, st):
+        """IMAGE_DIR 안의 파일이고 DB에 기록된 mtime/size가 같으면 DB 벡터"""
+        store = self._catalog
+        if store is None:
+            return None
+        try:
+            fname = os.path.relpath(abspath, self._image_dir)
+        except ValueError:  # Windows에서 드라이브가 다른 경우
+            return None
+        if fname.startswith(os.pardir):
+            return None
+        fname = fname.replace(os.sep, "/")
+        sig = store.meta.get(fname)
+        if sig is None or sig.get("mtime") != st.st_mtime_ns or sig.get("size") != st.st_size:
+            return None
+        return store.get(fname)
+
+    def _catalog_by_hash(self, key):
+        """DB 메타데이터에 내용 해시가 있으면 (HASH_CONTENT) 같은 내용의 카탈로그 벡터"""
+        store = self._catalog
+        if store is None:
+            return None
+        with self._lock:
+            if self._catalog_hashes is None:
+                self._catalog_hashes = {sig["hash"]: fname for fname, sig in store.meta.items() if "hash" in sig}
+            fname = self._catalog_hashes.get(key)
+        return store.get(fname) if fname else None
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, self.model_name, key[:2], key + ".npy")
+
+    def _load_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return np.load(path)
+        except Exception:
+            return None  # 손상된 캐시 파일은 다시 계산
+
+    def _save_disk(self, key, vec):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                np.save(f, vec)
+            os.replace(tmp, path)
+        except Exception as e:
+            if LOG_ERRORS:
+                print(f"⚠️ 쿼리 캐시 저장 오류: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def normalize_prompt(text):
+    """
+    텍스트 캐시 키: 앞뒤/연속 공백 정리 + 소문자
+    (CLIP 토크나이저도 같은 정리를 하므로 키가 같으면 임베딩도 같음)
+    """
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class TextCache:
+    """
+    CLIP 텍스트 임베딩 LRU 캐시 (키: 모델 이름 + 정규화된 프롬프트)
+
+    embed_many는 캐시에 없는 프롬프트만 중복 없이 모아 batch_size개씩 한 번의 encode_text로 인코딩합니다.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, capacity=TEXT_CACHE_SIZE):
+        self.model_name = model_name
+        self.capacity = capacity
+        self._memory = OrderedDict()  # 정규화된 프롬프트 → float32 벡터
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get_embedding(self, embedder, prompt):
+        """prompt의 임베딩 (float32 1D)"""
+        return self.embed_many(embedder, [prompt])[0]
+
+    def embed_many(self, embedder, prompts, batch_size=256):
+        """
+        Returns:
+            prompts와 같은 순서의 float32 1D 벡터 목록
+        """
+        keys = [normalize_prompt(p) for p in prompts]
+        if not all(keys):
+            raise ValueError("빈 검색어는 사용할 수 없습니다")
+
+        found = {}
+        with self._lock:
+            for key in keys:
+                vec = self._memory.get(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vec
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+
+        # 같은 호출 안에서 중복된 프롬프트는 한 번만 인코딩하므로 적중으로 계산
+        hits = len(keys) - len(missing)
+        with self._lock:
+            self.stats["hits"] += hits
+            self.stats["misses"] += len(missing)
+        METRICS.inc("text_cache.hits", hits)
+        METRICS.inc("text_cache.misses", len(missing))
+
+        for i in range(0, len(missing), max(1, batch_size)):
+            chunk = missing[i:i + batch_size]
+            vecs = embedder.encode_texts(chunk)
+            with self._lock:
+                for key, vec in zip(chunk, vecs):
+                    found[key] = vec = to_numpy(vec)
+                    self._memory[key] = vec
+                    self._memory.move_to_end(key)
+                while len(self._memory) > self.capacity:
+                    self._memory.popitem(last=False)
+        return [found[key] for key in keys]
+
+    @property
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def summary(self):
+        return f"텍스트 캐시 적중률 {self.hit_rate:.0%} ({self.stats})"
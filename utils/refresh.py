@@ -0,0 +1,189 @@
+import os
+import hashlib
+
+from config import *
+from utils.embedding_store import EmbeddingStore
+from utils.scanner import Manifest, scan_images
+
+
+def content_hash(path, chunk_size=1 << 20):
+    """파일 내용의 SHA-1 해시"""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_signature(path, use_hash=False):
+    """변경 감지용 파일 메타데이터 (mtime, size, 선택적으로 content hash)"""
+    st = os.stat(path)
+    sig = {"mtime": st.st_mtime_ns, "size": st.st_size}
+    if use_hash:
+        sig["hash"] = content_hash(path)
+    return sig
+
+
+def diff_catalog(image_dir, entries, db, meta, use_hash=False):
+    """
+    현재 폴더 상태와 DB를 비교합니다.
+    entries: utils.scanner.scan_images의 ScanEntry (스캔할 때 얻은 mtime/size를 사용하므로 다시 stat하지 않음)
+
+    Returns:
+        (to_embed, removed, touched): 새로 임베딩할 파일 목록, DB에서 삭제할 파일 목록,
+        임베딩 없이 메타데이터만 갱신된 파일 수
+    """
+    seen = set()
+    removed = []
+    to_embed = []
+    touched = 0
+
+    for entry in entries:
+        fname = entry.rel
+        seen.add(fname)
+        if fname not in db:
+            to_embed.append(fname)
+            continue
+
+        old = meta.get(fname)
+        try:
+            if old is None:
+                # 메타데이터가 없는 기존 DB 항목은 현재 파일 상태로 등록
+                meta[fname] = file_signature(entry.path, use_hash)
+                touched += 1
+                continue
+
+            if old["mtime"] == entry.mtime and old["size"] == entry.size:
+                continue
+
+            # mtime만 바뀐 경우(복사/touch) 해시가 같으면 재임베딩하지 않음
+            if use_hash and "hash" in old and old["size"] == entry.size:
+                new_sig = file_signature(entry.path, use_hash=True)
+                if new_sig["hash"] == old["hash"]:
+                    meta[fname] = new_sig
+                    touched += 1
+                    continue
+        except OSError:
+            seen.discard(fname)  # 스캔 이후 삭제된 파일
+            continue
+
+        to_embed.append(fname)
+
+    removed.extend(fname for fname in db if fname not in seen)
+    return to_embed, removed, touched
+
+
+def embed_files(embedder, image_dir, image_files, db, meta, use_hash=False, progress=None,
+                num_workers=DECODE_WORKERS, workers=1):
+    """
+    주어진 파일들을 배치 임베딩하여 db/meta에 기록합니다.
+    progress: PROGRESS_UPDATE_INTERVAL개마다 progress(완료 수, 전체 수)로 호출되는 콜백 (선택)
+    workers: 2 이상이면 파일을 샤드로 나눠 여러 프로세스에서 임베딩 (utils/parallel_build.py)
+
+    Returns:
+        성공적으로 임베딩된 파일 수
+    """
+    if workers > 1 and len(image_files) > 1:
+        from utils.parallel_build import parallel_embed_files
+        return parallel_embed_files(image_dir, image_files, db, meta, workers, model_name=embedder.model_name,
+                                    device=embedder.device, use_hash=use_hash, progress=progress)
+
+    # 임베딩 전에 stat을 기록해 두어야 처리 중 수정된 파일을 다음 refresh에서 다시 잡을 수 있음
+    signatures = {}
+    paths = []
+    for fname in image_files:
+        path = os.path.join(image_dir, fname)
+        try:
+            signatures[path] = (fname, file_signature(path, use_hash))
+            paths.append(path)
+        except OSError as e:
+            if LOG_ERRORS:
+                print(f"⚠️ {fname} 처리 중 오류: {e}")
+
+    count = 0
+    results = embedder.embed_many(paths, batch_size=BATCH_SIZE, num_workers=num_workers)
+    for i, (path, result) in enumerate(results):
+        fname, sig = signatures[path]
+        if isinstance(result, Exception):
+            if LOG_ERRORS:
+                print(f"⚠️ {fname} 처리 중 오류: {result}")
+        else:
+            db[fname] = result
+            meta[fname] = sig
+            count += 1
+        if (i + 1) % PROGRESS_UPDATE_INTERVAL == 0 or i + 1 == len(paths):
+            if progress is not None:
+                progress(i + 1, len(paths))
+            if VERBOSE and (i + 1) % PROGRESS_UPDATE_INTERVAL == 0:
+                print(f"   진행: {i + 1}/{len(paths)}")
+
+    return count
+
+
+def build_store(embedder, image_dir, image_files, use_hash=False, progress=None, workers=1):
+    """주어진 파일 전체를 임베딩하여 새 EmbeddingStore 생성 (workers: 임베딩 프로세스 수)"""
+    db, meta = {}, {}
+    embed_files(embedder, image_dir, image_files, db, meta, use_hash, progress, workers=workers)
+    return EmbeddingStore.from_dict(db, meta=meta, model_name=embedder.model_name)
+
+
+def refresh_db(embedder, store, image_dir, use_hash=False, progress=None, workers=1,
+               manifest_path=CATALOG_MANIFEST, full_scan=False):
+    """
+    새로 추가되었거나 변경된 이미지만 임베딩하고, 삭제된 이미지는 DB에서 제거합니다.
+    하위 폴더까지 스캔하며, manifest_path가 있으면 mtime이 바뀐 폴더만 다시 나열합니다
+    (full_scan=True면 모든 폴더를 다시 나열하여 같은 이름으로 덮어쓴 파일도 확인).
+
+    Returns:
+        (store, stats): 갱신된 EmbeddingStore와 변경 통계 dict (added, updated, removed, unchanged, touched)
+        - added/updated/removed 중 하나라도 0이 아니면 임베딩 행렬을 다시 저장해야 하고,
+          touched만 0이 아니면 메타데이터만 저장하면 됩니다.
+    """
+    manifest = Manifest.load(manifest_path, image_dir) if manifest_path else None
+    scan_stats = {}
+    entries = scan_images(image_dir, manifest=manifest, full=full_scan, stats=scan_stats) \
+        if os.path.isdir(image_dir) else []
+
+    meta = dict(store.meta)
+    to_embed, removed, touched = diff_catalog(image_dir, entries, store, meta, use_hash)
+    # 폴더 목록만 기록하므로 임베딩 성공 여부와 관계없이 스캔이 끝나면 저장
+    if manifest is not None and os.path.isdir(image_dir):
+        manifest.save()
+    if VERBOSE and scan_stats:
+        print(f"📂 스캔: 이미지 {scan_stats['files']}개, 폴더 {scan_stats['dirs_scanned']}개 나열, "
+              f"{scan_stats['dirs_reused']}개 manifest 사용")
+
+    for fname in removed:
+        meta.pop(fname, None)
+    # DB에 없는 메타데이터 정리
+    for fname in [f for f in meta if f not in store]:
+        meta.pop(fname)
+        touched += 1
+
+    added = sum(1 for f in to_embed if f not in store)
+    updated = len(to_embed) - added
+    unchanged = len(store) - len(removed) - updated
+
+    new_vectors = {}
+    if to_embed:
+        if VERBOSE:
+            print(f"🔄 {len(to_embed)}개 이미지 임베딩 중 (신규 {added}, 변경 {updated})...")
+        embed_files(embedder, image_dir, to_embed, new_vectors, meta, use_hash, progress, workers=workers)
+
+    # 바뀐 행이 있을 때만 새 행렬 구성
+    if new_vectors or removed:
+        store = store.updated(new_vectors, removed, meta)
+    else:
+        store.meta = meta
+
+    stats = {
+        "added": added,
+        "updated": updated,
+        "removed": len(removed),
+        "unchanged": unchanged,
+        "touched": touched,
+    }
+    if VERBOSE:
+        print(f"✅ DB 갱신: 신규 {stats['added']}, 변경 {stats['updated']}, "
+              f"삭제 {stats['removed']}, 유지 {stats['unchanged']}")
+    return store, stats
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+from collections import namedtuple
+
+from config import *
+
+MANIFEST_VERSION = 1
+
+# rel: IMAGE_DIR 기준 상대 경로 (구분자 "/", DB 키), path: 실제 경로
+ScanEntry = namedtuple("ScanEntry", ["rel", "path", "mtime", "size"])
+
+
+class Manifest:
+    """
+    카탈로그 폴더 목록 캐시 (디렉토리별 mtime, 하위 폴더 이름, 이미지 파일의 mtime/size)
+
+    디렉토리 mtime은 그 안의 항목이 추가/삭제/이름 변경될 때만 바뀌므로,
+    mtime이 같은 디렉토리는 다시 나열하지 않고 저장된 목록을 사용합니다.
+    (파일을 같은 이름으로 덮어쓴 경우는 디렉토리 mtime이 바뀌지 않을 수 있어 full 스캔이 필요)
+    """
+
+    def __init__(self, path, root, formats=SUPPORTED_FORMATS, dirs=None):
+        self.path = path
+        self.root = os.path.abspath(root)
+        self.formats = tuple(formats)
+        self.dirs = dirs or {}  # 상대 디렉토리 → {"mtime", "dirs": [이름], "files": {이름: [mtime, size]}}
+
+    @classmethod
+    def load(cls, path, root, formats=SUPPORTED_FORMATS):
+        """저장된 manifest 로드 (없거나, 다른 폴더/형식/버전이면 빈 manifest)"""
+        manifest = cls(path, root, formats)
+        if not path or not os.path.exists(path):
+            return manifest
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if (data.get("version") == MANIFEST_VERSION and data.get("root") == manifest.root
+                    and tuple(data.get("formats", ())) == manifest.formats):
+                manifest.dirs = data["dirs"]
+        except Exception as e:
+            if LOG_ERRORS:
+                print(f"⚠️ manifest 로드 오류, 전체 스캔합니다: {e}")
+        return manifest
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "root": self.root, "formats": list(self.formats),
+                       "saved": time.time(), "dirs": self.dirs}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+
+def scan_images(root, formats=SUPPORTED_FORMATS, manifest=None, full=False, stats=None):
+    """
+    root 아래 이미지 파일을 재귀적으로 찾아 ScanEntry를 하나씩 반환하는 generator
+
+    디렉토리별로 이름순 (파일 먼저, 그다음 하위 폴더)이며, 심볼릭 링크 폴더는 따라가지 않습니다.
+    manifest가 있으면 mtime이 그대로인 디렉토리는 os.scandir 없이 저장된 목록을 사용하고
+    (full=True면 모두 다시 나열), 끝까지 순회하면 manifest.dirs를 이번 스캔 결과로 교체합니다.
+    stats: dict를 주면 dirs_scanned, dirs_reused, files 개수를 기록
+    """
+    formats = tuple(formats)
+    old_dirs = manifest.dirs if manifest is not None and not full else {}
+    new_dirs = {}
+    if stats is None:
+        stats = {}
+    stats.update(dirs_scanned=0, dirs_reused=0, files=0)
+
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        abs_dir = os.path.join(root, rel_dir) if rel_dir else root
+        try:
+            dir_mtime = os.stat(abs_dir).st_mtime_ns
+        except OSError:
+            continue  # 순회 중 삭제된 폴더
+
+        record = old_dirs.get(rel_dir)
+        if record is not None and record["mtime"] == dir_mtime:
+            stats["dirs_reused"] += 1
+        else:
+            try:
+                record = _list_dir(abs_dir, dir_mtime, formats)
+            except OSError as e:
+                if LOG_ERRORS:
+                    print(f"⚠️ {abs_dir} 폴더를 읽을 수 없습니다: {e}")
+                continue
+            stats["dirs_scanned"] += 1
+        new_dirs[rel_dir] = record
+
+        prefix = rel_dir + "/" if rel_dir else ""
+        for name, (mtime, size) in record["files"].items():
+            stats["files"] += 1
+            yield ScanEntry(prefix + name, os.path.join(abs_dir, name), mtime, size)
+        # 이름순으로 꺼내도록 역순으로 push
+        stack.extend(prefix + name for name in reversed(record["dirs"]))
+
+    if manifest is not None:
+        manifest.dirs = new_dirs
+
+
+def _list_dir(abs_dir, dir_mtime, formats):
+    dirs, files = [], {}
+    with os.scandir(abs_dir) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.name)
+            elif entry.name.lower().endswith(formats) and entry.is_file():
+                st = entry.stat()
+                files[entry.name] = [st.st_mtime_ns, st.st_size]
+        except OSError:
+            continue  # 나열과 stat 사이에 삭제된 파일
+    return {"mtime": dir_mtime, "dirs": dirs, "files": files}
+
+
+def list_images(root, manifest_path=CATALOG_MANIFEST, full=False):
+    """
+    root 아래 이미지의 상대 경로 목록 (manifest를 갱신하여 저장)
+
+    Returns:
+        (상대 경로 목록, scan_images의 stats dict)
+    """
+    manifest = Manifest.load(manifest_path, root) if manifest_path else None
+    stats = {}
+    files = [entry.rel for entry in scan_images(root, manifest=manifest, full=full, stats=stats)]
+    if manifest is not None:
+        manifest.save()
+    return files, stats
+
+
+def has_images(root):
+    """root 아래에 이미지가 하나라도 있는지 (첫 이미지를 찾으면 바로 중단)"""
+    return os.path.isdir(root) and next(scan_images(root), None) is not None
@@ -1,57 +1,318 @@
-import torch
+import time
+
+import numpy as np
+
+from utils.embedding_store import EmbeddingStore, QuantizedMatrix, quantize_matrix, to_numpy
+from utils.metrics import METRICS, SCAN, TOPK
+
+# top-k 선택 시 한 번에 처리하는 점수 구간 크기 (DB 크기와 무관하게 임시 메모리 제한)
+TOPK_BLOCK = 65536
+# 다중 쿼리 검색 시 한 번에 만드는 (Q, N) 점수 행렬의 최대 원소 수 (float32 기준 약 64MB)
+SCORE_BUDGET = 1 << 24
+# float16/int8 행렬 스캔 시 float32로 변환하는 구간 크기 (CPU 캐시에 들어가는 크기)
+SCAN_BLOCK_BYTES = 2 << 20
+# float32 원본 재계산 시 top_k * N개 후보 사용
+RERANK_FACTOR = 4
+
+
+class SearchIndex:
+    """
+    사전 정규화된 (N, D) 임베딩 행렬 + 파일명 목록
+
+    DB 로드 후 한 번만 만들어 두고 쿼리마다 재사용합니다.
+    검색은 행렬-벡터 곱 한 번과 top-k 선택으로 이루어집니다.
+
+    float16/int8 저장소는 float32로 펼치지 않고 저장된 형식 그대로 구간별로 스캔하며,
+    float32 원본(rerank_vectors)이 있으면 상위 k * rerank_factor개 후보만 원본으로 다시 계산하여
+    float32 검색과 같은 top-k와 점수를 돌려줍니다.
+    """
+
+    def __init__(self, vectors, ids, normalized=True, rerank_vectors=None, rerank_factor=RERANK_FACTOR):
+        self.scales = None
+        if isinstance(vectors, QuantizedMatrix) and normalized:
+            # 점수 = (codes @ query) * scale
+            self.scales = np.asarray(vectors.scales, dtype=np.float32)
+            vectors = vectors.codes
+        elif getattr(vectors, "dtype", None) == np.float16 and normalized:
+            pass
+        else:
+            # float32 memmap이면 복사 없이 그대로 사용
+            vectors = np.asarray(vectors, dtype=np.float32)
+            if not normalized:
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                vectors = vectors / np.maximum(norms, 1e-12)
+
+        self.vectors = vectors
+        self.ids = ids
+        self.rerank_vectors = rerank_vectors if self.quantized else None
+        self.rerank_factor = rerank_factor
+
+    @classmethod
+    def from_db(cls, db, rerank=True):
+        """EmbeddingStore 또는 {파일명: 벡터} dict로부터 생성"""
+        if isinstance(db, EmbeddingStore):
+            return cls(db.vectors, db.ids, normalized=db.normalized,
+                       rerank_vectors=db.rerank_vectors if rerank else None)
+
+        ids = list(db.keys())
+        if not ids:
+            return cls(np.zeros((0, 0), dtype=np.float32), ids)
+        vectors = np.stack([to_numpy(db[fname]) for fname in ids])
+        return cls(vectors, ids, normalized=False)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    @property
+    def quantized(self):
+        """float16/int8 행렬을 그대로 스캔하는지 여부"""
+        return self.vectors.dtype != np.float32
+
+    @property
+    def nbytes(self):
+        """스캔 대상 행렬(+ scale)의 크기"""
+        return self.vectors.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def vector(self, row):
+        """row번째 임베딩 (float32 1D, 원본이 있으면 원본)"""
+        if self.rerank_vectors is not None:
+            return np.asarray(self.rerank_vectors[row], dtype=np.float32)
+        vec = np.asarray(self.vectors[row], dtype=np.float32)
+        return vec * self.scales[row] if self.scales is not None else vec
+
+    def scores(self, queries):
+        """정규화된 (Q, D) 쿼리 → (Q, N) float32 점수"""
+        if not self.quantized:
+            return queries @ self.vectors.T
+
+        n = len(self.ids)
+        out = np.empty((len(queries), n), dtype=np.float32)
+        step = max(256, SCAN_BLOCK_BYTES // (4 * max(1, self.dim)))
+        convert = _float16_converter(step, self.dim) if self.vectors.dtype == np.float16 else None
+        for start in range(0, n, step):
+            block = self.vectors[start:start + step]
+            block = convert(block) if convert else block.astype(np.float32)
+            out[:, start:start + step] = queries @ block.T
+        if self.scales is not None:
+            out *= self.scales
+        return out
+
+    def _top(self, query, scores, k):
+        """상위 k개 (행 번호, 점수). float32 원본이 있으면 후보를 원본으로 재계산"""
+        if self.rerank_vectors is None:
+            top = topk_indices(scores, k)
+            return top, scores[top]
+        # memmap 순차 접근을 위해 후보 행을 정렬해서 읽음
+        cand = np.sort(topk_indices(scores, k * max(1, self.rerank_factor)))
+        exact = np.asarray(self.rerank_vectors[cand], dtype=np.float32) @ query
+        order = topk_indices(exact, k)
+        return cand[order], exact[order]
+
+    def search(self, query_vec, k=5):
+        """
+        Returns:
+            [(파일명, 유사도), ...] 유사도 내림차순
+        """
+        k = min(k, len(self.ids))
+        if k <= 0:
+            return []
+
+        query = normalize_query(query_vec)
+        if query.shape[0] != self.dim:
+            raise ValueError(f"쿼리 차원 {query.shape[0]}이 DB 차원 {self.dim}과 다릅니다.")
+
+        with METRICS.timer(SCAN):
+            scores = self.scores(query[None])[0] if self.quantized else self.vectors @ query
+        with METRICS.timer(TOPK):
+            top, top_scores = self._top(query, scores, k)
+        METRICS.inc("search.queries")
+        return [(self.ids[i], float(score)) for i, score in zip(top, top_scores)]
+
+    def search_batch(self, query_vecs, k=5, max_scores=SCORE_BUDGET):
+        """
+        여러 쿼리를 한 번에 검색합니다. (Q, N) 점수 행렬을 행렬 곱으로 계산하되,
+        max_scores 원소를 넘지 않도록 쿼리를 나누어 처리합니다.
+
+        Returns:
+            쿼리별 [(파일명, 유사도), ...] 리스트
+        """
+        queries = normalize_queries(query_vecs)
+        k = min(k, len(self.ids))
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"쿼리 차원 {queries.shape[1]}이 DB 차원 {self.dim}과 다릅니다.")
+
+        chunk = max(1, max_scores // max(1, len(self.ids)))
+        METRICS.inc("search.queries", len(queries))
+        results = []
+        for start in range(0, len(queries), chunk):
+            block = queries[start:start + chunk]
+            with METRICS.timer(SCAN):
+                scores = self.scores(block)
+            with METRICS.timer(TOPK):
+                if self.rerank_vectors is None:
+                    top = topk_rows(scores, k)
+                    results.extend([(self.ids[i], float(scores[row, i])) for i in indices]
+                                   for row, indices in enumerate(top))
+                else:
+                    for query, row_scores in zip(block, scores):
+                        top, top_scores = self._top(query, row_scores, k)
+                        results.append([(self.ids[i], float(score)) for i, score in zip(top, top_scores)])
+        return results
+
+
+def _float16_converter(rows, dim):
+    """
+    float16 구간 → float32 변환 함수 (재사용 버퍼)
+    NumPy의 float16 변환은 느려서 (SIMD 미사용) torch의 변환을 사용합니다.
+    """
+    import torch
+
+    src = np.empty((rows, dim), dtype=np.float16)
+    dst = torch.empty((rows, dim), dtype=torch.float32)
+    src_t = torch.from_numpy(src)
+
+    def convert(block):
+        m = block.shape[0]
+        np.copyto(src[:m], block)  # memmap(읽기 전용) → 쓰기 가능한 버퍼
+        dst[:m].copy_(src_t[:m])
+        return dst[:m].numpy()
+    return convert
+
+
+def normalize_query(query_vec):
+    """쿼리를 float32 1D 단위 벡터로 변환"""
+    query = to_numpy(query_vec)
+    return query / max(float(np.linalg.norm(query)), 1e-12)
+
+
+def normalize_queries(query_vecs):
+    """쿼리 목록/행렬을 float32 (Q, D) 단위 벡터 행렬로 변환"""
+    if isinstance(query_vecs, np.ndarray) and query_vecs.ndim == 2:
+        queries = query_vecs.astype(np.float32, copy=False)
+    else:
+        queries = np.stack([to_numpy(q) for q in query_vecs]) if len(query_vecs) else np.zeros((0, 0), np.float32)
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries / np.maximum(norms, 1e-12)
+
+
+def topk_rows(scores, k):
+    """(Q, N) 점수 행렬의 행별 상위 k개 인덱스 (Q, k), 내림차순"""
+    n = scores.shape[1]
+    if k < n:
+        part = np.argpartition(scores, n - k, axis=1)[:, n - k:]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+def topk_indices(scores, k):
+    """점수 상위 k개 인덱스 (내림차순). 구간별 argpartition으로 임시 메모리를 TOPK_BLOCK 이하로 유지"""
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    if n <= TOPK_BLOCK:
+        candidates = np.argpartition(scores, n - k)[n - k:] if k < n else np.arange(n)
+    else:
+        parts = []
+        for start in range(0, n, TOPK_BLOCK):
+            block = scores[start:start + TOPK_BLOCK]
+            kk = min(k, block.shape[0])
+            parts.append(np.argpartition(block, block.shape[0] - kk)[block.shape[0] - kk:] + start)
+        candidates = np.concatenate(parts)
+        if candidates.shape[0] > k:
+            part = np.argpartition(scores[candidates], candidates.shape[0] - k)
+            candidates = candidates[part[candidates.shape[0] - k:]]
+
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def load_index(db, backend="exact", nprobe=None, store_dir=None):
+    """
+    검색 인덱스 생성. backend="ivf"이면 저장된 IVF 인덱스를 사용하고,
+    없거나 오래된 경우 exact 검색으로 대체합니다. 두 인덱스 모두 search(query_vec, k)를 제공합니다.
+    """
+    if backend == "ivf" and isinstance(db, EmbeddingStore):
+        from utils.ann import load_ann_index
+        from config import STORE_DIR, IVF_NPROBE
+
+        index = load_ann_index(db, store_dir or STORE_DIR, nprobe=nprobe or IVF_NPROBE)
+        if index is not None:
+            return index
+        print("⚠️ IVF 인덱스를 사용할 수 없어 exact 검색을 사용합니다.")
+    elif backend not in ("exact", "ivf"):
+        raise ValueError(f"Unsupported index backend: {backend}")
+
+    return SearchIndex.from_db(db)
+
+
+def quantization_report(db, k=10, num_queries=200, dtypes=("float16", "int8"), seed=0):
+    """
+    float32 exact 검색(search_similar와 같은 결과) 대비 float16/int8 저장 형식의
+    메모리 절감, recall@k, top-k 일치율(순서 포함), 평균 검색 시간을 측정합니다.
+    (rerank 열은 float32 원본으로 상위 후보를 재계산한 경우)
+    """
+    store = db if isinstance(db, EmbeddingStore) else EmbeddingStore.from_dict(db)
+    source = store.exact_vectors
+    exact = SearchIndex(np.asarray(source, dtype=np.float32), store.ids, normalized=store.normalized)
+
+    n = len(exact)
+    rng = np.random.default_rng(seed)
+    queries = [exact.vector(row) for row in rng.choice(n, size=min(n, num_queries), replace=False)]
+    k = min(k, n)
+
+    def measure(index):
+        start = time.perf_counter()
+        found = [index.search(q, k) for q in queries]
+        return found, 1000 * (time.perf_counter() - start) / max(1, len(queries))
+
+    expected, exact_ms = measure(exact)
+    rows = [{"dtype": "float32", "rerank": False, "mb": exact.nbytes / 2**20, "saved": 0.0,
+             "recall": 1.0, "identical": 1.0, "ms": exact_ms}]
+    for dtype in dtypes:
+        compact = quantize_matrix(source, dtype)
+        for rerank in (False, True):
+            index = SearchIndex(compact, store.ids, normalized=True, rerank_vectors=source if rerank else None)
+            found, ms = measure(index)
+            hits = sum(len({f for f, _ in e} & {f for f, _ in r}) for e, r in zip(expected, found))
+            same = sum([f for f, _ in e] == [f for f, _ in r] for e, r in zip(expected, found))
+            rows.append({"dtype": dtype, "rerank": rerank, "mb": index.nbytes / 2**20,
+                         "saved": 1 - index.nbytes / exact.nbytes,
+                         "recall": hits / max(1, len(queries) * k),
+                         "identical": same / max(1, len(queries)), "ms": ms})
+
+    print(f"📊 저장 형식별 비교 (N={n}, D={exact.dim}, 쿼리 {len(queries)}개, top-{k}, 기준: float32 exact)")
+    for r in rows:
+        name = r["dtype"] + (" + rerank" if r["rerank"] else "")
+        print(f"   {name:<17} {r['mb']:9.1f}MB (-{r['saved']:.0%})  recall@{k} {r['recall']:.4f}  "
+              f"top-{k} 일치 {r['identical']:.1%}  {r['ms']:.2f}ms")
+    return rows
 
 
 def search_similar(query_vec, db_embeddings, top_k=5):
     """
     cosine similarity 기반 검색 함수 (오류 처리 강화)
+
+    db_embeddings: SearchIndex/IVFIndex, EmbeddingStore 또는 {파일명: 벡터} dict
+    반복 검색 시에는 load_index()로 인덱스를 한 번 만들어 전달하세요.
     """
     if not db_embeddings:
         print("⚠️ 데이터베이스가 비어있습니다.")
         return []
 
-    if len(db_embeddings) < top_k:
-        top_k = len(db_embeddings)
-        print(f"⚠️ DB에 {len(db_embeddings)}개 이미지만 있어서 top_k를 {top_k}로 조정합니다.")
-
+    # DB가 top_k보다 작으면 인덱스가 k를 DB 크기로 줄임 (쿼리마다 출력하지 않음)
     try:
-        # 모든 임베딩의 차원을 일관되게 만들기
-        db_vecs = []
-        for key, vec in db_embeddings.items():
-            # 차원 정리: 1D 벡터로 통일
-            if vec.dim() > 1:
-                vec = vec.squeeze()
-            vec = vec.flatten()
-            db_vecs.append(vec)
-
-        # 모든 임베딩을 스택으로 결합
-        db_tensor = torch.stack(db_vecs)
-        file_list = list(db_embeddings.keys())
-
-        # query_vec 차원 정리
-        if query_vec.dim() > 1:
-            query_vec = query_vec.squeeze()
-        query_vec = query_vec.flatten()
-
-        print(f"🔍 검색 정보:")
-        print(f"   Query shape: {query_vec.shape}")
-        print(f"   DB shape: {db_tensor.shape}")
-
-        # 코사인 유사도 계산
-        sims = torch.nn.functional.cosine_similarity(query_vec.unsqueeze(0), db_tensor, dim=1)
-
-        # 상위 k개 결과 선택
-        if top_k > 0:
-            top_scores, top_indices = torch.topk(sims, k=top_k, largest=True)
-            results = [(file_list[idx.item()], score.item()) for idx, score in zip(top_indices, top_scores)]
-        else:
-            results = []
-
-        return results
+        index = db_embeddings if hasattr(db_embeddings, "search") else SearchIndex.from_db(db_embeddings)
+        return index.search(query_vec, top_k)
 
     except Exception as e:
         print(f"❌ 검색 중 오류 발생: {e}")
-        if 'query_vec' in locals():
-            print(f"Query vector shape: {query_vec.shape}")
-        if 'db_tensor' in locals():
-            print(f"DB tensor shape: {db_tensor.shape}")
-        return []
\ No newline at end of file
+        return []
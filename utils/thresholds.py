@@ -0,0 +1,221 @@
+import os
+import json
+import time
+
+import numpy as np
+
+from models.anomaly_detector_encoder import MODEL_DIR
+from utils.anomaly_batch import iter_image_paths, score_paths
+from config import *
+
+# 보정된 threshold가 없을 때 사용하는 기본값 (기존 cable 수동 설정값)
+DEFAULT_THRESHOLD = 0.004
+METHODS = ("auto", "percentile", "meanstd", "f1")
+
+
+# 점수 분포는 입력 전처리 방식에 따라 달라지므로 threshold는 방식(mode)별로 따로 보정/저장
+DEFAULT_MODE = "pil"
+
+
+def score_mode(preprocessed=False):
+    """점수 계산 방식 이름: pil (Resize + ToTensor), pil-preprocessed (get_transform)"""
+    return f"{DEFAULT_MODE}-preprocessed" if preprocessed else DEFAULT_MODE
+
+
+def threshold_path(category, model_dir=MODEL_DIR, mode=DEFAULT_MODE):
+    """
+    models/autoencoder_{category}.threshold.json (기본 PIL 방식, 모델 가중치 옆)
+    그 외 방식은 models/autoencoder_{category}.{mode}.threshold.json
+    """
+    suffix = "" if mode == DEFAULT_MODE else f".{mode}"
+    return os.path.join(model_dir, f"autoencoder_{category}{suffix}.threshold.json")
+
+
+def load_threshold(category, model_dir=MODEL_DIR, default=DEFAULT_THRESHOLD, preprocessed=False):
+    """
+    현재 점수 계산 방식으로 보정된 threshold
+
+    기본 방식(PIL, 전처리 없음)은 저장된 값이 없거나 읽을 수 없으면 default를 사용합니다.
+    --preprocessed는 점수 분포가 달라 PIL 값이나 default를 쓰면 판정이 틀리므로,
+    그 방식으로 보정한 값이 없으면 FileNotFoundError를 발생시킵니다.
+    """
+    mode = score_mode(preprocessed)
+    path = threshold_path(category, model_dir, mode)
+    if not os.path.exists(path):
+        if mode != DEFAULT_MODE:
+            raise FileNotFoundError(
+                f"[{category}] {mode} 방식으로 보정된 threshold가 없습니다 ({path}). "
+                f"같은 옵션으로 --calibrate를 실행하거나 --threshold를 지정하세요.")
+        return default
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        # 이전 버전 파일에는 mode가 없음 (항상 PIL, 전처리 없음으로 보정)
+        recorded = data.get("mode") or score_mode(data.get("preprocessed", False))
+        if recorded != mode:
+            raise ValueError(f"{recorded} 방식으로 보정된 값입니다 (현재: {mode})")
+        return float(data["threshold"])
+    except Exception as e:
+        if mode != DEFAULT_MODE:
+            raise ValueError(f"[{category}] threshold 로드 실패 ({path}): {e}") from e
+        if LOG_ERRORS:
+            print(f"⚠️ threshold 로드 실패 ({path}): {e}")
+        return default
+
+
+def save_threshold(category, calibration, model_dir=MODEL_DIR):
+    """보정 결과를 원자적으로 저장 (calibration["mode"]별 파일)"""
+    path = threshold_path(category, model_dir, calibration.get("mode", DEFAULT_MODE))
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def score_stats(scores):
+    return {
+        "count": int(scores.size),
+        "mean": float(scores.mean()),
+        "std": float(scores.std()),
+        "p50": float(np.percentile(scores, 50)),
+        "p95": float(np.percentile(scores, 95)),
+        "p99": float(np.percentile(scores, 99)),
+        "max": float(scores.max()),
+    }
+
+
+def f1_threshold(scores, labels):
+    """
+    라벨(1=불량)이 있는 점수에서 F1이 최대가 되는 threshold (score > threshold → 불량)
+
+    점수를 한 번 정렬하고 누적합으로 모든 후보의 precision/recall을 한 번에 계산합니다.
+
+    Returns:
+        (threshold, {"f1", "precision", "recall"})
+    """
+    order = np.argsort(-scores, kind="stable")
+    s = scores[order]
+    y = labels[order].astype(np.float64)
+
+    tp = np.cumsum(y)
+    fp = np.cumsum(1 - y)
+    precision = tp / (tp + fp)
+    recall = tp / max(1.0, y.sum())
+    f1 = np.where(tp > 0, 2 * precision * recall / np.maximum(precision + recall, 1e-12), 0.0)
+
+    # 동점인 점수 사이에서는 자를 수 없으므로 값이 바뀌는 위치만 후보
+    valid = np.append(s[1:] < s[:-1], True)
+    f1 = np.where(valid, f1, -1.0)
+    i = int(np.argmax(f1))
+
+    # 상위 i+1개만 불량으로 판정되도록 다음 점수와의 중간값을 threshold로 사용
+    threshold = (s[i] + s[i + 1]) / 2 if i + 1 < s.size else float(np.nextafter(s[i], -np.inf))
+    return float(threshold), {"f1": float(f1[i]), "precision": float(precision[i]), "recall": float(recall[i])}
+
+
+def fit_threshold(normal_scores, method="percentile", percentile=99.0, k=3.0, test_scores=None, test_labels=None):
+    """
+    정상 이미지 점수 분포로 threshold 계산
+
+    method:
+        percentile: 정상 점수의 percentile 분위수
+        meanstd: mean + k * std
+        f1: 라벨이 있는 test 점수에서 F1 최적값 (test_scores/test_labels 필요)
+        auto: test에 불량 라벨이 있으면 f1, 없으면 percentile
+
+    Returns:
+        보정 결과 dict (threshold, method, 방법별 후보값, 정상 점수 통계)
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unsupported method: {method}")
+    if normal_scores.size == 0:
+        raise ValueError("정상 이미지 점수가 없습니다.")
+
+    has_defects = test_labels is not None and test_labels.size > 0 and test_labels.any()
+    if method == "auto":
+        method = "f1" if has_defects else "percentile"
+    if method == "f1" and not has_defects:
+        raise ValueError("f1 보정에는 불량 라벨이 있는 test 이미지가 필요합니다.")
+
+    candidates = {
+        "percentile": float(np.percentile(normal_scores, percentile)),
+        "meanstd": float(normal_scores.mean() + k * normal_scores.std()),
+    }
+    calibration = {"normal": score_stats(normal_scores)}
+    if has_defects:
+        candidates["f1"], calibration["f1"] = f1_threshold(test_scores, test_labels)
+
+    calibration.update({
+        "method": method,
+        "threshold": candidates[method],
+        "candidates": candidates,
+        "params": {"percentile": percentile, "k": k},
+    })
+    return calibration
+
+
+def collect_scores(model, paths, category, batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS, device="cpu",
+                   cache_dir=None, preprocessed=False):
+    """배치 점수 계산 결과를 (경로 목록, 점수 배열)로 수집 (실패한 이미지는 제외)"""
+    ok_paths, scores = [], []
+    for path, score, _ in score_paths(model, paths, category, batch_size, num_workers, device,
+                                      preprocessed=preprocessed, cache_dir=cache_dir):
+        if isinstance(score, Exception):
+            if LOG_ERRORS:
+                print(f"⚠️ {path} 처리 중 오류: {score}")
+            continue
+        ok_paths.append(path)
+        scores.append(score)
+    return ok_paths, np.asarray(scores, dtype=np.float64)
+
+
+def calibrate_category(model, category, data_root, method="auto", percentile=99.0, k=3.0,
+                       batch_size=BATCH_SIZE, num_workers=DECODE_WORKERS, device="cpu", model_dir=MODEL_DIR,
+                       cache_dir=None, preprocessed=False):
+    """
+    {data_root}/{category}/train (정상)과 선택적으로 test (good=정상, 그 외 폴더=불량)를
+    배치로 점수 계산하여 threshold를 보정하고 모델 옆에 저장
+    preprocessed: 판정할 때와 같은 점수 계산 방식 (방식별로 따로 저장됨)
+
+    Returns:
+        보정 결과 dict
+    """
+    category_dir = os.path.join(data_root, category)
+    normal_dirs = [d for d in ("train", "validation") if os.path.isdir(os.path.join(category_dir, d))]
+    if not normal_dirs:
+        raise FileNotFoundError(f"정상 이미지 폴더가 없습니다: {os.path.join(category_dir, 'train')}")
+
+    start = time.perf_counter()
+    normal_paths = iter_image_paths([os.path.join(category_dir, d) for d in normal_dirs])
+    _, normal_scores = collect_scores(model, normal_paths, category, batch_size, num_workers, device, cache_dir,
+                                      preprocessed)
+
+    test_scores = test_labels = None
+    test_dir = os.path.join(category_dir, "test")
+    if method in ("auto", "f1") and os.path.isdir(test_dir):
+        paths, test_scores = collect_scores(model, iter_image_paths([test_dir]), category,
+                                            batch_size, num_workers, device, cache_dir, preprocessed)
+        # MVTec 구조: test/good/* 정상, test/{불량 유형}/* 불량
+        test_labels = np.array([os.path.relpath(p, test_dir).split(os.sep)[0] != "good" for p in paths])
+
+    calibration = fit_threshold(normal_scores, method, percentile, k, test_scores, test_labels)
+    calibration.update({
+        "category": category,
+        "mode": score_mode(preprocessed),
+        "preprocessed": preprocessed,
+        "elapsed_s": round(time.perf_counter() - start, 2),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+    path = save_threshold(category, calibration, model_dir)
+
+    if VERBOSE:
+        normal = calibration["normal"]
+        print(f"✅ [{category}] threshold={calibration['threshold']:.6f} ({calibration['method']}, "
+              f"{calibration['mode']}) → {path}")
+        print(f"   정상 {normal['count']}개: mean={normal['mean']:.6f}, std={normal['std']:.6f}, "
+              f"p99={normal['p99']:.6f}, max={normal['max']:.6f}")
+        if "f1" in calibration:
+            f1 = calibration["f1"]
+            print(f"   test F1={f1['f1']:.3f} (precision={f1['precision']:.3f}, recall={f1['recall']:.3f})")
+    return calibration
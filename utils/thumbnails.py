@@ -0,0 +1,156 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from config import *
+
+THUMBNAIL_FORMAT = "JPEG"
+THUMBNAIL_QUALITY = 90
+
+
+class ThumbnailCache:
+    """
+    축소 이미지 캐시 (메모리 LRU → 디스크 → 원본 디코딩 순으로 조회)
+
+    디스크 캐시는 (원본 경로, mtime, 파일 크기, 축소 크기)로 키를 만들므로
+    원본이 바뀌면 자동으로 새로 생성됩니다. 메모리 캐시는 디코딩된 PIL 이미지를
+    max_bytes(픽셀 바이트 기준)까지 보관하며, 여러 스레드에서 동시에 사용할 수 있습니다.
+    """
+
+    def __init__(self, cache_dir=THUMBNAIL_CACHE_DIR, max_bytes=THUMBNAIL_MEMORY_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()  # key → (PIL 이미지, 바이트 수)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "errors": 0}
+
+    def get(self, path, size):
+        """path의 size 이내 축소 이미지 (실패 시 None)"""
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            self._count("errors")
+            if LOG_ERRORS:
+                print(f"⚠️ 썸네일 로드 오류 ({os.path.basename(path)}): {e}")
+            return None
+
+        key = thumbnail_key(path, st, size)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[0]
+
+        img = self._load_disk(key, size)
+        if img is not None:
+            self._count("disk_hits")
+        else:
+            try:
+                img = make_thumbnail(path, size)
+            except Exception as e:
+                self._count("errors")
+                if LOG_ERRORS:
+                    print(f"⚠️ 썸네일 로드 오류 ({os.path.basename(path)}): {e}")
+                return None
+            self._count("misses")
+            self._save_disk(key, size, img)
+
+        self._remember(key, img)
+        return img
+
+    def warm(self, paths, size, stop=None):
+        """디스크 캐시에 없는 썸네일을 미리 생성 (메모리 캐시에는 넣지 않음). stop: 중단용 threading.Event"""
+        created = 0
+        for path in paths:
+            if stop is not None and stop.is_set():
+                break
+            try:
+                key = thumbnail_key(path, os.stat(path), size)
+                if os.path.exists(self._disk_path(key, size)):
+                    continue
+                self._save_disk(key, size, make_thumbnail(path, size))
+                created += 1
+            except Exception as e:
+                if LOG_ERRORS:
+                    print(f"⚠️ 썸네일 생성 오류 ({os.path.basename(path)}): {e}")
+        return created
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+            self._bytes = 0
+
+    @property
+    def memory_bytes(self):
+        return self._bytes
+
+    # ----- 내부 -----
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _remember(self, key, img):
+        nbytes = img.width * img.height * len(img.getbands())
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = (img, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._memory.popitem(last=False)
+                self._bytes -= evicted
+
+    def _disk_path(self, key, size):
+        return os.path.join(self.cache_dir, f"{size[0]}x{size[1]}", key[:2], key + ".jpg")
+
+    def _load_disk(self, key, size):
+        path = self._disk_path(key, size)
+        if not os.path.exists(path):
+            return None
+        try:
+            img = Image.open(path)
+            img.load()
+            return img
+        except Exception:
+            # 손상된 캐시 파일은 원본에서 다시 생성
+            return None
+
+    def _save_disk(self, key, size, img):
+        path = self._disk_path(key, size)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            img.save(tmp, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+            os.replace(tmp, path)
+        except Exception as e:
+            if LOG_ERRORS:
+                print(f"⚠️ 썸네일 캐시 저장 오류: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def thumbnail_key(path, st, size):
+    """(절대 경로, mtime_ns, 파일 크기, 축소 크기) 해시"""
+    raw = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{size[0]}x{size[1]}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def make_thumbnail(path, size):
+    """원본을 열어 size 이내로 축소한 RGB 이미지"""
+    with Image.open(path) as img:
+        # JPEG은 디코딩 단계에서 1/2~1/8로 축소해 읽어 대용량 원본도 빠르게 처리
+        img.draft("RGB", (size[0] * 2, size[1] * 2))
+        img = img.convert("RGB")
+    img.thumbnail(size, Image.Resampling.LANCZOS)
+    return img